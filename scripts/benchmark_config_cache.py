@@ -0,0 +1,54 @@
+USAGE = """
+
+Benchmark loading the model configuration from the TOML files with
+validation (cold) against loading the validated Configuration from the
+cache_dir (tm2py.config.Configuration.load_toml).
+
+Example:
+    python benchmark_config_cache.py scenario_config.toml model_config.toml
+
+"""
+import argparse
+import tempfile
+import time
+
+import pandas as pd
+
+from tm2py.config import Configuration
+
+
+def benchmark(toml_paths, repeats: int) -> pd.DataFrame:
+    """Time the cold and cached configuration loads."""
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            Configuration.load_toml(toml_paths)
+            cold_time = time.perf_counter() - start
+            if repeat == 0:
+                # write the cache entry
+                Configuration.load_toml(toml_paths, cache_dir=cache_dir)
+            start = time.perf_counter()
+            Configuration.load_toml(toml_paths, cache_dir=cache_dir)
+            cached_time = time.perf_counter() - start
+            results.append(
+                {
+                    "repeat": repeat,
+                    "cold_s": cold_time,
+                    "cached_s": cached_time,
+                    "speedup": cold_time / cached_time,
+                }
+            )
+    return pd.DataFrame(results).set_index("repeat")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=USAGE, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("toml_paths", nargs="+", help="Config TOML files, in order.")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of repeats.")
+    args = parser.parse_args()
+    results = benchmark(args.toml_paths, args.repeats)
+    print(results.round(4).to_string())
+    print(f"mean speedup {results['speedup'].mean():.1f}")
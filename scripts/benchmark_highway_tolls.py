@@ -0,0 +1,169 @@
+USAGE = """
+
+Benchmark the highway network toll and class cost calculation
+(tm2py.components.network.highway.highway_network calc_link_tolls and
+calc_link_class_costs) against the per-link loop on a synthetic network,
+time per period and maximum difference of the results.
+
+The per-link loop accesses the link attributes as dictionaries, the Emme
+network link attribute access is slower than this.
+
+"""
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from tm2py.components.network.highway.highway_network import (
+    calc_link_class_costs,
+    calc_link_tolls,
+    read_toll_table,
+)
+
+SRC_VEH_GROUPS = ["da", "sr2", "sr3", "vsm", "sml", "med", "lrg"]
+DST_VEH_GROUPS = ["da", "sr2", "sr3", "vsm", "sml", "med", "lrg"]
+VALUETOLL_START = 11
+TOLL_ATTRS = [
+    f"@{toll_type}toll_{dst_veh}"
+    for toll_type in ("bridge", "value")
+    for dst_veh in DST_VEH_GROUPS
+]
+CLASSES = [
+    SimpleNamespace(
+        name=name,
+        operating_cost_per_mile=17.23,
+        toll=(f"@bridgetoll_{name}", f"@valuetoll_{name}"),
+        toll_factor=None if name != "sr2" else 1 / 1.75,
+    )
+    for name in DST_VEH_GROUPS
+]
+
+
+def synthetic_network(num_links: int, toll_share: float, seed: int = 0):
+    """Link attribute arrays and toll table rows for the tolled facilities."""
+    rng = np.random.default_rng(seed)
+    tollbooth = np.zeros(num_links)
+    tolled = rng.random(num_links) < toll_share
+    tollbooth[tolled] = rng.integers(1, 40, tolled.sum())
+    tollseg = np.where(tollbooth > 0, rng.integers(1, 10, num_links), 0)
+    useclass = np.where(tollbooth > 0, rng.integers(0, 4, num_links), 0)
+    links = {
+        "@tollbooth": tollbooth,
+        "@tollseg": tollseg.astype(float),
+        "@useclass": useclass.astype(float),
+        "length": rng.uniform(0.01, 2.0, num_links),
+    }
+    links.update((attr, np.zeros(num_links)) for attr in TOLL_ATTRS)
+    fac_index = np.unique((tollbooth * 1000 + tollseg * 10 + useclass)[tolled])
+    toll_rows = pd.DataFrame({"fac_index": fac_index.astype(int)})
+    for time_period in ["ea", "am", "md", "pm", "ev"]:
+        for src_veh in SRC_VEH_GROUPS:
+            toll_rows[f"toll{time_period}_{src_veh}"] = rng.uniform(
+                0, 10, len(fac_index)
+            ).round(2)
+    return links, toll_rows
+
+
+def loop_tolls_and_costs(toll_file: str, links: dict, time_period: str):
+    """Per-link toll and class cost calculation with a dictionary toll lookup."""
+    toll_index = {}
+    with open(toll_file, "r", encoding="UTF8") as toll_data:
+        header = [h.strip() for h in next(toll_data).split(",")]
+        for line in toll_data:
+            data = dict(zip(header, line.split(",")))
+            toll_index[int(data["fac_index"])] = data
+    link_list = [dict(zip(links, values)) for values in zip(*links.values())]
+    for link in link_list:
+        if link["@tollbooth"] <= 0:
+            continue
+        index = int(
+            link["@tollbooth"] * 1000 + link["@tollseg"] * 10 + link["@useclass"]
+        )
+        data_row = toll_index.get(index)
+        if data_row is None:
+            continue
+        toll_type = "bridge" if link["@tollbooth"] < VALUETOLL_START else "value"
+        for src_veh, dst_veh in zip(SRC_VEH_GROUPS, DST_VEH_GROUPS):
+            toll = float(data_row[f"toll{time_period.lower()}_{src_veh}"])
+            if toll_type == "bridge":
+                link[f"@bridgetoll_{dst_veh}"] = toll * 100
+            else:
+                link[f"@valuetoll_{dst_veh}"] = toll * link["length"] * 100
+    for assign_class in CLASSES:
+        toll_factor = assign_class.toll_factor or 1.0
+        for link in link_list:
+            toll_value = sum(link[attr] for attr in assign_class.toll)
+            link[f"@cost_{assign_class.name}"] = (
+                link["length"] * assign_class.operating_cost_per_mile
+                + toll_value * toll_factor
+            )
+    return link_list
+
+
+def vectorized_tolls_and_costs(toll_file: str, links: dict, time_period: str):
+    """Toll table join and class costs on the link attribute arrays."""
+    toll_table = read_toll_table(toll_file)
+    tolls, _ = calc_link_tolls(
+        toll_table,
+        links,
+        time_period,
+        SRC_VEH_GROUPS,
+        DST_VEH_GROUPS,
+        VALUETOLL_START,
+    )
+    results = dict(links, **tolls)
+    results.update(calc_link_class_costs(results, CLASSES))
+    return results
+
+
+def benchmark(num_links: int, toll_share: float, time_periods) -> pd.DataFrame:
+    """Time the loop and vectorized calculations for each period."""
+    links, toll_rows = synthetic_network(num_links, toll_share)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        toll_file = os.path.join(temp_dir, "tolls.csv")
+        toll_rows.to_csv(toll_file, index=False)
+        for time_period in time_periods:
+            start = time.perf_counter()
+            loop_links = loop_tolls_and_costs(toll_file, links, time_period)
+            loop_time = time.perf_counter() - start
+            start = time.perf_counter()
+            arrays = vectorized_tolls_and_costs(toll_file, links, time_period)
+            vector_time = time.perf_counter() - start
+            max_diff = max(
+                float(
+                    np.abs(np.array([link[attr] for link in loop_links]) - values).max()
+                )
+                for attr, values in arrays.items()
+            )
+            results.append(
+                {
+                    "period": time_period,
+                    "loop_s": loop_time,
+                    "vectorized_s": vector_time,
+                    "saving_s": loop_time - vector_time,
+                    "speedup": loop_time / vector_time,
+                    "max_abs_diff": max_diff,
+                }
+            )
+    return pd.DataFrame(results).set_index("period")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=USAGE, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--links", type=int, default=500000, help="Number of links.")
+    parser.add_argument(
+        "--toll-share", type=float, default=0.02, help="Share of tolled links."
+    )
+    parser.add_argument(
+        "--periods", nargs="*", default=["EA", "AM", "MD", "PM", "EV"], help="Periods."
+    )
+    args = parser.parse_args()
+    print(f"{args.links} synthetic links, {args.toll_share:.0%} tolled")
+    print(benchmark(args.links, args.toll_share, args.periods).round(3).to_string())
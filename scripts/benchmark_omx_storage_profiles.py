@@ -0,0 +1,111 @@
+USAGE = """
+
+Benchmark the OMX storage profiles (tm2py.emme.matrix.OMX_STORAGE_PROFILES)
+on synthetic skims: write time, read time and file size by profile.
+With --allocations, report the memory allocated by each OMXManager.write_array
+call with the "big to zero" mask and growth factor used for the transit skims.
+
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from tm2py.emme.matrix import OMX_STORAGE_PROFILES, OMXManager
+
+
+def synthetic_skims(num_zones: int, num_matrices: int, seed: int = 0):
+    """Skim-like arrays: smooth distance based values with unreachable cells."""
+    rng = np.random.default_rng(seed)
+    coords = rng.uniform(0, 100, (num_zones, 2))
+    dist = np.hypot(*(coords[:, None, :] - coords[None, :, :]).transpose(2, 0, 1))
+    skims = {}
+    for i in range(num_matrices):
+        skim = dist * rng.uniform(0.5, 2.0) + rng.uniform(0, 5, dist.shape)
+        skim[rng.random(dist.shape) < 0.1] = 0
+        skims[f"skim_{i}"] = skim
+    return skims
+
+
+def benchmark(num_zones: int, num_matrices: int, profiles=None) -> pd.DataFrame:
+    """Write and read the synthetic skims with each profile, return summary table."""
+    skims = synthetic_skims(num_zones, num_matrices)
+    data_mb = sum(skim.nbytes for skim in skims.values()) / 2**20
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in profiles or OMX_STORAGE_PROFILES:
+            path = os.path.join(temp_dir, f"{name}.omx")
+            start = time.perf_counter()
+            with OMXManager(path, "w", storage_profile=name) as omx_file:
+                for key, skim in skims.items():
+                    omx_file.write_array(skim, key)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            with OMXManager(path, "r") as omx_file:
+                max_error = max(
+                    float(np.abs(omx_file.read(key) - skim).max())
+                    for key, skim in skims.items()
+                )
+            read_time = time.perf_counter() - start
+            results.append(
+                {
+                    "profile": name,
+                    "size_mb": os.path.getsize(path) / 2**20,
+                    "write_s": write_time,
+                    "read_s": read_time,
+                    "write_mb_per_s": data_mb / write_time,
+                    "read_mb_per_s": data_mb / read_time,
+                    "max_abs_error": max_error,
+                }
+            )
+    return pd.DataFrame(results).set_index("profile")
+
+
+def allocations(num_zones: int, num_matrices: int, profiles=None) -> pd.DataFrame:
+    """Peak and retained memory allocated by each write_array call, by profile."""
+    skims = synthetic_skims(num_zones, num_matrices)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in profiles or OMX_STORAGE_PROFILES:
+            path = os.path.join(temp_dir, f"{name}.omx")
+            with OMXManager(
+                path, "w", mask_max_value=1e7, growth_factor=1, storage_profile=name
+            ) as omx_file:
+                for i, (key, skim) in enumerate(skims.items()):
+                    tracemalloc.start()
+                    omx_file.write_array(skim, key)
+                    retained, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    results.append(
+                        {
+                            "profile": name,
+                            "matrix": i,
+                            "peak_mb": peak / 2**20,
+                            "retained_mb": retained / 2**20,
+                        }
+                    )
+    return pd.DataFrame(results).set_index(["profile", "matrix"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=USAGE, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--zones", type=int, default=2000, help="Number of zones.")
+    parser.add_argument("--matrices", type=int, default=10, help="Number of skims.")
+    parser.add_argument(
+        "--profiles", nargs="*", default=None, help="Profiles to test, default all."
+    )
+    parser.add_argument(
+        "--allocations",
+        action="store_true",
+        help="Report memory allocated per matrix write instead of throughput.",
+    )
+    args = parser.parse_args()
+    print(f"{args.matrices} synthetic skims of {args.zones} zones")
+    run = allocations if args.allocations else benchmark
+    print(run(args.zones, args.matrices, args.profiles).round(3).to_string())
@@ -6,6 +6,31 @@ from unittest.mock import MagicMock
 
 import pytest
 
+_CACHE_TEST_TOML = """
+[logging]
+display_level = "INFO"
+
+[[time_periods]]
+name = "am"
+start_period = 6
+length_hours = 3
+highway_capacity_factor = 2.5
+emme_scenario_id = 12
+
+[scenario]
+[run]
+[warmstart]
+[household]
+[air_passenger]
+[internal_external]
+[truck]
+[active_modes]
+[highway]
+[transit]
+[post_processor]
+[emme]
+"""
+
 
 def test_config_read(examples_dir, inro_context):
     """Configuration should load parameters to the correct namespaces."""
@@ -51,3 +76,57 @@ def test_config_read_badfile():
         raise AssertionError("Should have thrown an exception.")
     except FileNotFoundError:
         pass
+
+
+def test_config_cache(tmp_path, monkeypatch):
+    """Cached Configuration is loaded without re-validation until the TOML changes."""
+    from tm2py.config import Configuration, LoggingConfig
+
+    # the test TOML is not a complete model config, skip the validation
+    # and count the Configuration instances created from the TOML data
+    validations = []
+    monkeypatch.setattr(
+        Configuration,
+        "__pydantic_validate_values__",
+        lambda self: validations.append(self),
+    )
+    toml_path = tmp_path / "config.toml"
+    toml_path.write_text(_CACHE_TEST_TOML)
+    cache_dir = tmp_path / "config_cache"
+
+    cold_config = Configuration.load_toml(toml_path, cache_dir=cache_dir)
+    assert len(validations) == 1
+    assert len(list(cache_dir.glob("config_*.pkl"))) == 1
+
+    cached_config = Configuration.load_toml(toml_path, cache_dir=cache_dir)
+    assert len(validations) == 1
+    assert isinstance(cached_config, Configuration)
+    assert cached_config.time_periods == cold_config.time_periods
+    # logging is re-created on each load
+    assert isinstance(cached_config.logging, LoggingConfig)
+    assert cached_config.logging.display_level == "INFO"
+
+    # editing the TOML gives a new cache entry
+    toml_path.write_text(
+        _CACHE_TEST_TOML.replace("length_hours = 3", "length_hours = 4")
+    )
+    edited_config = Configuration.load_toml(toml_path, cache_dir=cache_dir)
+    assert len(validations) == 2
+    assert edited_config.time_periods[0]["length_hours"] == 4
+    assert len(list(cache_dir.glob("config_*.pkl"))) == 2
+
+    # an unreadable cache file is replaced
+    for cache_path in cache_dir.glob("config_*.pkl"):
+        cache_path.write_bytes(b"not a pickle")
+    with pytest.warns(UserWarning, match="not used"):
+        config = Configuration.load_toml(toml_path, cache_dir=cache_dir)
+    assert len(validations) == 3
+    assert config.time_periods == edited_config.time_periods
+
+    # validated config written with to_pickle / from_pickle
+    config_path = tmp_path / "config.pkl"
+    cold_config.to_pickle(config_path)
+    assert Configuration.from_pickle(config_path).time_periods == (
+        cold_config.time_periods
+    )
+    assert len(validations) == 3
@@ -0,0 +1,147 @@
+"""Testing module for the global iteration convergence monitor."""
+
+from collections import deque
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+
+def test_convergence_metrics():
+    """Demand-weighted skim RMSE, demand and link flow changes from summaries."""
+    from tm2py.components.convergence_monitor import (
+        _SUMMARY_KEYS,
+        _add_matrix_summary,
+        _combine_summaries,
+        _metrics,
+    )
+
+    prev_demand = np.array([[0.0, 10.0], [30.0, 0.0]])
+    demand = np.array([[0.0, 20.0], [20.0, 0.0]])
+    prev_skim = np.array([[0.0, 5.0], [5.0, 1e20]])
+    skim = np.array([[0.0, 8.0], [4.0, 1e20]])
+
+    summary = dict.fromkeys(_SUMMARY_KEYS, 0.0)
+    summary["has_previous"] = True
+    _add_matrix_summary(summary, demand, prev_demand, skim, prev_skim)
+    summary["flow_abs_change"] = 5.0
+    summary["prev_flow"] = 100.0
+    metrics = _metrics(_combine_summaries([summary]))
+
+    # (20 * 3^2 + 20 * 1^2) / 40
+    assert metrics["skim_rmse"] == pytest.approx(5.0**0.5)
+    assert metrics["demand_change"] == pytest.approx(0.0)
+    assert metrics["demand_relative_change"] == pytest.approx(0.5)
+    assert metrics["link_flow_relative_change"] == pytest.approx(0.05)
+
+    no_previous = dict(summary, has_previous=False)
+    metrics = _metrics(_combine_summaries([summary, no_previous]))
+    assert all(np.isnan(value) for value in metrics.values())
+
+
+def test_convergence_criteria():
+    """Converged only if all set thresholds are met after min_iterations."""
+    from tm2py.components.convergence_monitor import ConvergenceMonitor
+    from tm2py.config import ConvergenceConfig
+
+    controller = MagicMock()
+    controller.config.convergence = ConvergenceConfig(
+        max_skim_rmse=0.1, max_link_flow_relative_change=0.01, min_iterations=2
+    )
+    monitor = ConvergenceMonitor(controller)
+    summary = {
+        "has_previous": True,
+        "weighted_sq_skim_change": 0.0004,
+        "skim_weight": 1.0,
+        "demand": 100.0,
+        "prev_demand": 100.0,
+        "demand_abs_change": 50.0,
+        "flow_abs_change": 5.0,
+        "prev_flow": 1000.0,
+    }
+
+    controller.iteration = 1
+    assert not monitor._converged(summary)
+    controller.iteration = 2
+    # demand_relative_change 0.5 is not checked, no max_demand_relative_change
+    assert monitor._converged(summary)
+    assert not monitor._converged(dict(summary, flow_abs_change=50.0))
+    assert not monitor._converged(dict(summary, has_previous=False))
+
+    controller.config.convergence = ConvergenceConfig()
+    monitor = ConvergenceMonitor(controller)
+    assert not monitor._converged(summary)
+
+
+def test_convergence_state_cleared(tmp_path):
+    """State and summary from a previous run are removed on global iteration 1."""
+    from tm2py.components.convergence_monitor import ConvergenceMonitor
+    from tm2py.config import ConvergenceConfig
+
+    controller = MagicMock()
+    controller.config.convergence = ConvergenceConfig()
+    controller.get_abs_path = lambda path: tmp_path / path
+    monitor = ConvergenceMonitor(controller)
+    monitor._save_state("AM_auto_volume", np.ones(3))
+    output_path = tmp_path / controller.config.convergence.output_file
+    output_path.parent.mkdir(parents=True)
+    output_path.write_text("iteration,time_period\n")
+
+    monitor._clear_state()
+    assert monitor._load_state("AM_auto_volume") is None
+    assert not output_path.exists()
+
+
+def test_skip_to_final_components(tmp_path, monkeypatch):
+    """Global iterations after convergence are skipped, the final components run."""
+    import tm2py.controller
+    from tm2py.controller import RunController
+
+    monkeypatch.setattr(tm2py.controller, "add_run_log", MagicMock())
+    controller = RunController.__new__(RunController)
+    controller.config = SimpleNamespace(
+        run=SimpleNamespace(
+            start_iteration=1,
+            end_iteration=4,
+            initial_components=[],
+            global_iteration_components=["highway", "convergence_monitor"],
+            final_components=["post_processor"],
+            start_component=None,
+        ),
+        warmstart=SimpleNamespace(warmstart=False),
+    )
+    controller.logger = MagicMock()
+    controller.completed_components = []
+    controller._run_dir = tmp_path
+    controller._iteration = None
+    controller._component = None
+    controller._queued_components = deque()
+    names = ["highway", "convergence_monitor", "post_processor"]
+    controller._component_map = {name: MagicMock() for name in names}
+    controller._validated_components = set(names)
+
+    def _check_convergence():
+        if controller.iteration == 2:
+            controller.skip_to_final_components()
+
+    monitor = controller._component_map["convergence_monitor"]
+    monitor.run.side_effect = _check_convergence
+    controller._queue_components()
+    assert len(controller._queued_components) == 9
+
+    controller.run_next()
+    controller.run_next()
+    controller.run_next()
+    controller.run_next()
+    assert [(i, name) for i, name, _ in controller._queued_components] == [
+        (5, "post_processor")
+    ]
+    controller.run()
+    assert [(i, name) for i, name, _ in controller.completed_components] == [
+        (1, "highway"),
+        (1, "convergence_monitor"),
+        (2, "highway"),
+        (2, "convergence_monitor"),
+        (5, "post_processor"),
+    ]
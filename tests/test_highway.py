@@ -49,3 +49,173 @@ def test_highway_skims(examples_dir):
 
     assert len(missing_skims) == 0, f"Missing skims: {missing_skims}"
     assert len(different_skims) == 0, f"Different skims: {different_skims}"
+
+
+def test_skim_post_processor(inro_context):
+    """Time skims and intrazonal values are updated in place and uploaded once."""
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_assign import SkimPostProcessor
+
+    class _Cache:
+        def __init__(self, data):
+            self.data = data
+            self.uploads = []
+
+        def get_data(self, name):
+            return self.data[name]
+
+        def set_data(self, name, data):
+            self.uploads.append(name)
+            self.data[name] = data
+
+    gencost = np.array([[1.0, 5.0, 9.0], [6.0, 2.0, np.nan], [8.0, 7.0, 3.0]])
+    cost = np.array([[0.0, 2.0, 4.0], [2.0, 0.0, 0.0], [4.0, 2.0, 0.0]])
+    dist = np.array([[0.0, 3.0, 1.0], [2.0, 0.0, 5.0], [4.0, 6.0, 0.0]])
+    expected_time = gencost - 0.5 * cost
+    cache = _Cache({"time": gencost, "cost": cost, "dist": dist})
+    processor = SkimPostProcessor(cache)
+    processor.subtract("time", "cost", 0.5)
+    for name in ["time", "dist"]:
+        processor.set_intrazonal_half_min(name)
+        assert cache.get_data(name) is {"time": gencost, "dist": dist}[name]
+    np.fill_diagonal(expected_time, [2.0, 2.5, 3.0])
+    assert np.allclose(gencost, expected_time, equal_nan=True)
+    assert np.allclose(np.diag(dist), [0.5, 1.0, 2.0])
+    assert cache.uploads == []
+    processor.flush(upload=False)
+    assert cache.uploads == []
+    processor.subtract("time", "cost", 0.0)
+    processor.flush()
+    assert cache.uploads == ["time"]
+
+
+def test_compile_emme_expression(inro_context):
+    """Emme expressions with .min., comparisons and put / get as NumPy functions."""
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_numpy_assign import (
+        compile_emme_expression,
+    )
+
+    func, names = compile_emme_expression(
+        "@ffs * (1 + 0.2 * (put((volau + volad)/el2)/0.75) ** 2) "
+        "+ ( 2 * ( get(1).min.1.5 - 1 ) ) * (get(1) .gt. 1)"
+    )
+    assert names == ["@ffs", "el2", "volad", "volau"]
+    volau = np.array([0.0, 100.0, 300.0])
+    ratio = volau / 100
+    expected = 10 * (1 + 0.2 * (ratio / 0.75) ** 2) + 2 * (
+        np.minimum(ratio, 1.5) - 1
+    ) * (ratio > 1)
+    values = func(**{"@ffs": 10.0, "volau": volau, "volad": 0.0, "el2": 100.0})
+    assert np.allclose(values, expected)
+    assert compile_emme_expression("-2 ** 2 + 3 .max. 4")[0]() == 0
+    with pytest.raises(ValueError):
+        compile_emme_expression("el1 * unknown(volau)")
+
+
+def test_numpy_traffic_assignment(inro_context):
+    """Equilibrium on two routes, without paths through zones."""
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_numpy_assign import (
+        AssignmentClassData,
+        AssignmentGraph,
+        StaticTrafficAssignment,
+        VolumeDelayFunctions,
+    )
+
+    # zones 0, 1 and 5, route 2-3 and route 2-4-3, 2-5-3 passes through zone 5
+    links = [(0, 2), (2, 3), (2, 4), (4, 3), (3, 1), (2, 5), (5, 3)]
+    i_nodes, j_nodes = (np.array(nodes) for nodes in zip(*links))
+    link_values = {
+        "ftime": np.array([0.0, 10.0, 15.0, 0.0, 0.0, 0.0, 0.0]),
+        "slope": np.array([1.0, 10.0, 20.0, 1.0, 1.0, 1.0, 1.0]),
+        "dist": np.array([1.0, 0.0, 0.0, 0.0, 2.0, 0.0, 0.0]),
+    }
+    vdf = VolumeDelayFunctions(
+        {1: "ftime + (volau + volad) / slope", 8: "ftime"},
+        np.array([8, 1, 1, 8, 8, 8, 8]),
+        link_values,
+    )
+    graph = AssignmentGraph(i_nodes, j_nodes, 6, np.array([0, 1, 5]))
+    demand = np.zeros((3, 3))
+    demand[0, 1] = 300.0
+    classes = [
+        AssignmentClassData("da", demand, skim_values={"dist": link_values["dist"]})
+    ]
+    assignment = StaticTrafficAssignment(graph, vdf, classes, num_threads=2)
+    results = assignment.run(max_iterations=50, relative_gap=1e-6)
+    # 10 + v1 / 10 = 15 + (300 - v1) / 20
+    assert np.allclose(
+        results["volumes"][0], [300, 400 / 3, 500 / 3, 500 / 3, 300, 0, 0]
+    )
+    assert abs(results["costs"][0][0, 1] - 70 / 3) < 1e-3
+    assert results["costs"][0][0, 0] == results["costs"][0][0, 2] == 0.0
+    assert results["costs"][0][1, 0] == 1e20
+    assert results["skims"][0]["dist"][0, 1] == 3.0
+    assert assignment.iterations[-1]["gap"] <= 1e-6
+
+    # with a perceived cost on route 2-3 all demand uses route 2-4-3
+    classes[0].link_costs = np.array([0.0, 100.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+    classes[0].perception_factor = 1.0
+    results = assignment.run(max_iterations=50, relative_gap=1e-6)
+    assert np.allclose(results["volumes"][0], [300, 0, 300, 300, 300, 0, 0])
+
+
+def test_assignment_warm_start(inro_context):
+    """Warm start from previous volumes and the relative gap schedule."""
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_emme_spec import (
+        scheduled_relative_gap,
+    )
+    from tm2py.components.network.highway.highway_numpy_assign import (
+        AssignmentClassData,
+        AssignmentGraph,
+        StaticTrafficAssignment,
+        VolumeDelayFunctions,
+    )
+
+    assert scheduled_relative_gap(0.05, 0.0005, 0, 4) == 0.05
+    assert abs(scheduled_relative_gap(0.05, 0.0005, 2, 4) - 0.005) < 1e-12
+    assert abs(scheduled_relative_gap(0.05, 0.0005, 4, 4) - 0.0005) < 1e-12
+    assert abs(scheduled_relative_gap(0.05, 0.0005, 6, 4) - 0.0005) < 1e-12
+
+    links = [(0, 2), (2, 3), (2, 4), (4, 3), (3, 1)]
+    i_nodes, j_nodes = (np.array(nodes) for nodes in zip(*links))
+    link_values = {
+        "ftime": np.array([0.0, 10.0, 15.0, 0.0, 0.0]),
+        "slope": np.array([1.0, 10.0, 20.0, 1.0, 1.0]),
+    }
+    vdf = VolumeDelayFunctions(
+        {1: "ftime + (volau + volad) / slope", 8: "ftime"},
+        np.array([8, 1, 1, 8, 8]),
+        link_values,
+    )
+    graph = AssignmentGraph(i_nodes, j_nodes, 5, np.array([0, 1]))
+    demand = np.array([[0.0, 300.0], [0.0, 0.0]])
+    classes = [AssignmentClassData("da", demand)]
+    assignment = StaticTrafficAssignment(graph, vdf, classes)
+    results = assignment.run(max_iterations=50, relative_gap=1e-6)
+    prev_volumes, prev_demand = results["volumes"], np.stack([demand])
+
+    # same demand: converged from the start
+    initial_volumes = assignment.warm_start(prev_volumes, prev_demand)
+    assignment.run(
+        max_iterations=50, relative_gap=1e-6, initial_volumes=initial_volumes
+    )
+    assert len(assignment.iterations) == 1
+
+    # more demand: 10 + v1 / 10 = 15 + (360 - v1) / 20
+    classes[0].demand = np.array([[0.0, 360.0], [0.0, 0.0]])
+    assignment.run(max_iterations=50, relative_gap=1e-6)
+    cold_iterations = len(assignment.iterations)
+    initial_volumes = assignment.warm_start(prev_volumes, prev_demand)
+    assert np.allclose(initial_volumes[0, [0, 4]], 360)
+    results = assignment.run(
+        max_iterations=50, relative_gap=1e-6, initial_volumes=initial_volumes
+    )
+    assert len(assignment.iterations) <= cold_iterations
+    assert np.allclose(results["volumes"][0], [360, 460 / 3, 620 / 3, 620 / 3, 360])
@@ -35,3 +35,141 @@ def test_maz_da_skims(examples_dir):
     run_csv = os.path.join(run_dir_hwy_skims, "HWYSKIM_MAZMAZ_DA.csv")
 
     return assert_csv_equal(ref_csv, run_csv)
+
+
+def test_distance_bins_by_origin(inro_context):
+    "MAZ demand pairs are binned by the furthest destination from each origin."
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_maz import distance_bins_by_origin
+
+    origins = np.array([10, 10, 20, 30, 30, 40])
+    distances = np.array([0.5, 1.5, 0.9, 1.0, 0.1, 3.0])
+    bins = distance_bins_by_origin(origins, distances, [0, 1.0, 2.0, 3.0])
+    # all pairs from an origin share a bin, upper edges are exclusive except the last
+    assert bins.tolist() == [1, 1, 0, 1, 1, 2]
+
+
+_LINK_INDEX = {1: {2: 0, 5: 4}, 2: {3: 1, 1: 5}, 3: {4: 2}, 5: {4: 3}, 4: {1: 6}}
+_PATHS = {(1, 3): [1, 2, 3], (1, 4): [1, 5, 4], (2, 1): [2, 1], (2, 4): [2, 3, 4]}
+
+
+def _write_path_files(path_dir, roots, leaves):
+    """Write _PATHS in the Emme text format, a path per line, and binary format,
+    header, path start indices by root, leaf and the node numbers."""
+    import numpy as np
+
+    with open(path_dir / "sp.txt", "w", encoding="utf8") as text_file:
+        for path in _PATHS.values():
+            text_file.write(" ".join(str(n) for n in path) + "\n")
+    path_index, nodes = [0], []
+    for p in roots:
+        for q in leaves:
+            nodes.extend(_PATHS.get((p, q), []))
+            path_index.append(len(nodes))
+    with open(path_dir / "sp.ebp", "wb") as binary_file:
+        np.array([0, 0, len(roots), len(leaves)], dtype=np.uint64).tofile(binary_file)
+        np.array(path_index, dtype=np.uint64).tofile(binary_file)
+        np.array(nodes, dtype=np.uint32).tofile(binary_file)
+
+
+def test_binary_path_flows_match_text(inro_context, tmp_path):
+    "Flows loaded from the memory-mapped binary paths file match the text paths."
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_maz import (
+        BinaryPathFile,
+        LinkLookup,
+    )
+
+    roots, leaves = np.array([1, 2]), np.array([1, 3, 4])
+    _write_path_files(tmp_path, roots, leaves)
+    orig = np.array([1, 1, 2, 2, 1])
+    dest = np.array([3, 4, 1, 4, 1])
+    demand = np.array([1.0, 2.0, 4.0, 8.0, 16.0])
+
+    text_flow = np.zeros(7)
+    with open(tmp_path / "sp.txt", encoding="utf8") as text_file:
+        text_paths = [[int(n) for n in line.split()] for line in text_file]
+    text_paths = dict(((path[0], path[-1]), path) for path in text_paths)
+    for o, d, dem in zip(orig, dest, demand):
+        path = text_paths.get((o, d), [])
+        for i_node, j_node in zip(path[:-1], path[1:]):
+            text_flow[_LINK_INDEX[i_node][j_node]] += dem
+
+    lookup = LinkLookup(_LINK_INDEX)
+    binary_flow = np.zeros(lookup.num_links)
+    with BinaryPathFile(str(tmp_path / "sp.ebp"), roots, leaves) as path_file:
+        i_nodes, j_nodes, flows, found = path_file.link_hops(orig, dest, demand)
+        np.add.at(binary_flow, lookup(i_nodes, j_nodes), flows)
+    assert np.array_equal(binary_flow, text_flow)
+    assert found.tolist() == [True, True, True, True, False]
+    # the file is closed on exit and can be removed
+    (tmp_path / "sp.ebp").unlink()
+
+    with pytest.raises(KeyError):
+        lookup(np.array([1, 9]), np.array([2, 1]))
+
+
+def test_load_path_flows_in_process_pool(inro_context, tmp_path):
+    "Per-bin flow vectors from worker processes match loading in process."
+    from concurrent.futures import ProcessPoolExecutor
+
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_maz import (
+        LinkLookup,
+        _set_worker_link_lookup,
+        load_path_flows,
+    )
+
+    roots, leaves = np.array([1, 2]), np.array([1, 3, 4])
+    _write_path_files(tmp_path, roots, leaves)
+    demand = {
+        "orig": np.array([1, 1, 2, 2, 1]),
+        "dest": np.array([3, 4, 1, 4, 1]),
+        "dem": np.array([1.0, 2.0, 4.0, 8.0, 16.0]),
+    }
+    lookup = LinkLookup(_LINK_INDEX)
+    expected = np.array([1.0, 9.0, 8.0, 2.0, 2.0, 4.0, 0.0])
+    tasks = {}
+    with ProcessPoolExecutor(
+        max_workers=2, initializer=_set_worker_link_lookup, initargs=(lookup,)
+    ) as pool:
+        for name in ["sp.txt", "sp.ebp"]:
+            args = (str(tmp_path / name), roots, leaves, demand)
+            flow, stats = load_path_flows(*args, lookup)
+            assert np.array_equal(flow, expected)
+            assert stats["assigned"] == 15.0 and stats["not_assigned"] == 16.0
+            tasks[name] = pool.submit(load_path_flows, *args)
+        for task in tasks.values():
+            flow, stats = task.result()
+            assert np.array_equal(flow, expected)
+            assert stats["links"] == 7
+
+
+def test_maz_skim_cache(inro_context, tmp_path):
+    "Cached MAZ skims are used only for the same inputs and link costs in threshold."
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_maz import MazSkimCache
+
+    links = np.array([[1, 2], [2, 3]])
+    key = MazSkimCache.key(links, np.array([10, 20]), max_skim_cost=11.0)
+    assert key == MazSkimCache.key(links, np.array([10, 20]), max_skim_cost=11.0)
+    assert key != MazSkimCache.key(links, np.array([10, 21]), max_skim_cost=11.0)
+    assert key != MazSkimCache.key(links, np.array([10, 20]), max_skim_cost=12.0)
+
+    link_cost = np.array([1.0, 2.5])
+    results = {"FROM_ZONE": np.array([10.0, 20.0]), "COST": np.array([1.0, 3.5])}
+    cache = MazSkimCache(str(tmp_path / "cache"))
+    assert cache.load(key, link_cost) is None
+    cache.save(key, link_cost, results)
+    cached = cache.load(key, link_cost)
+    assert list(cached) == ["FROM_ZONE", "COST"]
+    assert np.array_equal(cached["COST"], results["COST"])
+    assert cache.load(key, link_cost + [0.0, 0.01]) is None
+
+    cache = MazSkimCache(str(tmp_path / "cache"), max_cost_change=0.1)
+    assert cache.load(key, link_cost + [0.0, 0.01]) is not None
+    assert cache.load(key, link_cost + [0.0, 0.5]) is None
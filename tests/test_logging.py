@@ -135,3 +135,67 @@ def test_log(tmp_path: pathlib.Path):
     # assert "DEBUG  A debug message\n" in text
     # assert "DEBUG  A debug report that takes time to produce\n" in text
     # assert "TRACE  A trace message\n" in text
+
+
+def test_log_suppress_repeated_and_cache_size(tmp_path: pathlib.Path):
+    """Test aggregation of repeated messages and the bounded message cache."""
+    from tm2py.config import LoggingConfig
+    from tm2py.logger import Logger
+
+    log_config = {
+        "display_level": "ERROR",
+        "run_file_path": "tm2py_run.log",
+        "run_file_level": "STATUS",
+        "log_file_path": "tm2py_debug.log",
+        "log_file_level": "DEBUG",
+        "log_on_error_file_path": "tm2py_error.log",
+        "notify_slack": False,
+        "use_emme_logbook": False,
+        "iter_component_level": None,
+        "log_cache_size": 5,
+        "repeated_message_limit": 3,
+    }
+
+    class Config:
+        logging = LoggingConfig(**log_config)
+
+    class Controller:
+        def __init__(self, run_dir):
+            self.config = Config()
+            self.run_dir = run_dir
+            self.iter_component = None
+            self.logger = Logger(self)
+
+    controller = Controller(tmp_path)
+    logger = controller.logger
+    for i in range(10):
+        logger.debug(f"do not assign demand from {i} to {i + 1}")
+    # only DEBUG and TRACE are suppressed
+    for i in range(5):
+        logger.status(f"Running step {i}")
+    logger.info("a different message")
+    logger.flush()
+
+    with open(os.path.join(tmp_path, log_config["log_file_path"]), "r") as f:
+        text = f.readlines()
+    assert len(text) == 10
+    assert text[2].endswith("do not assign demand from 2 to 3\n")
+    assert text[3].endswith(
+        "7 similar messages suppressed, last: do not assign demand from 9 to 10\n"
+    )
+    assert text[8].endswith("Running step 4\n")
+    assert text[9].endswith("a different message\n")
+
+    logger.info("one more message")
+    logger.status("last message")
+    logger._log_cache.write_cache()
+    with open(os.path.join(tmp_path, log_config["log_on_error_file_path"]), "r") as f:
+        text = f.readlines()
+    # the cache has all messages, including the suppressed ones, but only the
+    # last 5 of 18 are kept
+    assert len(text) == 6
+    assert text[0] == "13 earlier messages dropped from cache\n"
+    assert text[1].endswith("Running step 3\n")
+    assert text[-1].endswith("last message\n")
+    assert not any("suppressed" in line for line in text)
+    logger.close()
@@ -0,0 +1,68 @@
+"""Testing module for the matrix helper functions."""
+
+import os
+
+import pytest
+
+
+def test_averaged_demand_store(tmp_path, inro_context):
+    """Averaged demand store applies MSA and can resume from a stored iteration."""
+    import numpy as np
+
+    from tm2py.matrix import AveragedDemandStore, msa_step_size
+
+    assert msa_step_size(1) == 1.0
+    assert msa_step_size(3) == pytest.approx(1.0 / 3.0)
+    assert msa_step_size(2, (1.0, 0.25)) == 0.25
+    assert msa_step_size(3, (1.0, 0.25)) == pytest.approx(1.0 / 3.0)
+
+    store = AveragedDemandStore(str(tmp_path / "demand"))
+    demands = [np.full((3, 3), value) for value in (6.0, 12.0, 3.0)]
+    for iteration, demand in enumerate(demands, start=1):
+        averaged = store.update("AM_da", demand, iteration, msa_step_size(iteration))
+    assert averaged.dtype == np.float64
+    assert np.allclose(averaged, 7.0)
+    assert np.allclose(store.load("AM_da", 2), 9.0)
+    assert store.load("AM_da", 4) is None
+
+    # resume at iteration 3 from a new store object
+    resumed = AveragedDemandStore(str(tmp_path / "demand"))
+    averaged = resumed.update("AM_da", demands[2], 3, msa_step_size(3))
+    assert np.allclose(averaged, 7.0)
+
+    # float32 store for less disk space
+    store = AveragedDemandStore(str(tmp_path / "demand32"), "float32")
+    averaged = store.update("AM_da", demands[0], 1)
+    assert averaged.dtype == np.float32
+    assert np.allclose(averaged, 6.0)
+
+
+def test_averaged_demand_store_rerun(tmp_path, inro_context, monkeypatch):
+    """Rerun of an iteration does not replace a file which is still mapped."""
+    import numpy as np
+
+    from tm2py.matrix import AveragedDemandStore
+
+    store = AveragedDemandStore(str(tmp_path / "demand"))
+    first = store.update("AM_da", np.full((3, 3), 6.0), 1)
+    mapped = {os.path.abspath(first.filename)}
+    os_remove = os.remove
+
+    def _remove(path):
+        # as on Windows, a memory-mapped file cannot be removed
+        if os.path.abspath(path) in mapped:
+            raise PermissionError(path)
+        os_remove(path)
+
+    monkeypatch.setattr(os, "remove", _remove)
+    second = store.update("AM_da", np.full((3, 3), 2.0), 1)
+    assert np.allclose(first, 6.0)
+    assert np.allclose(second, 2.0)
+    assert np.allclose(store.load("AM_da", 1), 2.0)
+    assert store.path("AM_da", 1).endswith("AM_da_iter1_v1.npy")
+
+    # the unused previous version is removed by the next update
+    mapped.clear()
+    third = store.update("AM_da", np.full((3, 3), 4.0), 1)
+    assert np.allclose(third, 4.0)
+    assert sorted(os.listdir(tmp_path / "demand")) == ["AM_da_iter1_v2.npy"]
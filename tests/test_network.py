@@ -2,6 +2,7 @@
 
 import os
 import sys
+from unittest.mock import MagicMock
 
 import pytest
 
@@ -12,3 +13,137 @@ def test_get_blended_skim(inro_context):
 
     # TODO
     pass
+
+
+def test_active_modes_distance_graph(inro_context):
+    """Bounded csgraph distances do not pass through leaves or centroids."""
+    import numpy as np
+
+    from tm2py.components.network.active.active_modes import DistanceGraph
+
+    # node 3 is a centroid, nodes 0, 1 and 4 are leaves, 0 and 1 also roots
+    links = [
+        (0, 2, 1.0),
+        (2, 1, 1.0),
+        (1, 2, 1.0),
+        (2, 0, 1.0),
+        (2, 4, 5.0),
+        (0, 3, 0.5),
+        (3, 4, 0.5),
+        (2, 5, 1.0),
+        (5, 4, 1.0),
+        (1, 4, 0.1),
+    ]
+    i_nodes, j_nodes, lengths = (np.array(values) for values in zip(*links))
+    blocked = np.array([True, True, False, True, True, False])
+    graph = DistanceGraph(i_nodes, j_nodes, lengths, 6, blocked)
+    roots, leaves = np.array([0, 1]), np.array([0, 1, 4])
+
+    root_index, leaf_index, distance = graph.distances(roots, leaves)
+    assert root_index.tolist() == [0, 0, 1, 1]
+    assert leaf_index.tolist() == [1, 2, 0, 2]
+    assert np.allclose(distance, [2.0, 3.0, 2.0, 0.1])
+
+    root_index, leaf_index, distance = graph.distances(roots, leaves, max_dist=2.5)
+    assert root_index.tolist() == [0, 1, 1]
+    assert leaf_index.tolist() == [1, 0, 2]
+    assert np.allclose(distance, [2.0, 2.0, 0.1])
+
+
+def test_highway_link_tolls_and_costs(inro_context, tmp_path):
+    """Bridge, value tolls and class costs from the toll table by link fac_index."""
+    from types import SimpleNamespace
+
+    import numpy as np
+
+    from tm2py.components.network.highway.highway_network import (
+        calc_link_class_costs,
+        calc_link_tolls,
+        read_toll_table,
+    )
+
+    toll_file = tmp_path / "tolls.csv"
+    toll_file.write_text(
+        "fac_index, tollam_da, tollam_sr2\n"
+        "1011, 5.0, 2.5\n"
+        "11011, 0.25, 0.1\n"
+        "11021, 0.5, 0.2\n"
+    )
+    toll_table = read_toll_table(toll_file)
+    # bridge, value, value with missing index, value, not tolled
+    links = {
+        "@tollbooth": np.array([1, 11, 12, 11, 0]),
+        "@tollseg": np.array([1, 1, 1, 2, 0]),
+        "@useclass": np.array([1, 1, 1, 1, 1]),
+        "length": np.array([1.0, 2.0, 3.0, 4.0, 5.0]),
+        "@bridgetoll_da": np.zeros(5),
+        "@valuetoll_da": np.zeros(5),
+        "@bridgetoll_s2": np.zeros(5),
+        "@valuetoll_s2": np.zeros(5),
+    }
+    tolls, missing = calc_link_tolls(
+        toll_table, links, "AM", ["da", "sr2"], ["da", "s2"], 11
+    )
+    assert np.allclose(tolls["@bridgetoll_da"], [500, 0, 0, 0, 0])
+    assert np.allclose(tolls["@valuetoll_da"], [0, 50, 0, 200, 0])
+    assert np.allclose(tolls["@bridgetoll_s2"], [250, 0, 0, 0, 0])
+    assert np.allclose(tolls["@valuetoll_s2"], [0, 20, 0, 80, 0])
+    assert missing.to_dict() == {12011: 1}
+
+    links.update(tolls)
+    classes = [
+        SimpleNamespace(
+            name="DA",
+            operating_cost_per_mile=10.0,
+            toll=("@bridgetoll_da", "@valuetoll_da"),
+            toll_factor=None,
+        ),
+        SimpleNamespace(
+            name="SR2",
+            operating_cost_per_mile=10.0,
+            toll=("@bridgetoll_s2", "@valuetoll_s2"),
+            toll_factor=0.5,
+        ),
+    ]
+    costs = calc_link_class_costs(links, classes)
+    assert np.allclose(costs["@cost_da"], [510, 70, 30, 240, 50])
+    assert np.allclose(costs["@cost_sr2"], [135, 30, 30, 80, 50])
+
+
+def test_network_snapshot_cache(inro_context):
+    """Network snapshot is loaded once and only new or changed attributes are copied."""
+    from tm2py.emme.network import NetworkSnapshotCache
+
+    emme_manager = MagicMock()
+    scenario = MagicMock()
+    network = scenario.get_partial_network.return_value
+    network.attributes.return_value = ["headway", "#node_id"]
+    network.element_totals = {"transit_lines": 10, "regular_nodes": 20}
+
+    snapshot = NetworkSnapshotCache(emme_manager, scenario, domains=["NODE"])
+    view = snapshot.get({"TRANSIT_LINE": ["headway"]})
+    view = snapshot.get({"TRANSIT_LINE": ["headway"], "NODE": ["#node_id"]})
+    assert scenario.get_partial_network.call_count == 1
+    copied = [c.args[2] for c in emme_manager.copy_attribute_values.call_args_list]
+    assert copied == [{"TRANSIT_LINE": ["headway"]}, {"NODE": ["#node_id"]}]
+    assert snapshot.memory_estimate == 8 * (10 + 20)
+
+    # attributes created in the scenario after load are added to the network
+    snapshot.invalidate({"TRANSIT_LINE": ["headway"]})
+    snapshot.get({"TRANSIT_LINE": ["headway", "@orig_hdw"]})
+    network.create_attribute.assert_called_once_with("TRANSIT_LINE", "@orig_hdw")
+    assert emme_manager.copy_attribute_values.call_args.args[2] == {
+        "TRANSIT_LINE": ["headway", "@orig_hdw"]
+    }
+
+    # a request for a new domain reloads and restores copied attributes
+    snapshot.get({"TRANSIT_SEGMENT": ["transit_boardings"]})
+    assert scenario.get_partial_network.call_count == 2
+    assert emme_manager.copy_attribute_values.call_args_list[-2].args[2] == {
+        "NODE": ["#node_id"],
+        "TRANSIT_LINE": ["@orig_hdw", "headway"],
+    }
+
+    assert view.transit_lines is network.transit_lines
+    with pytest.raises(AttributeError):
+        view.set_attribute_values("TRANSIT_LINE", ["headway"], [])
@@ -0,0 +1,133 @@
+"""Testing module for the OMXManager OMX file interface."""
+
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+
+def test_omx_manager_async_write(tmp_path, inro_context):
+    """Async OMX writes snapshot the data, respect the budget and raise errors."""
+    import numpy as np
+
+    from tm2py.emme.matrix import OMXManager
+
+    path = str(tmp_path / "skims.omx")
+    data = np.arange(16, dtype="float64").reshape(4, 4)
+    with OMXManager(path, "w", async_write=True, max_pending_bytes=200) as omx_file:
+        omx_file.create_mapping("zone_number", [1, 2, 3, 4])
+        for name in ["a", "b", "c"]:
+            omx_file.write_array(data, name)
+            # later changes by the caller are not written
+            data += 1
+        omx_file.flush()
+        assert omx_file._pending_bytes == 0
+    with OMXManager(path, "r") as omx_file:
+        for i, name in enumerate(["a", "b", "c"]):
+            assert (omx_file.read(name) == np.arange(16).reshape(4, 4) + i).all()
+
+    with pytest.raises(Exception):
+        with OMXManager(path, "w", async_write=True) as omx_file:
+            omx_file.write_array(data, "a")
+            omx_file.write_array(data, "a")
+
+
+def test_omx_manager_async_write_lock(tmp_path, inro_context):
+    """The async writer thread waits for HDF5 access by other OMX files."""
+    import numpy as np
+
+    from tm2py.emme.matrix import _HDF5_LOCK, OMXManager
+
+    data = np.arange(16, dtype="float64").reshape(4, 4)
+    read_path = str(tmp_path / "read.omx")
+    with OMXManager(read_path, "w") as omx_file:
+        omx_file.write_array(data, "a")
+
+    write_path = str(tmp_path / "write.omx")
+    with OMXManager(read_path, "r") as read_file:
+        with OMXManager(write_path, "w", async_write=True) as write_file:
+            with _HDF5_LOCK:
+                write_file.write_array(data, "b")
+                # the queued write does not run while the lock is held
+                time.sleep(0.2)
+                assert write_file._pending_bytes == data.nbytes
+                assert (read_file.read("a") == data).all()
+            write_file.flush()
+            assert write_file._pending_bytes == 0
+    with OMXManager(write_path, "r") as omx_file:
+        assert (omx_file.read("b") == data).all()
+
+
+def test_omx_storage_profiles(tmp_path, inro_context):
+    """OMX storage profiles set the data type, compression and chunk shape."""
+    import numpy as np
+
+    from tm2py.emme.matrix import OMX_STORAGE_PROFILES, OMXManager
+
+    data = np.random.default_rng(0).uniform(0, 100, (300, 300))
+    for name, profile in OMX_STORAGE_PROFILES.items():
+        path = str(tmp_path / f"{name}.omx")
+        with OMXManager(path, "w", storage_profile=name) as omx_file:
+            omx_file.write_array(data, "skim")
+        with OMXManager(path, "r") as omx_file:
+            node = omx_file._omx_file["skim"]
+            assert node.dtype == np.dtype(profile.dtype or "float64")
+            assert node.chunkshape == (min(profile.chunk_rows, 300), 300)
+            if profile.complib:
+                assert node.filters.complib == profile.complib
+            assert np.allclose(omx_file.read("skim"), data, rtol=1e-6)
+    with pytest.raises(ValueError):
+        OMXManager(str(tmp_path / "x.omx"), "w", storage_profile="small")
+
+
+def test_omx_manager_partial_reads(tmp_path, inro_context):
+    """OMX row range and subset reads and the bounded read cache."""
+    import numpy as np
+
+    from tm2py.emme.matrix import OMXManager
+
+    path = str(tmp_path / "skims.omx")
+    rng = np.random.default_rng(0)
+    data = {name: rng.random((50, 50)) for name in ["a", "b", "c"]}
+    with OMXManager(path, "w") as omx_file:
+        omx_file.create_mapping("zone_number", list(range(101, 151)))
+        for name, array in data.items():
+            omx_file.write_array(array, name)
+
+    with OMXManager(path, "r", max_cache_bytes=2 * 50 * 50 * 8) as omx_file:
+        rows, cols = [7, 3, 3, 40, 41, 42], [5, 1, 49]
+        subsets = omx_file.read_many(["a", "b"], rows, cols, block_rows=2)
+        for name, subset in subsets.items():
+            assert (subset == data[name][np.ix_(rows, cols)]).all()
+        assert (omx_file.read_rows("c", 10, 13) == data["c"][10:13]).all()
+        assert (omx_file.read_subset("c", cols=slice(2, 5)) == data["c"][:, 2:5]).all()
+        assert list(omx_file.zone_index([150, 101])) == [49, 0]
+        assert not omx_file._read_cache
+        # least recently used full matrix is dropped from the cache
+        for name in ["a", "b", "a", "c"]:
+            assert (omx_file.read(name) == data[name]).all()
+        assert list(omx_file._read_cache) == ["a", "c"]
+
+
+def test_omx_write_does_not_modify_cache(tmp_path, inro_context):
+    """Export from the MatrixCache with mask and growth leaves the cached data as is."""
+    import numpy as np
+
+    from tm2py.emme.matrix import MatrixCache, OMXManager
+
+    data = np.array([[1.0, 2e7], [3.0, 1e20]])
+    matrix = MagicMock(type="FULL", description="skim", timestamp=1)
+    matrix.name = "skim"
+    matrix.get_numpy_data.return_value = data
+    cache = MatrixCache(MagicMock())
+    path = str(tmp_path / "skims.omx")
+    with OMXManager(
+        path, "w", matrix_cache=cache, mask_max_value=1e7, growth_factor=100
+    ) as omx_file:
+        omx_file.write_matrix(matrix)
+        omx_file.write_matrix(matrix, "skim_2")
+    assert cache.get_data(matrix) is data
+    assert (data == np.array([[1.0, 2e7], [3.0, 1e20]])).all()
+    with OMXManager(path, "r") as omx_file:
+        for name in ["skim", "skim_2"]:
+            assert (omx_file.read(name) == np.array([[100.0, 0], [300.0, 0]])).all()
@@ -90,3 +90,32 @@ def test_validate_input_fail(examples_dir, inro_context, temp_dir):
             run_dir=union_city_root,
         )
         assert e_info.type is FileNotFoundError
+
+
+def test_controller_import_time():
+    """Benchmark tm2py.controller import with -X importtime; components must load lazily."""
+    import subprocess
+    import sys
+
+    from tm2py.controller import component_cls_map
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import tm2py.controller"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # lines are "import time: <self us> | <cumulative us> | <module>"
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        import_times[module.strip()] = int(cumulative_us)
+    print(f"import tm2py.controller: {import_times['tm2py.controller'] / 1e6:.3f}s")
+
+    component_modules = set(
+        component_cls_map.path(name).rsplit(".", 1)[0] for name in component_cls_map
+    )
+    imported_components = component_modules.intersection(import_times)
+    assert not imported_components, "component modules imported with controller"
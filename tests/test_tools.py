@@ -128,3 +128,24 @@ def test_csv_to_dfs(inro_context):
             assert os.path.exists(
                 os.path.join(unzip_directory, file_name)
             ), f"unzip failed, missing {file_name}"
+
+
+def test_write_table(tmp_path, inro_context):
+    """Tables are written as CSV with str() values and the specified separator."""
+    import pandas as pd
+
+    from tm2py.tools import write_table
+
+    table = pd.DataFrame({"line_id": ["b1", "r1"], "headway": [10.0, 5.0]})
+    path = write_table(table, str(tmp_path / "out" / "lines.csv"))
+    pd.testing.assert_frame_equal(pd.read_csv(path), table)
+
+    # CSV values as str(), optionally with the ", " separator of the stop usage file
+    flows = pd.DataFrame(
+        {"mode": ["wlk_trn_wlk"], "taz": [12], "stop": ["1001"], "boardings": [0.5]}
+    )
+    path = write_table(flows, str(tmp_path / "out" / "flows.csv"), sep=", ")
+    with open(path, "r", encoding="utf8") as flows_file:
+        assert (
+            flows_file.read() == "mode,taz,stop,boardings\nwlk_trn_wlk, 12, 1001, 0.5\n"
+        )
@@ -22,3 +22,204 @@ def test_transit(examples_dir, root_dir):
     my_run.run()
 
     # TODO write assert
+
+
+def test_calc_transit_link_times(inro_context):
+    "Vectorized bus link times match the per-link rules."
+    import numpy as np
+
+    from tm2py.components.network.transit.transit_network import (
+        _join_link_ids,
+        _network_structure_key,
+        calc_transit_link_times,
+    )
+
+    def _link_time(auto_time, area_type, length, facility_type):
+        tran_speed = 60 * length / auto_time
+        if (facility_type <= 4 or facility_type == 8) and (tran_speed < 6):
+            trantime = 60 * length / 6
+        elif tran_speed < 3:
+            trantime = 60 * length / 3
+        else:
+            trantime = auto_time
+        if facility_type in [1, 2, 3, 8]:
+            delayfactor = 0.0
+        elif area_type in [0, 1]:
+            delayfactor = 2.46
+        elif area_type in [2, 3]:
+            delayfactor = 1.74
+        elif area_type == 4:
+            delayfactor = 1.14
+        else:
+            delayfactor = 0.08
+        return trantime + delayfactor * length
+
+    rng = np.random.default_rng(0)
+    auto_time = rng.uniform(-1, 30, 500)
+    area_type = rng.integers(0, 6, 500)
+    length = rng.uniform(0, 3, 500)
+    facility_type = rng.integers(1, 9, 500)
+    result = calc_transit_link_times(auto_time, area_type, length, facility_type)
+    expected = [
+        _link_time(*values) if values[0] > 0 else np.nan
+        for values in zip(auto_time, area_type, length, facility_type)
+    ]
+    assert np.allclose(result, expected, equal_nan=True)
+
+    positions = _join_link_ids(
+        np.array(["a", "b", "a", "c"]), np.array(["b", "a", "d", "c", "c"])
+    )
+    assert list(positions) == [1, 2, -1, -1, 3]
+
+    # cache key for the segment link positions changes with the structure
+    link_index = {1: {2: 0, 3: 1}, 2: {3: 2}}
+    segment_index = {"b1": [0, 1], "r1": [2, 3]}
+    key = _network_structure_key(link_index, segment_index)
+    assert key == _network_structure_key(
+        {1: {2: 0, 3: 1}, 2: {3: 2}}, {"b1": [0, 1], "r1": [2, 3]}
+    )
+    assert key != _network_structure_key({1: {2: 0, 3: 1}, 3: {2: 2}}, segment_index)
+    assert key != _network_structure_key(link_index, {"b1": [0, 1, 2], "r1": [3]})
+
+
+def test_skim_set_mask(inro_context):
+    "Combined skim mask keeps O-D pairs within max boardings with all required modes."
+    import numpy as np
+
+    from tm2py.components.network.transit.transit_skim import skim_set_mask
+
+    boards = np.array([[0.0, 1.0, 2.0], [3.0, 1.0, 2.0]])
+    lrt = np.array([[0.0, 0.0, 2.0], [2.0, 0.0, 0.0]])
+    ferry = np.array([[0.0, 0.0, 0.0], [0.0, 3.0, 1.0]])
+    rail = np.array([[0.0, 1.0, np.inf], [2.0, 0.0, 1.0]])
+
+    mask = skim_set_mask(boards, 2)
+    assert (mask == (boards <= 2)).all()
+
+    # groups are summed by mode type: (LRT or FERRY) and RAIL both required
+    mask = skim_set_mask(boards, 2, [[lrt, ferry], [rail]])
+    expected = np.array([[False, False, False], [False, False, True]])
+    assert (mask == expected).all()
+    # inputs are not modified
+    assert lrt[0, 2] == 2.0 and np.isinf(rail[0, 2])
+    # groups of more than two modes
+    mask = skim_set_mask(boards, 2, [[ferry, ferry, lrt], [rail]])
+    assert (mask == expected).all()
+    with pytest.raises(ValueError):
+        skim_set_mask(boards, 2, [[rail], []])
+
+
+def test_max_skim_boardings(inro_context):
+    "The pnr classes BOARDS skim is the number of transfers."
+    import numpy as np
+
+    from tm2py.components.network.transit.transit_skim import (
+        max_skim_boardings,
+        skim_set_mask,
+    )
+
+    assert max_skim_boardings("WLK_TRN_WLK", 1) == 2
+    assert max_skim_boardings("PNR_TRN_WLK", 1) == 1
+    assert max_skim_boardings("WLK_TRN_PNR", 1) == 1
+    # pnr BOARDS skim after _calc_boardings: (boardings - 1).max.0
+    pnr_boards = np.maximum(np.array([[1.0, 2.0, 3.0]]) - 1, 0)
+    mask = skim_set_mask(pnr_boards, max_skim_boardings("PNR_TRN_WLK", 1))
+    assert list(mask[0]) == [True, True, False]
+
+
+def test_calc_peaking_factor_headways(inro_context):
+    "AM pnr access headways reflect the EA boardings, other lines the peaking factor."
+    import numpy as np
+    import pandas as pd
+
+    from tm2py.components.network.transit.transit_assign import (
+        calc_peaking_factor_headways,
+    )
+
+    line_names = pd.Series(["AM_pnr_acc_1", "AM_pnr_acc_2", "AM_pnr_egr_1", "AM_bus"])
+    headway = np.full(4, 10.0)
+    capacity = np.full(4, 50.0)
+    ea_df = pd.DataFrame(
+        {
+            "line_name_am": ["AM_pnr_acc_1", "AM_pnr_acc_2", "AM_pnr_acc_2"],
+            "boardings": [300.0, 1000.0, 0.0],
+        }
+    )
+    # capacity 60 * 3 * 50 / 10 = 900, less 300 EA boardings
+    am_headway = calc_peaking_factor_headways(
+        "AM", line_names, headway, capacity, 3.0, 1.219, ea_df
+    )
+    assert np.allclose(am_headway, [15.0, 999.0, 10.0, 12.19])
+
+    # no EA boardings (EA not run before AM), pnr access capacity not reduced
+    no_ea_df = pd.DataFrame(columns=["line_name_am", "boardings"])
+    am_headway = calc_peaking_factor_headways(
+        "AM", line_names, headway, capacity, 3.0, 1.219, no_ea_df
+    )
+    assert np.allclose(am_headway, [10.0, 10.0, 10.0, 12.19])
+
+    pm_headway = calc_peaking_factor_headways(
+        "PM", line_names, headway, capacity, 3.0, 1.262
+    )
+    assert np.allclose(pm_headway, [10.0, 10.0, 10.0, 12.62])
+
+
+def test_transit_tables(inro_context):
+    """Columnar transit tables align bulk attribute values with lines and segments."""
+    from types import SimpleNamespace
+
+    import numpy as np
+
+    from tm2py.emme.network import sum_by_line, transit_tables
+
+    def _line(line_id, mode, capacity, nodes):
+        node_objs = [SimpleNamespace(id=n) for n in nodes] + [None]
+        segments = [
+            SimpleNamespace(
+                id=f"{line_id}-{i}", i_node=node_objs[i], j_node=node_objs[i + 1]
+            )
+            for i in range(len(nodes))
+        ]
+        return SimpleNamespace(
+            id=line_id,
+            mode=SimpleNamespace(id=mode, description=f"{mode} desc"),
+            vehicle=SimpleNamespace(
+                auto_equivalent=2.0, seated_capacity=capacity, total_capacity=capacity
+            ),
+            segments=lambda include_hidden: segments
+            if include_hidden
+            else segments[:-1],
+        )
+
+    lines = [_line("b1", "b", 40, [1, 2, 3]), _line("r1", "r", 100, [3, 4])]
+    network = SimpleNamespace(transit_lines=lambda: lines)
+    # scenario element order differs from the network iteration order
+    values = {
+        "TRANSIT_LINE": [{"r1": 0, "b1": 1}, [5.0, 10.0]],
+        "TRANSIT_SEGMENT": [
+            {"r1": [0, 1], "b1": [2, 3, 4]},
+            [7.0, 0.0, 1.0, 2.0, 0.0],
+        ],
+        "LINK": [{1: {2: 0}, 2: {3: 1}, 3: {4: 2}}, [0.5, 0.25, 2.0]],
+    }
+    scenario = SimpleNamespace(
+        get_attribute_values=lambda domain, attrs: values[domain]
+    )
+
+    line_df, segment_df = transit_tables(
+        scenario, network, ["headway"], ["transit_boardings"], ["length"]
+    )
+    assert list(line_df["headway"]) == [10.0, 5.0]
+    assert list(line_df["num_segments"]) == [3, 2]
+    assert list(segment_df["line_index"]) == [0, 0, 0, 1, 1]
+    assert list(segment_df["j_node"].map(str)) == ["2", "3", "None", "4", "None"]
+    assert list(segment_df["transit_boardings"]) == [1.0, 2.0, 0.0, 7.0, 0.0]
+    assert np.allclose(
+        segment_df["length"], [0.5, 0.25, np.nan, 2.0, np.nan], equal_nan=True
+    )
+    assert list(sum_by_line(line_df, segment_df["transit_boardings"])) == [3.0, 7.0]
+
+    _, visible = transit_tables(
+        scenario, network, [], ["transit_boardings"], include_hidden=False
+    )
+    assert list(visible["segment_id"]) == ["b1-0", "b1-1", "r1-0"]
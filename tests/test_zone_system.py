@@ -0,0 +1,40 @@
+"""Testing of the zone sequence lookups."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_zone_system(tmp_path):
+    "Zone sequence lookups match mapping with dictionaries built from the file."
+    from tm2py.zone_system import ZoneSystem
+
+    zone_seq = pd.DataFrame(
+        {
+            "N": [1, 2, 3, 10001, 10002, 90001, 90002, 99001],
+            "TAZSEQ": [1, 2, 3, 0, 0, 0, 0, 4],
+            "MAZSEQ": [0, 0, 0, 1, 2, 0, 0, 0],
+            "TAPSEQ": [0, 0, 0, 0, 0, 1, 2, 0],
+            "EXTSEQ": [0, 0, 0, 0, 0, 0, 0, 1],
+        }
+    )
+    zone_seq.to_csv(tmp_path / "zone_seq.csv", index=False)
+    pd.DataFrame({"MAZ_ORIGINAL": [5, 6, 7], "TAZ_ORIGINAL": [30, 10, 30]}).to_csv(
+        tmp_path / "maz_data.csv", index=False
+    )
+    zone_system = ZoneSystem(tmp_path / "zone_seq.csv", tmp_path / "maz_data.csv")
+
+    node_ids = np.array([10002, 10001, 10002])
+    assert zone_system.to_seq(node_ids, "MAZ").tolist() == [2, 1, 2]
+    assert zone_system.to_seq([90002.0, 90001.0], "TAP").tolist() == [2, 1]
+    # externals take precedence over the TAZ sequence, as with {**taz, **ext}
+    assert zone_system.to_seq([3, 99001], ("TAZ", "EXT")).tolist() == [3, 1]
+    assert zone_system.contains([1, 10001, 5], "TAZ").tolist() == [True, False, False]
+
+    with pytest.raises(KeyError):
+        zone_system.to_seq([1, 10001], "TAZ")
+    seq = zone_system.to_seq([1, 10001], "TAZ", missing=np.nan)
+    expected = pd.Series([1, 10001]).map({1: 1, 2: 2, 3: 3, 99001: 4})
+    assert np.array_equal(seq, expected.to_numpy(), equal_nan=True)
+
+    assert zone_system.maz_to_taz_seq.tolist() == [2, 1, 2]
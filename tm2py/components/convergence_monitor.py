@@ -0,0 +1,260 @@
+"""Global iteration convergence monitor with early stopping."""
+
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Dict, List
+
+import numpy as np
+
+from tm2py.components.component import Component
+from tm2py.logger import LogStartEnd
+
+if TYPE_CHECKING:
+    from tm2py.controller import RunController
+
+NumpyArray = np.array
+
+# skim values at or above this are unreachable / undefined in Emme
+_MAX_SKIM_VALUE = 1e19
+
+
+class ConvergenceMonitor(Component):
+    """Summarize the change between global iterations and stop early if converged.
+
+    After each global iteration compares the assigned highway demand, highway
+    time skims and link auto volumes to the previous iteration:
+
+        skim_rmse: demand-weighted root mean square change in time skims (minutes)
+        demand_change: change in total demand
+        demand_relative_change: sum of absolute change in demand by OD and class
+            relative to the previous total demand
+        link_flow_relative_change: sum of absolute change in link auto volumes
+            relative to the previous total volume (the change between global
+            iterations, not the assignment relative gap)
+
+    The values are recorded by period in config.convergence.output_file.
+    The previous iteration's arrays are saved in config.convergence.state_dir,
+    so that the comparison is also available for the first iteration of a restarted
+    run. On global iteration 1 the state_dir and output_file from any previous
+    run are removed, so a new run is not compared with an earlier one. If all of the thresholds set in config.convergence are met the remaining
+    global iterations are removed from the controller queue and the run proceeds
+    to the final_components.
+    """
+
+    def __init__(self, controller: RunController):
+        """Constructor for ConvergenceMonitor.
+
+        Args:
+            controller (RunController): Reference to run controller object.
+        """
+        super().__init__(controller)
+        self.config = self.controller.config.convergence
+        self._highway_emmebank = None
+
+    @property
+    def highway_emmebank(self):
+        """The ProxyEmmebank for the highway assignment."""
+        if self._highway_emmebank is None:
+            self._highway_emmebank = self.controller.emme_manager.highway_emmebank
+        return self._highway_emmebank
+
+    @property
+    def classes(self) -> List[str]:
+        """Highway class names used for the demand and skim summaries."""
+        if self.config.classes:
+            return [name.lower() for name in self.config.classes]
+        return [
+            c.name.lower()
+            for c in self.controller.config.highway.classes
+            if "time" in c.get("skims", [])
+        ]
+
+    def validate_inputs(self):
+        """Validate the convergence classes are highway assignment classes."""
+        highway_classes = set(
+            c.name.lower() for c in self.controller.config.highway.classes
+        )
+        missing = set(name.lower() for name in self.config.classes) - highway_classes
+        if missing:
+            raise ValueError(
+                f"convergence.classes {sorted(missing)} not found in highway.classes"
+            )
+
+    @LogStartEnd("Convergence monitor", level="STATUS")
+    def run(self):
+        """Summarize change from the previous global iteration and stop if converged."""
+        if self.controller.iteration == 1:
+            self._clear_state()
+        results = {}
+        for time_period in self.time_period_names:
+            results[time_period] = self._summarize_period(time_period)
+        results["ALL"] = _combine_summaries(list(results.values()))
+        self._write_summary(results)
+
+        total = results["ALL"]
+        self.logger.status(
+            f"Iteration {self.controller.iteration} convergence: "
+            + ", ".join(f"{key} {value:.6g}" for key, value in _metrics(total).items())
+        )
+        if self._converged(total):
+            self.logger.status(
+                f"Convergence criteria met at iteration {self.controller.iteration}, "
+                "skipping remaining global iterations"
+            )
+            self.controller.skip_to_final_components()
+
+    def _converged(self, summary: Dict[str, float]) -> bool:
+        """Return True if all specified thresholds are met by the summary."""
+        if self.controller.iteration < self.config.min_iterations:
+            return False
+        metrics = _metrics(summary)
+        thresholds = {
+            "skim_rmse": self.config.max_skim_rmse,
+            "demand_relative_change": self.config.max_demand_relative_change,
+            "link_flow_relative_change": self.config.max_link_flow_relative_change,
+        }
+        thresholds = {k: v for k, v in thresholds.items() if v is not None}
+        if not thresholds:
+            return False
+        # NaN (no previous iteration to compare with) is never converged
+        return all(metrics[key] <= value for key, value in thresholds.items())
+
+    def _summarize_period(self, time_period: str) -> Dict[str, float]:
+        """Compare demand, skims and link volumes for time_period with saved state."""
+        scenario = self.highway_emmebank.scenario(time_period)
+        emmebank = self.highway_emmebank.emmebank
+        summary = dict.fromkeys(_SUMMARY_KEYS, 0.0)
+        summary["has_previous"] = True
+        for name in self.classes:
+            demand = emmebank.matrix(f'mf"{time_period}_{name}"')
+            skim = emmebank.matrix(f'mf"{time_period}_{name}_time"')
+            if not demand or not skim:
+                continue
+            demand = demand.get_numpy_data(scenario.id)
+            skim = skim.get_numpy_data(scenario.id)
+            prev_demand = self._load_state(f"{time_period}_{name}_demand")
+            prev_skim = self._load_state(f"{time_period}_{name}_time")
+            if prev_demand is None or prev_skim is None:
+                summary["has_previous"] = False
+            else:
+                _add_matrix_summary(summary, demand, prev_demand, skim, prev_skim)
+            self._save_state(f"{time_period}_{name}_demand", demand)
+            self._save_state(f"{time_period}_{name}_time", skim)
+
+        flow = np.asarray(scenario.get_attribute_values("LINK", ["auto_volume"])[1])
+        prev_flow = self._load_state(f"{time_period}_auto_volume")
+        if prev_flow is None or prev_flow.shape != flow.shape:
+            summary["has_previous"] = False
+        else:
+            summary["flow_abs_change"] = float(np.abs(flow - prev_flow).sum())
+            summary["prev_flow"] = float(prev_flow.sum())
+        self._save_state(f"{time_period}_auto_volume", flow)
+        return summary
+
+    def _clear_state(self):
+        """Remove the saved arrays and summary from a previous run."""
+        state_dir = self.get_abs_path(self.config.state_dir)
+        if os.path.isdir(state_dir):
+            for file_name in os.listdir(state_dir):
+                if file_name.endswith(".npy"):
+                    os.remove(os.path.join(state_dir, file_name))
+        output_path = self.get_abs_path(self.config.output_file)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    def _state_path(self, name: str) -> str:
+        return os.path.join(self.get_abs_path(self.config.state_dir), f"{name}.npy")
+
+    def _load_state(self, name: str) -> NumpyArray:
+        path = self._state_path(name)
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    def _save_state(self, name: str, array: NumpyArray):
+        path = self._state_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to temp file first so an interrupted run does not leave partial state
+        temp_path = f"{path[:-4]}_tmp.npy"
+        np.save(temp_path, np.asarray(array, dtype=np.float32))
+        os.replace(temp_path, path)
+
+    def _write_summary(self, results: Dict[str, Dict[str, float]]):
+        """Append the iteration summary by period to the output CSV file."""
+        path = self.get_abs_path(self.config.output_file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_header = not os.path.exists(path)
+        columns = ["iteration", "time_period"] + list(_metrics(results["ALL"]))
+        with open(path, "a", encoding="utf8") as out_file:
+            if write_header:
+                out_file.write(",".join(columns) + "\n")
+            for time_period, summary in results.items():
+                values = [str(self.controller.iteration), time_period]
+                values.extend(str(v) for v in _metrics(summary).values())
+                out_file.write(",".join(values) + "\n")
+
+
+_SUMMARY_KEYS = [
+    "weighted_sq_skim_change",
+    "skim_weight",
+    "demand",
+    "prev_demand",
+    "demand_abs_change",
+    "flow_abs_change",
+    "prev_flow",
+]
+
+
+def _add_matrix_summary(
+    summary: Dict[str, float],
+    demand: NumpyArray,
+    prev_demand: NumpyArray,
+    skim: NumpyArray,
+    prev_skim: NumpyArray,
+):
+    """Add the demand and demand-weighted skim change sums for one class to summary."""
+    valid = (skim < _MAX_SKIM_VALUE) & (prev_skim < _MAX_SKIM_VALUE)
+    weights = np.where(valid, demand, 0.0)
+    skim_change = np.where(valid, skim - prev_skim, 0.0)
+    summary["weighted_sq_skim_change"] += float((weights * skim_change**2).sum())
+    summary["skim_weight"] += float(weights.sum())
+    summary["demand"] += float(demand.sum())
+    summary["prev_demand"] += float(prev_demand.sum())
+    summary["demand_abs_change"] += float(np.abs(demand - prev_demand).sum())
+
+
+def _combine_summaries(summaries: List[Dict[str, float]]) -> Dict[str, float]:
+    """Sum the period summaries into the total summary."""
+    combined = dict((key, sum(s[key] for s in summaries)) for key in _SUMMARY_KEYS)
+    combined["has_previous"] = all(s["has_previous"] for s in summaries)
+    return combined
+
+
+def _metrics(summary: Dict[str, float]) -> Dict[str, float]:
+    """Convergence metrics from summed values, NaN if no previous iteration."""
+    if not summary["has_previous"]:
+        return dict.fromkeys(
+            [
+                "skim_rmse",
+                "demand_change",
+                "demand_relative_change",
+                "link_flow_relative_change",
+            ],
+            float("nan"),
+        )
+
+    def _ratio(numerator, denominator):
+        return numerator / denominator if denominator > 0 else 0.0
+
+    skim_mse = _ratio(summary["weighted_sq_skim_change"], summary["skim_weight"])
+    return {
+        "skim_rmse": skim_mse**0.5,
+        "demand_change": summary["demand"] - summary["prev_demand"],
+        "demand_relative_change": _ratio(
+            summary["demand_abs_change"], summary["prev_demand"]
+        ),
+        "link_flow_relative_change": _ratio(
+            summary["flow_abs_change"], summary["prev_flow"]
+        ),
+    }
@@ -14,7 +14,7 @@ from tm2py.components.component import Component, Subcomponent
 from tm2py.emme.manager import Emmebank
 from tm2py.emme.matrix import OMXManager
 from tm2py.logger import LogStartEnd
-from tm2py.matrix import redim_matrix
+from tm2py.matrix import AveragedDemandStore, msa_step_size, redim_matrix
 from collections import defaultdict
 
 
@@ -37,12 +37,23 @@ class EmmeDemand:
         self._emmebank = None
         self._scenario = None
         self._source_ref_key = None
+        self._demand_store = None
 
     @property
     def logger(self):
         """Reference to logger."""
         return self.controller.logger
 
+    @property
+    def demand_store(self) -> Union[AveragedDemandStore, None]:
+        """The averaged demand store, None if config averaged_demand_path is not set."""
+        if self._demand_store is None and self.config.averaged_demand_path:
+            root_dir = self.controller.get_abs_path(self.config.averaged_demand_path)
+            self._demand_store = AveragedDemandStore(
+                str(root_dir), self.config.averaged_demand_dtype
+            )
+        return self._demand_store
+
     def _read(
         self, path: str, name: str, num_zones, factor: float = None
     ) -> NumpyArray:
@@ -86,29 +97,45 @@ class EmmeDemand:
     ):
         """Save demand array to Emme matrix with name, optional description.
 
-        Matrix will be created if it does not exist and the model is on iteration 0.
+        Matrix will be created if it does not exist.
+
+        If config averaged_demand_path is set the (averaged) demand is also recorded
+        in the averaged demand store, and the stored demand from the previous
+        iteration is used for averaging if available, otherwise the previous
+        demand is read from the Emme matrix.
 
         Args:
             name: name of the matrix in the Emmebank
             demand: NumpyArray, demand array to save
             description: str, optional description to use in the Emmebank
-            apply_msa: bool, default False: use MSA on matrix with current array
-                values if model is on iteration >= 1
+            apply_msa: bool, default False: average matrix with current array
+                values if model is on iteration >= 1, with step size 1 / iteration
+                (MSA), or as specified in config demand_step_sizes
         """
         matrix = self._emmebank.emmebank.matrix(f'mf"{name}"')
         msa_iteration = self.controller.iteration
-        if not apply_msa or msa_iteration <= 1:
-            if not matrix:
-                ident = self._emmebank.emmebank.available_matrix_identifier("FULL")
-                matrix = self._emmebank.emmebank.create_matrix(ident)
-                matrix.name = name
-                if description is not None:
-                    matrix.description = description
-        else:
+        store = self.demand_store
+        step_size = 1.0
+        prev_demand = None
+        if apply_msa:
+            step_size = msa_step_size(msa_iteration, self.config.demand_step_sizes)
+        if step_size < 1.0 and (
+            store is None or not store.exists(name, msa_iteration - 1)
+        ):
             if not matrix:
                 raise Exception(f"error averaging demand: matrix {name} does not exist")
             prev_demand = matrix.get_numpy_data(self._scenario.id)
-            demand = prev_demand + (1.0 / msa_iteration) * (demand - prev_demand)
+        if not matrix:
+            ident = self._emmebank.emmebank.available_matrix_identifier("FULL")
+            matrix = self._emmebank.emmebank.create_matrix(ident)
+            matrix.name = name
+            if description is not None:
+                matrix.description = description
+
+        if store is not None:
+            demand = store.update(name, demand, msa_iteration, step_size, prev_demand)
+        elif prev_demand is not None:
+            demand = prev_demand + step_size * (demand - prev_demand)
         self.logger.log(f"{name} sum: {demand.sum()}", level="DEBUG")
         matrix.set_numpy_data(demand, self._scenario.id)
 
@@ -8,12 +8,16 @@ Note: additional details in class docstring
 from __future__ import annotations
 
 import os
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager as _context
 from typing import TYPE_CHECKING, List, Tuple
 
+import numpy as np
 import pandas as pd
 from numpy import array as NumpyArray
 from numpy import repeat
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
 
 from tm2py.components.component import Component
 from tm2py.logger import LogStartEnd
@@ -35,6 +39,10 @@ COUNTIES = [
     "Sonoma",
     "Marin",
 ]
+# number of roots per scipy dijkstra call (dense roots x nodes distance result)
+_DIJKSTRA_BLOCK_SIZE = 16
+# distance graph set in the worker processes, see _set_worker_graph
+_worker_graph = None
 
 
 class ActiveModesSkim(Component):
@@ -50,6 +58,11 @@ class ActiveModesSkim(Component):
         max_dist_miles = 3
         output = "skims\\ped_distance_maz_maz.txt"
 
+        With engine = "csgraph" the shortest paths are calculated with
+        scipy.sparse.csgraph.dijkstra on a graph built from the prepared
+        network (see DistanceGraph) instead of the Emme shortest path tool,
+        with the counties in parallel if num_processes > 0.
+
         Input:  A scenario network containing the attributes
 
 
@@ -93,6 +106,9 @@ class ActiveModesSkim(Component):
         ]:
             with self._setup(emmebank_path):
                 mode_codes = self._prepare_network()
+                if self.config.engine == "csgraph":
+                    self._run_csgraph_skims(mode_codes)
+                    continue
                 for mode_id, spec in zip(mode_codes, skim_list):
                     for county in COUNTIES:
                         log_msg = (
@@ -324,6 +340,95 @@ class ActiveModesSkim(Component):
         results = shortest_paths(spec, scenario=self._temp_scenario)
         return results["distance"]
 
+    def _run_csgraph_skims(self, mode_codes: List[str]):
+        """Run the skims with scipy csgraph dijkstra on the prepared network.
+
+        Builds a DistanceGraph of the links with the skim mode for each skim
+        spec, with the leaf nodes and centroids blocked as Emme does with
+        through_leaves and through_centroids False. The counties are run in a
+        process pool if config.num_processes > 0 and only the root, leaf pairs
+        within max_dist_miles are exported.
+
+        Args:
+            mode_codes: mode ID for each skim spec, from _prepare_network
+        """
+        network = self._network
+        nodes = list(network.nodes())
+        node_pos = dict((node.number, k) for k, node in enumerate(nodes))
+        links = list(network.links())
+        i_nodes = np.array([node_pos[link.i_node.number] for link in links])
+        j_nodes = np.array([node_pos[link.j_node.number] for link in links])
+        lengths = np.array([link.length for link in links])
+        centroids = np.array([node.is_centroid for node in nodes], dtype=bool)
+        node_county = np.array([node["#node_county"] for node in nodes])
+        for mode_id, spec in zip(mode_codes, self.config.shortest_path_skims):
+            mode = network.mode(mode_id)
+            in_mode = np.array([mode in link.modes for link in links], dtype=bool)
+            root_attr = ROOT_LEAF_ID_MAP[spec["roots"]]
+            leaf_attr = ROOT_LEAF_ID_MAP[spec["leaves"]]
+            root_ids = np.array([node[root_attr] for node in nodes])
+            leaf_ids = np.array([node[leaf_attr] for node in nodes])
+            leaves = np.flatnonzero(leaf_ids)
+            graph = DistanceGraph(
+                i_nodes[in_mode],
+                j_nodes[in_mode],
+                lengths[in_mode],
+                len(nodes),
+                (leaf_ids != 0) | centroids,
+            )
+            max_dist = spec.get("max_dist_miles")
+            county_roots = {}
+            for county in COUNTIES:
+                roots = np.flatnonzero((root_ids != 0) & (node_county == county))
+                if len(roots) and len(leaves):
+                    county_roots[county] = roots
+            with self._graph_processes(graph) as pool:
+                if pool is None:
+                    results = (
+                        graph_distances(roots, leaves, max_dist, graph)
+                        for roots in county_roots.values()
+                    )
+                else:
+                    tasks = [
+                        pool.submit(graph_distances, roots, leaves, max_dist)
+                        for roots in county_roots.values()
+                    ]
+                    results = (task.result() for task in tasks)
+                for (county, roots), result in zip(county_roots.items(), results):
+                    root_index, leaf_index, distance = result
+                    self.logger.log(
+                        f"skim for mode={spec['mode']}, roots={spec['roots']}, "
+                        f"leaves={spec['leaves']} county={county}: "
+                        f"{len(distance)} pairs",
+                        level="DETAIL",
+                    )
+                    if len(distance) == 0:
+                        continue
+                    leaf_values = leaf_ids[leaves[leaf_index]].astype(int)
+                    distances = pd.DataFrame(
+                        {
+                            "root_ids": root_ids[roots[root_index]].astype(int),
+                            "leaf_ids": leaf_values,
+                            "leaf_ids_2": leaf_values,
+                            "dist": distance,
+                            "dist_feet": distance * 5280,
+                        }
+                    )
+                    self._write_distances(distances, spec["output"])
+
+    @_context
+    def _graph_processes(self, graph: DistanceGraph):
+        """Process pool with the graph set in each worker, None if no num_processes."""
+        if not self.config.num_processes:
+            yield None
+            return
+        with ProcessPoolExecutor(
+            max_workers=self.config.num_processes,
+            initializer=_set_worker_graph,
+            initargs=(graph,),
+        ) as pool:
+            yield pool
+
     def _export_results(
         self,
         distance_skim: NumpyArray,
@@ -344,51 +449,24 @@ class ActiveModesSkim(Component):
                 "dist_feet": distance_skim.flatten() * 5280,
             }
         )
+        self._write_distances(distances, output)
+
+    def _write_distances(self, distances: pd.DataFrame, output: str):
+        """Convert node IDs to zone sequence numbers and append valid pairs to csv."""
         # convert node id to sequential (1-based) zone id
         # consistent with tm2.1 - java expects this
-        zone_seq_file = self.get_abs_path(self.controller.config.scenario.zone_seq_file)
-        zone_seq_df = pd.read_csv(zone_seq_file)
-        taz_seq = dict(
-            zip(
-                zone_seq_df[zone_seq_df.TAZSEQ > 0].N,
-                zone_seq_df[zone_seq_df.TAZSEQ > 0].TAZSEQ,
-            )
-        )
-        maz_seq = dict(
-            zip(
-                zone_seq_df[zone_seq_df.MAZSEQ > 0].N,
-                zone_seq_df[zone_seq_df.MAZSEQ > 0].MAZSEQ,
-            )
-        )
-        tap_seq = dict(
-            zip(
-                zone_seq_df[zone_seq_df.TAPSEQ > 0].N,
-                zone_seq_df[zone_seq_df.TAPSEQ > 0].TAPSEQ,
-            )
-        )
-        ext_seq = dict(
-            zip(
-                zone_seq_df[zone_seq_df.EXTSEQ > 0].N,
-                zone_seq_df[zone_seq_df.EXTSEQ > 0].EXTSEQ,
-            )
-        )
-        taz_seq = {**taz_seq, **ext_seq}
+        zone_system = self.controller.zone_system
         for c in ["root_ids", "leaf_ids", "leaf_ids_2"]:
-            taz_bool = distances[c].isin(list(taz_seq.keys()))
-            maz_bool = distances[c].isin(list(maz_seq.keys()))
-            tap_bool = distances[c].isin(list(tap_seq.keys()))
-            if taz_bool.any():
-                distances[c] = distances[c].map(taz_seq)
-                continue
-            elif maz_bool.any():
-                distances[c] = distances[c].map(maz_seq)
-                continue
-            elif tap_bool.any():
-                distances[c] = distances[c].map(tap_seq)
-                continue
+            node_ids = distances[c].to_numpy()
+            for kind in [("TAZ", "EXT"), "MAZ", "TAP"]:
+                if zone_system.contains(node_ids, kind).any():
+                    distances[c] = zone_system.to_seq(node_ids, kind, missing=np.nan)
+                    break
             else:
                 raise Exception(
-                    "{} has N values not in the {} file".format(c, zone_seq_file)
+                    "{} has N values not in the {} file".format(
+                        c, zone_system.zone_seq_file
+                    )
                 )
         # drop 0's / 1e20
         distances = distances.query("dist > 0 & dist < 1e19")
@@ -399,3 +477,121 @@ class ActiveModesSkim(Component):
             distances.to_csv(
                 output_file, header=False, index=False, float_format="%.5f"
             )
+
+
+class DistanceGraph:
+    """Sparse link length graph for bounded shortest path distances.
+
+    Paths do not pass through the blocked nodes (e.g. leaves and centroids),
+    which have no outgoing links except when used as a root: for each set of
+    roots a copy of each root is added as a source node with the root's
+    outgoing links.
+    """
+
+    def __init__(
+        self,
+        i_nodes: NumpyArray,
+        j_nodes: NumpyArray,
+        lengths: NumpyArray,
+        num_nodes: int,
+        blocked: NumpyArray,
+    ):
+        """Constructor for DistanceGraph.
+
+        Args:
+            i_nodes: link from node position
+            j_nodes: link to node position
+            lengths: link length
+            num_nodes: number of nodes
+            blocked: boolean array by node position, nodes paths cannot pass through
+        """
+        order = np.argsort(i_nodes, kind="stable")
+        self._i_nodes = np.asarray(i_nodes, dtype=np.int64)[order]
+        self._j_nodes = np.asarray(j_nodes, dtype=np.int64)[order]
+        self._lengths = np.asarray(lengths, dtype=float)[order]
+        self.num_nodes = num_nodes
+        self._first_link = np.searchsorted(self._i_nodes, np.arange(num_nodes + 1))
+        self._unblocked = ~np.asarray(blocked, dtype=bool)[self._i_nodes]
+
+    def graph(self, roots: NumpyArray) -> csr_matrix:
+        """CSR graph of the links from unblocked nodes and from copies of the roots.
+
+        Args:
+            roots: root node positions, the copy of roots[k] is node num_nodes + k
+
+        Returns:
+            The (num_nodes + len(roots)) square graph
+        """
+        num_nodes = self.num_nodes
+        num_links = np.bincount(self._i_nodes[self._unblocked], minlength=num_nodes)
+        root_num_links = self._first_link[roots + 1] - self._first_link[roots]
+        root_links = np.repeat(
+            self._first_link[roots] - np.cumsum(root_num_links) + root_num_links,
+            root_num_links,
+        )
+        root_links += np.arange(len(root_links))
+        indptr = np.zeros(num_nodes + len(roots) + 1, dtype=np.int64)
+        np.cumsum(np.concatenate([num_links, root_num_links]), out=indptr[1:])
+        indices = np.concatenate(
+            [self._j_nodes[self._unblocked], self._j_nodes[root_links]]
+        )
+        lengths = np.concatenate(
+            [self._lengths[self._unblocked], self._lengths[root_links]]
+        )
+        size = num_nodes + len(roots)
+        return csr_matrix((lengths, indices, indptr), shape=(size, size))
+
+    def distances(
+        self, roots: NumpyArray, leaves: NumpyArray, max_dist: float = None
+    ) -> Tuple[NumpyArray, NumpyArray, NumpyArray]:
+        """Shortest path distances from the roots to the leaves up to max_dist.
+
+        Args:
+            roots: root node positions
+            leaves: leaf node positions
+            max_dist: max distance, default no limit
+
+        Returns:
+            Sparse (COO) distances as root index, leaf index and distance arrays,
+            for the pairs with a path of distance > 0 and <= max_dist, in root,
+            leaf order
+        """
+        roots = np.asarray(roots, dtype=np.int64)
+        leaves = np.asarray(leaves, dtype=np.int64)
+        graph = self.graph(roots)
+        limit = np.inf if max_dist is None else max_dist
+        root_index, leaf_index, distance = [], [], []
+        for start in range(0, len(roots), _DIJKSTRA_BLOCK_SIZE):
+            stop = min(start + _DIJKSTRA_BLOCK_SIZE, len(roots))
+            sources = self.num_nodes + np.arange(start, stop)
+            dist = dijkstra(graph, directed=True, indices=sources, limit=limit)
+            dist = dist[:, leaves]
+            # root to itself is 0 (not reported), not the distance back to the root
+            dist[roots[start:stop, None] == leaves[None, :]] = 0
+            rows, cols = np.nonzero(np.isfinite(dist) & (dist > 0))
+            root_index.append(rows + start)
+            leaf_index.append(cols)
+            distance.append(dist[rows, cols])
+        if not distance:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+        return (
+            np.concatenate(root_index),
+            np.concatenate(leaf_index),
+            np.concatenate(distance),
+        )
+
+
+def _set_worker_graph(graph: DistanceGraph):
+    """Process pool initializer: set the graph used by graph_distances."""
+    global _worker_graph  # pylint: disable=W0603
+    _worker_graph = graph
+
+
+def graph_distances(
+    roots: NumpyArray,
+    leaves: NumpyArray,
+    max_dist: float = None,
+    graph: DistanceGraph = None,
+) -> Tuple[NumpyArray, NumpyArray, NumpyArray]:
+    """DistanceGraph.distances, for the graph set in the worker process by default."""
+    return (graph or _worker_graph).distances(roots, leaves, max_dist)
@@ -44,30 +44,19 @@ class DriveAccessSkims(Component):
         maz_taz = self._maz_taz_correspondence()
         ped_dist = self._get_ped_dist()
         maz_taz_tap = maz_taz.merge(ped_dist, on="TMAZ")
+        zone_system = self.controller.zone_system
         for period in self.controller.config.time_periods:
             tap_modes = self._get_tap_modes(period)
             # convert TAP node id to 1-based sequential ID
-            zone_seq_file = self.get_abs_path(
-                self.controller.config.scenario.zone_seq_file
+            tap_modes["TTAP"] = zone_system.to_seq(
+                tap_modes["TTAP"].to_numpy(), "TAP", missing=np.nan
             )
-            zone_seq_df = pd.read_csv(zone_seq_file)
-            tap_seq = dict(
-                zip(
-                    zone_seq_df[zone_seq_df.TAPSEQ > 0].N,
-                    zone_seq_df[zone_seq_df.TAPSEQ > 0].TAPSEQ,
-                )
-            )
-            tap_modes["TTAP"] = tap_modes["TTAP"].map(tap_seq)
             maz_ttaz_tap_modes = maz_taz_tap.merge(tap_modes, on="TTAP")
             drive_costs = self._get_drive_costs(period)
-            taz_seq = dict(
-                zip(
-                    zone_seq_df[zone_seq_df.TAZSEQ > 0].N,
-                    zone_seq_df[zone_seq_df.TAZSEQ > 0].TAZSEQ,
+            for column in ["TTAZ", "FTAZ"]:
+                drive_costs[column] = zone_system.to_seq(
+                    drive_costs[column].to_numpy(), "TAZ", missing=np.nan
                 )
-            )
-            drive_costs["TTAZ"] = drive_costs["TTAZ"].map(taz_seq)
-            drive_costs["FTAZ"] = drive_costs["FTAZ"].map(taz_seq)
             taz_to_tap_costs = drive_costs.merge(maz_ttaz_tap_modes, on="TTAZ")
             closest_taps = self._get_closest_taps(taz_to_tap_costs, period)
             with open(results_path, "a", newline="", encoding="utf8") as output_file:
@@ -93,31 +82,11 @@ class DriveAccessSkims(Component):
         return output_file_path
 
     def _maz_taz_correspondence(self) -> pd.DataFrame:
-        """Load maz data (landuse file) which has the MAZ-> TAZ correspondence"""
-        maz_data_file = self.get_abs_path(
-            self.controller.config.scenario.maz_landuse_file
+        """MAZ sequence -> TAZ sequence (TMAZ and TTAZ) from the MAZ landuse file."""
+        maz_to_taz_seq = self.controller.zone_system.maz_to_taz_seq
+        return pd.DataFrame(
+            {"TMAZ": np.arange(1, len(maz_to_taz_seq) + 1), "TTAZ": maz_to_taz_seq}
         )
-        maz_input_data = pd.read_csv(maz_data_file)
-        # drop the other landuse columns
-
-        # disable no-member error as Pandas returns either a parser object or a dataframe
-        # depending upon the inputs to pd.read_csv, and in this case we get a
-        # dataframe so in fact it has .columns
-        # set the maz sequence numbers
-        # pylint: disable=E1101
-        maz_taz_mapping = maz_input_data.drop(
-            columns=list(set(maz_input_data.columns) - {"MAZ_ORIGINAL", "TAZ_ORIGINAL"})
-        )
-        maz_taz_mapping["TMAZ"] = maz_taz_mapping.index + 1
-        # Get taz seq numbers
-        taz_ids = maz_taz_mapping["TAZ_ORIGINAL"].unique()
-        taz_ids.sort()
-        taz_seq = list(range(1, len(taz_ids) + 1))
-        taz_seq_mapping = pd.DataFrame({"TAZ_ORIGINAL": taz_ids, "TTAZ": taz_seq})
-        # Merge them back to get a table with the MAZ sequence and TAZ sequence (TMAZ and TTAZ)
-        maz_taz = maz_taz_mapping.merge(taz_seq_mapping, on="TAZ_ORIGINAL")
-        maz_taz.drop(columns=["MAZ_ORIGINAL", "TAZ_ORIGINAL"], inplace=True)
-        return maz_taz
 
     def _get_ped_dist(self) -> pd.DataFrame:
         """Get walk distance from closest maz to tap"""
@@ -205,13 +174,13 @@ class DriveAccessSkims(Component):
         network = self.controller.emme_manager.get_network(
             scenario, {"NODE": ["#node_county", "@taz_id"]}
         )
-        externals = [
+        externals = set(
             n["@taz_id"]
             for n in network.nodes()
             if n["@taz_id"] > 0 and n["#node_county"] == "External"
-        ]
-        root_ids = np.repeat(zone_numbers, len(zone_numbers))
-        leaf_ids = zone_numbers * len(zone_numbers)
+        )
+        is_internal = np.array([z not in externals for z in zone_numbers], dtype=bool)
+        internal_zones = np.array(zone_numbers)[is_internal]
 
         skim_src_file = self.get_abs_path(
             self.controller.config.highway.output_skim_path
@@ -219,22 +188,23 @@ class DriveAccessSkims(Component):
                 time_period=period.name
             )
         )
+        names = {
+            "DDIST": f"{period.name.upper()}_da_dist",
+            "DTOLL": f"{period.name.upper()}_da_bridgetoll_da",
+            "DTIME": f"{period.name.upper()}_da_time",
+        }
+        # read internal zones only (drop externals)
+        index = np.flatnonzero(is_internal)
         with OMXManager(skim_src_file, "r") as src_file:
-            drive_costs = pd.DataFrame(
-                {
-                    "FTAZ": root_ids,
-                    "TTAZ": leaf_ids,
-                    "DDIST": src_file.read(f"{period.name.upper()}_da_dist").flatten(),
-                    "DTOLL": src_file.read(
-                        f"{period.name.upper()}_da_bridgetoll_da"
-                    ).flatten(),
-                    "DTIME": src_file.read(f"{period.name.upper()}_da_time").flatten(),
-                }
-            )
-            src_file.close()
-        # drop externals
-        drive_costs = drive_costs[~drive_costs["FTAZ"].isin(externals)]
-        drive_costs = drive_costs[~drive_costs["TTAZ"].isin(externals)]
+            skims = src_file.read_many(names.values(), rows=index, cols=index)
+        drive_costs = pd.DataFrame(
+            {
+                "FTAZ": np.repeat(internal_zones, len(internal_zones)),
+                "TTAZ": np.tile(internal_zones, len(internal_zones)),
+            }
+        )
+        for key, name in names.items():
+            drive_costs[key] = skims[name].ravel()
         # drop inaccessible zones
         drive_costs = drive_costs.query("DTIME > 0 & DTIME < 1e19")
         return drive_costs
@@ -52,6 +52,9 @@ import numpy as np
 from tm2py.components.component import Component
 from tm2py.components.demand.prepare_demand import PrepareHighwayDemand
 from tm2py.components.network.highway.highway_emme_spec import AssignmentSpecBuilder
+from tm2py.components.network.highway.highway_numpy_assign import (
+    NumpyTrafficAssignment,
+)
 from tm2py.emme.manager import (
     EmmeScenario,
     EmmeManagerLight,
@@ -66,6 +69,8 @@ from tm2py.logger import LogStartEnd, ProcessLogger
 if TYPE_CHECKING:
     from tm2py.controller import RunController
 
+NumpyArray = np.array
+
 
 class HighwayAssignment(Component):
     """Highway assignment and skims.
@@ -122,7 +127,9 @@ class HighwayAssignment(Component):
 
         distribution = self.controller.config.emme.highway_distribution
         if distribution:
-            launchers = self.setup_process_launchers(distribution[:-1])
+            launchers = self.setup_process_launchers(
+                distribution[:-1], demand.demand_store
+            )
             self.start_proccesses(launchers)
             # Run last configuration in process
             in_process_times = distribution[-1].time_periods
@@ -139,21 +146,65 @@ class HighwayAssignment(Component):
             f"Running highway assignments in process: {', '.join(times)}"
         )
         iteration = self.controller.iteration
-        for time in times:
-            project_path = self.emme_manager.project_path
-            emmebank_path = self.highway_emmebank.path
-            params = self._get_assign_params(time, num_processors)
-            runner = AssignmentRunner(
-                project_path,
-                emmebank_path,
-                iteration=iteration,
-                logger=self.logger,
-                **params,
-            )
-            runner.run()
+        # with skim_export_thread the OMX export of a period overlaps with the
+        # assignment of the next period
+        pending_runner = None
+        try:
+            for time in times:
+                project_path = self.emme_manager.project_path
+                emmebank_path = self.highway_emmebank.path
+                params = self._get_assign_params(time, num_processors)
+                runner = AssignmentRunner(
+                    project_path,
+                    emmebank_path,
+                    iteration=iteration,
+                    async_export_max_bytes=self._async_export_max_bytes,
+                    omx_storage_profile=self.config.omx_storage_profile,
+                    upload_skims=self.config.upload_skims_to_emme,
+                    assignment_engine=self.config.assignment_engine,
+                    warm_start_dir=self._warm_start_dir,
+                    summary_file=self._summary_file,
+                    logger=self.logger,
+                    **params,
+                )
+                # the previous export is completed before this export starts,
+                # so at most one export is pending
+                runner.run(wait_for=pending_runner)
+                pending_runner = runner
+        finally:
+            if pending_runner is not None:
+                pending_runner.wait_for_export()
+
+    @property
+    def _warm_start_dir(self) -> Union[str, None]:
+        """Absolute path to the assignment state folder, None if not warm_start_dir."""
+        if not self.config.warm_start_dir:
+            return None
+        return str(self.get_abs_path(self.config.warm_start_dir))
+
+    @property
+    def _summary_file(self) -> Union[str, None]:
+        """Absolute path to the assignment summary CSV, None if not configured."""
+        if not self.config.assignment_summary_file:
+            return None
+        return str(self.get_abs_path(self.config.assignment_summary_file))
+
+    @property
+    def _async_export_max_bytes(self) -> Union[int, None]:
+        """Memory budget for background skim export, None if not skim_export_thread."""
+        if not self.config.skim_export_thread:
+            return None
+        return int(self.controller.config.emme.omx_export_max_pending_mb * 2**20)
+
+    def setup_process_launchers(self, distribution, demand_store=None):
+        """Setup (copy data) databases for running assignments in separate processes
 
-    def setup_process_launchers(self, distribution):
-        "Setup (copy data) databases for running assignments in separate processes"
+        Args:
+            distribution: list of config.emme.highway_distribution items to run
+                in separate processes
+            demand_store: optional AveragedDemandStore to read demand from instead
+                of the highway Emmebank
+        """
         self.logger.status(
             f"Running highway assignments in {len(distribution)} separate processes"
         )
@@ -162,7 +213,15 @@ class HighwayAssignment(Component):
         time_params = {}
         for config in distribution:
             assign_launcher = AssignmentLauncher(
-                self.highway_emmebank.emmebank, iteration
+                self.highway_emmebank.emmebank,
+                iteration,
+                demand_store,
+                self._async_export_max_bytes,
+                self.config.omx_storage_profile,
+                self.config.upload_skims_to_emme,
+                self.config.assignment_engine,
+                self._warm_start_dir,
+                self._summary_file,
             )
             launchers.append(assign_launcher)
             for time in config.time_periods:
@@ -205,7 +264,12 @@ class HighwayAssignment(Component):
         iteration = self.controller.iteration
         warmstart = self.controller.config.warmstart.warmstart
         builder = AssignmentSpecBuilder(
-            time, iteration, warmstart, self.config, num_processors
+            time,
+            iteration,
+            warmstart,
+            self.config,
+            num_processors,
+            self.controller.config.run.end_iteration,
         )
         # Must match signature of manager.BaseAssignmentLauncher.add_run
         #       time, scenario, assign_spec, demand_matrices, skim_matrices, omx_file_path
@@ -235,6 +299,42 @@ class AssignmentLauncher(BaseAssignmentLauncher):
     and kicks off assignment in a subprocess.
     """
 
+    def __init__(
+        self,
+        emmebank: Emmebank,
+        iteration: int,
+        demand_store=None,
+        async_export_max_bytes: int = None,
+        omx_storage_profile: str = "default",
+        upload_skims: bool = True,
+        assignment_engine: str = "emme",
+        warm_start_dir: str = None,
+        summary_file: str = None,
+    ):
+        """Constructor for highway AssignmentLauncher.
+
+        Args:
+            emmebank (Emmebank): the primary emmebank with the scenarios and matrices
+            iteration (int): global iteration number
+            demand_store (AveragedDemandStore): optional, store of averaged demand
+            async_export_max_bytes (int): optional, write skims to OMX in a background
+                thread with this memory budget, see AssignmentRunner
+            omx_storage_profile (str): storage profile for the OMX skims
+            upload_skims (bool): write the post-processed skims back to Emme,
+                see AssignmentRunner
+            assignment_engine (str): "emme" or "numpy", see AssignmentRunner
+            warm_start_dir (str): optional, folder for the assignment state,
+                see AssignmentRunner
+            summary_file (str): optional, assignment summary CSV, see AssignmentRunner
+        """
+        super().__init__(emmebank, iteration, demand_store)
+        self._async_export_max_bytes = async_export_max_bytes
+        self._omx_storage_profile = omx_storage_profile
+        self._upload_skims = upload_skims
+        self._assignment_engine = assignment_engine
+        self._warm_start_dir = warm_start_dir
+        self._summary_file = summary_file
+
     def get_assign_script_path(self):
         return __file__
 
@@ -260,6 +360,12 @@ class AssignmentLauncher(BaseAssignmentLauncher):
                     "demand_matrices": demands,
                     "skim_matrices": skims,
                     "omx_file_path": omx_path,
+                    "async_export_max_bytes": self._async_export_max_bytes,
+                    "omx_storage_profile": self._omx_storage_profile,
+                    "upload_skims": self._upload_skims,
+                    "assignment_engine": self._assignment_engine,
+                    "warm_start_dir": self._warm_start_dir,
+                    "summary_file": self._summary_file,
                 }
             )
         return configs
@@ -272,6 +378,69 @@ class AssignmentLauncher(BaseAssignmentLauncher):
         return attrs
 
 
+class SkimPostProcessor:
+    """In-place post-processing of the skim arrays in a MatrixCache.
+
+    The skims are modified in the cached arrays, without new allocations per
+    matrix, and the modified matrices are written back to Emme together in
+    flush, right before the OMX export (which reads from the same cache).
+    """
+
+    def __init__(self, matrix_cache: MatrixCache):
+        """Constructor for SkimPostProcessor.
+
+        Args:
+            matrix_cache (MatrixCache): cache of the skim matrix data
+        """
+        self._matrix_cache = matrix_cache
+        self._modified = {}
+        self._buffer = None
+
+    def _get_data(self, matrix_name: str) -> NumpyArray:
+        data = self._matrix_cache.get_data(matrix_name)
+        self._modified[matrix_name] = data
+        return data
+
+    def subtract(self, matrix_name: str, other_name: str, factor: float = 1.0):
+        """Subtract factor * the other matrix from the matrix in place.
+
+        Args:
+            matrix_name: name or ID of the matrix to update
+            other_name: name or ID of the matrix to subtract
+            factor: factor to apply to the other matrix
+        """
+        data = self._get_data(matrix_name)
+        other = self._matrix_cache.get_data(other_name)
+        if self._buffer is None or self._buffer.shape != other.shape:
+            self._buffer = np.empty_like(other)
+        np.multiply(other, factor, out=self._buffer)
+        np.subtract(data, self._buffer, out=data)
+
+    def set_intrazonal_half_min(self, matrix_name: str):
+        """Set the diagonal to 1/2 of the row minimum of the other values in place.
+
+        NaN values are ignored, as with np.nanmin, in the same pass as the minima.
+
+        Args:
+            matrix_name: name or ID of the matrix to update
+        """
+        data = self._get_data(matrix_name)
+        np.fill_diagonal(data, np.inf)
+        np.fill_diagonal(data, 0.5 * np.fmin.reduce(data, axis=1))
+
+    def flush(self, upload: bool = True):
+        """Write the modified matrices to Emme, or only keep them in the cache.
+
+        Args:
+            upload: if False the Emme matrices are not updated, the modified
+                data is only available from the matrix cache (e.g. for export)
+        """
+        if upload:
+            for matrix_name, data in self._modified.items():
+                self._matrix_cache.set_data(matrix_name, data)
+        self._modified = {}
+
+
 # runs the actual assignment in local process (can also run in current process)
 class AssignmentRunner:
 
@@ -286,6 +455,12 @@ class AssignmentRunner:
         demand_matrices: List[str],
         skim_matrices: List[str],
         omx_file_path: str,
+        async_export_max_bytes: int = None,
+        omx_storage_profile: str = "default",
+        upload_skims: bool = True,
+        assignment_engine: str = "emme",
+        warm_start_dir: str = None,
+        summary_file: str = None,
         logger=None,
     ):
         """
@@ -300,6 +475,22 @@ class AssignmentRunner:
             assign_spec (Dict): EMME SOLA assignment specification
             skim_matrices (List[str]): list of skim matrix ID.
             omx_file_path (str): path to resulting output of skim matrices to OMX
+            async_export_max_bytes (int): optional, if specified the skims are written
+                to OMX in a background thread with this memory budget for the queued
+                data, run returns before the export is complete, use wait_for_export
+            omx_storage_profile (str): name of the OMX storage profile (data type,
+                compression and chunk shape) for the skims, see OMX_STORAGE_PROFILES
+            upload_skims (bool): write the post-processed time and distance skims
+                back to the Emme matrices. If False the Emme matrices keep the
+                assignment results and only the OMX skims are post-processed.
+            assignment_engine (str): "emme" for the Emme SOLA traffic assignment,
+                or "numpy" for the reference NumpyTrafficAssignment
+            warm_start_dir (str): optional, folder for the assignment state
+                {time}_highway_assign.npz, the numpy assignment starts from
+                the saved class link volumes and saves the final volumes.
+                Not used by the Emme SOLA assignment.
+            summary_file (str): optional, CSV file to append the runtime, number
+                of iterations and final relative gap of each assignment
             logger (Logger): optional logger object if running in process.
                 If not specified a new logger reference is created.
         """
@@ -313,8 +504,16 @@ class AssignmentRunner:
         self.skim_matrix_ids = skim_matrices
         self.demand_matrix_ids = demand_matrices
         self.omx_file_path = omx_file_path
-
+        self.async_export_max_bytes = async_export_max_bytes
+        self.omx_storage_profile = omx_storage_profile
+        self.upload_skims = upload_skims
+        self.assignment_engine = assignment_engine
+        self.warm_start_dir = warm_start_dir
+        self.summary_file = summary_file
+
+        self._omx_export = None
         self._matrix_cache = None
+        self._skim_processor = None
         self._network_calculator = None
         self._skim_matrix_objs = []
         if logger:
@@ -328,8 +527,13 @@ class AssignmentRunner:
                 run_log_file_path, log_on_error_file_path, self.emme_manager
             )
 
-    def run(self):
-        "Run time period highway assignment"
+    def run(self, wait_for: "AssignmentRunner" = None):
+        """Run time period highway assignment.
+
+        Args:
+            wait_for: optional, the runner of the previous period, its pending skim
+                export is completed before the export of this period starts
+        """
         with self._setup():
             if self.iteration > 0:
                 self._copy_maz_flow()
@@ -345,12 +549,21 @@ class AssignmentRunner:
             with self.logger.log_start_end(
                 "Run SOLA assignment (no path analyses)", level="INFO"
             ):
-                assign = self.emme_manager.tool(
-                    "inro.emme.traffic_assignment.sola_traffic_assignment"
-                )
-                assign(
-                    self.assign_spec_no_analysis, self.scenario, chart_log_interval=1
-                )
+                if self.assignment_engine == "numpy":
+                    warm_start_path = None
+                    if self.warm_start_dir:
+                        warm_start_path = os.path.join(
+                            self.warm_start_dir, f"{self.time}_highway_assign.npz"
+                        )
+                    assign = NumpyTrafficAssignment(
+                        self.logger, warm_start_path=warm_start_path
+                    )
+                else:
+                    assign = self.emme_manager.tool(
+                        "inro.emme.traffic_assignment.sola_traffic_assignment"
+                    )
+                spec = self.assign_spec_no_analysis
+                self._run_assignment(assign, spec, "no_analysis")
 
             with self.logger.log_start_end(
                 "Calculates link level LOS based reliability", level="DETAIL"
@@ -386,16 +599,62 @@ class AssignmentRunner:
                 "Run SOLA assignment with path analyses and highway reliability",
                 level="INFO",
             ):
-                assign(self.assign_spec, self.scenario, chart_log_interval=1)
+                self._run_assignment(assign, self.assign_spec, "path_analysis")
 
             # Subtract non-time costs from gen cost to get the raw travel time
             self._calc_time_skims()
             # Set intra-zonal for time and dist to be 1/2 nearest neighbour
             self._set_intrazonal_values()
+            self._skim_processor.flush(upload=self.upload_skims)
+            if wait_for is not None:
+                wait_for.wait_for_export()
             self._export_skims()
             # if self.logger.debug_enabled:
             #     self._log_debug_report(scenario, time)
 
+    def _run_assignment(self, assign, spec: Dict, name: str):
+        """Run the assignment tool, report the runtime and final relative gap.
+
+        Args:
+            assign: the SOLA tool or NumpyTrafficAssignment
+            spec: assignment specification
+            name: name of the assignment in the summary
+        """
+        start = _time.perf_counter()
+        report = assign(spec, self.scenario, chart_log_interval=1)
+        seconds = _time.perf_counter() - start
+        num_iterations, relative_gap, warm_start = 0, float("nan"), False
+        if isinstance(report, dict):
+            iterations = report.get("iterations") or []
+            num_iterations = len(iterations)
+            if iterations:
+                relative_gap = iterations[-1].get("gaps", {}).get("relative", np.nan)
+            warm_start = bool(report.get("warm_start", False))
+        self.logger.log(
+            f"{self.time} {name} assignment: {num_iterations} iterations, "
+            f"relative gap {relative_gap:.6g}, {seconds:.1f} seconds"
+            + (", warm start" if warm_start else ""),
+            level="INFO",
+        )
+        if self.summary_file:
+            row = {
+                "iteration": self.iteration,
+                "time_period": self.time,
+                "assignment": name,
+                "iterations": num_iterations,
+                "relative_gap": relative_gap,
+                "seconds": round(seconds, 3),
+                "warm_start": warm_start,
+            }
+            write_header = not os.path.exists(self.summary_file)
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.summary_file)), exist_ok=True
+            )
+            with open(self.summary_file, "a", encoding="utf8") as summary:
+                if write_header:
+                    summary.write(",".join(row) + "\n")
+                summary.write(",".join(str(value) for value in row.values()) + "\n")
+
     @property
     def assign_spec_no_analysis(self):
         """Return modified SOLA assignment specification with no analyses."""
@@ -411,6 +670,7 @@ class AssignmentRunner:
             f"Run {self.time} highway assignment", level="STATUS"
         ):
             self._matrix_cache = MatrixCache(self.scenario)
+            self._skim_processor = SkimPostProcessor(self._matrix_cache)
             self._skim_matrix_objs = []
             self._network_calculator = NetworkCalculator(
                 self.emme_manager, self.scenario
@@ -420,6 +680,7 @@ class AssignmentRunner:
             finally:
                 self._matrix_cache.clear()
                 self._matrix_cache = None
+                self._skim_processor = None
                 self._skim_matrix_objs = []
                 self._network_calculator = None
 
@@ -459,21 +720,15 @@ class AssignmentRunner:
                 # Total link costs is always the first analysis
                 cost = emme_class_spec["path_analyses"][0]["results"]["od_values"]
                 factor = emme_class_spec["generalized_cost"]["perception_factor"]
-                gencost_data = self._matrix_cache.get_data(od_travel_times)
-                cost_data = self._matrix_cache.get_data(cost)
-                time_data = gencost_data - (factor * cost_data)
-                self._matrix_cache.set_data(od_travel_times, time_data)
+                self._skim_processor.subtract(od_travel_times, cost, factor)
 
     def _set_intrazonal_values(self):
         """Set the intrazonal values to 1/2 nearest neighbour for time and distance skims."""
         for matrix in self._skim_matrix_objs:
             if matrix.name.endswith(("time", "dist")):
                 self.logger.debug(f"Setting intrazonals to 0.5*min for {matrix.name}")
-                data = self._matrix_cache.get_data(matrix.name)
                 # NOTE: sets values for external zones as well
-                np.fill_diagonal(data, np.inf)
-                data[np.diag_indices_from(data)] = 0.5 * np.nanmin(data, 1)
-                self._matrix_cache.set_data(matrix.name, data)
+                self._skim_processor.set_intrazonal_half_min(matrix.name)
 
     def _export_skims(self):
         """Export skims to OMX files by period."""
@@ -482,10 +737,29 @@ class AssignmentRunner:
             f"export {len(self._skim_matrix_objs)} skim matrices to {self.omx_file_path}"
         )
         os.makedirs(os.path.dirname(self.omx_file_path), exist_ok=True)
-        with OMXManager(
-            self.omx_file_path, "w", self.scenario, matrix_cache=self._matrix_cache
-        ) as omx_file:
-            omx_file.write_matrices(self._skim_matrix_objs)
+        self.wait_for_export()
+        self._omx_export = OMXManager(
+            self.omx_file_path,
+            "w",
+            self.scenario,
+            matrix_cache=self._matrix_cache,
+            async_write=self.async_export_max_bytes is not None,
+            max_pending_bytes=self.async_export_max_bytes,
+            storage_profile=self.omx_storage_profile,
+        )
+        # opened here and closed in wait_for_export
+        self._omx_export.open()
+        self._omx_export.create_mapping("zone_number", self.scenario.zone_numbers)
+        self._omx_export.write_matrices(self._skim_matrix_objs)
+        if self.async_export_max_bytes is None:
+            self.wait_for_export()
+
+    def wait_for_export(self):
+        """Wait for the OMX skim export (if pending) to complete and close the file."""
+        if self._omx_export is not None:
+            omx_export, self._omx_export = self._omx_export, None
+            # raises any exception from the writer thread
+            omx_export.close()
 
     def _log_debug_report(self, scenario: EmmeScenario, time_period: str):
         num_zones = len(scenario.zone_numbers)
@@ -518,6 +792,10 @@ if __name__ == "__main__":
         run_config = _json.load(f)
     if not isinstance(run_config, list):
         run_config = [run_config]
+    pending_runner = None
     for kwargs in run_config:
         assign_runner = AssignmentRunner(**kwargs)
-        assign_runner.run()
+        assign_runner.run(wait_for=pending_runner)
+        pending_runner = assign_runner
+    if pending_runner is not None:
+        pending_runner.wait_for_export()
@@ -39,6 +39,23 @@ if TYPE_CHECKING:
     ]
 
 
+def scheduled_relative_gap(
+    initial: float, final: float, iteration: int, end_iteration: int
+) -> float:
+    """Relative gap for the global iteration, geometric from initial to final.
+
+    Args:
+        initial: relative gap in global iteration 0
+        final: relative gap in end_iteration (and later)
+        iteration: global iteration number
+        end_iteration: last global iteration number
+    """
+    if not end_iteration:
+        return final
+    fraction = min(iteration, end_iteration) / end_iteration
+    return initial * (final / initial) ** fraction
+
+
 class AssignmentSpecBuilder:
     """Highway assignment specification builder, represents data from config
     and conversion to EMME SOLA specification.
@@ -51,6 +68,7 @@ class AssignmentSpecBuilder:
         warmstart: bool,
         highway_config: "HighwayConfig",
         num_processors: Union[int, str],
+        end_iteration: int = None,
     ):
         """Constructor of Highway Assignment class.
 
@@ -61,6 +79,8 @@ class AssignmentSpecBuilder:
             highway_config (HighwayConfig object): the highway config (config.highway)
             num_processors (int, str): number of processors to use in the assignment as an integer,
                 or reference of MAX in pattern like MAX-N or MAX/N
+            end_iteration (int): last global iteration, for the relative gap schedule
+                (config.run.end_iteration)
         """
         self._time = time
         self._iteration = iteration
@@ -74,7 +94,15 @@ class AssignmentSpecBuilder:
         # get the corresponding relative gap for the current global iteration
         relative_gaps = highway_config.relative_gaps
         relative_gap = None
-        if relative_gaps and isinstance(relative_gaps, tuple):
+        schedule = highway_config.relative_gap_schedule
+        if schedule is not None:
+            relative_gap = scheduled_relative_gap(
+                schedule.initial_relative_gap,
+                schedule.final_relative_gap,
+                iteration,
+                end_iteration,
+            )
+        elif relative_gaps and isinstance(relative_gaps, tuple):
             for item in relative_gaps:
                 if item["global_iteration"] == iteration:
                     relative_gap = item["relative_gap"]
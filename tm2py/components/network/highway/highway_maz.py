@@ -27,12 +27,15 @@ used as background traffic in the equilibrium Highway assignment.
 
 from __future__ import annotations
 
-import array as _array
+import hashlib
+import mmap as _mmap
 import os
+import time as _time
+from abc import ABC, abstractmethod
 from collections import defaultdict as _defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager as _context
-from math import sqrt as _sqrt
-from typing import TYPE_CHECKING, BinaryIO, Dict, List, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -40,7 +43,11 @@ import pandas as pd
 from tm2py.components.component import Component
 from tm2py.emme.manager import EmmeNode
 from tm2py.emme.matrix import OMXManager
-from tm2py.emme.network import NetworkCalculator
+from tm2py.emme.network import (
+    NetworkCalculator,
+    get_attribute_arrays,
+    set_attribute_arrays,
+)
 from tm2py.logger import LogStartEnd
 
 # from tables import NoSuchNodeError
@@ -50,10 +57,14 @@ if TYPE_CHECKING:
 
 
 _default_bin_edges = [0.0, 0.9, 1.2, 1.8, 2.5, 5.0, 10.0]
-# Using text file format for now, can upgrade to binary format (faster) once
-# compatibility with new networks is verified
-_USE_BINARY = False
+# number of O-D pairs per block when loading flows from the paths file
+_PATH_BLOCK_SIZE = 100000
+# link lookup set in the flow loading worker processes, see _set_worker_link_lookup
+_worker_link_lookup = None
 NumpyArray = np.array
+# MAZ-to-MAZ demand as struct of arrays: origin node number ("orig"),
+# destination node number ("dest"), demand ("dem") and distance in feet ("dist")
+MazDemand = Dict[str, NumpyArray]
 
 
 class AssignMAZSPDemand(Component):
@@ -89,11 +100,20 @@ class AssignMAZSPDemand(Component):
         # Internal attributes to track data through the sequence of steps
         self._scenario = None
         self._mazs = None
-        self._demand = _defaultdict(lambda: [])
+        self._demand = None
         self._max_dist = 0
         self._network = None
-        self._root_index = None
-        self._leaf_index = None
+        self._node_index = None
+        self._sorted_nodes = None
+        self._node_maz_ids = None
+        self._link_index = None
+        self._link_lookup = None
+        self._maz_flow = None
+        self._roots = None
+        self._leaves = None
+        self._flow_pool = None
+        self._flow_tasks = None
+        self._bin_times = None
 
     @property
     def highway_emmebank(self):
@@ -132,11 +152,21 @@ class AssignMAZSPDemand(Component):
                         continue
                     self._process_demand(time, i, maz_ids)
                 demand_bins = self._group_demand()
-                for i, demand_group in enumerate(demand_bins):
-                    self._find_roots_and_leaves(demand_group["demand"])
-                    self._set_link_cost_maz()
-                    self._run_shortest_path(time, i, demand_group["dist"])
-                    self._assign_flow(time, i, demand_group["demand"])
+                with self._flow_processes():
+                    for i, demand_group in enumerate(demand_bins):
+                        self._find_roots_and_leaves(demand_group["demand"])
+                        self._set_link_cost_maz()
+                        start = _time.perf_counter()
+                        self._run_shortest_path(time, i, demand_group["dist"])
+                        self._bin_times[i] = [_time.perf_counter() - start, 0.0]
+                        self._assign_flow(time, i, demand_group["demand"])
+                set_attribute_arrays(
+                    self._scenario,
+                    "LINK",
+                    self._link_index,
+                    {"@maz_flow": self._maz_flow},
+                )
+                self._log_bin_times(demand_bins)
 
     @_context
     def _setup(self, time: str):
@@ -146,11 +176,18 @@ class AssignMAZSPDemand(Component):
             time: name of the time period
         """
         self._mazs = None
-        self._demand = _defaultdict(lambda: [])
+        self._demand = []
         self._max_dist = 0
         self._network = None
-        self._root_index = None
-        self._leaf_index = None
+        self._node_index = None
+        self._sorted_nodes = None
+        self._node_maz_ids = None
+        self._link_index = None
+        self._link_lookup = None
+        self._maz_flow = None
+        self._roots = None
+        self._leaves = None
+        self._bin_times = {}
         attributes = [
             ("LINK", "@link_cost", "total cost MAZ-MAZ"),
             ("LINK", "@link_cost_maz", "cost MAZ-MAZ, unused MAZs blocked"),
@@ -172,11 +209,18 @@ class AssignMAZSPDemand(Component):
                     self._mazs = None
                     self._demand = None
                     self._network = None
-                    self._root_index = None
-                    self._leaf_index = None
+                    self._node_index = None
+                    self._sorted_nodes = None
+                    self._node_maz_ids = None
+                    self._link_index = None
+                    self._link_lookup = None
+                    self._maz_flow = None
+                    self._roots = None
+                    self._leaves = None
+                    self._bin_times = None
                     # delete sp path files
                     for bin_no in range(len(self._bin_edges)):
-                        file_path = os.path.join(self.eb_dir, f"sp_{time}_{bin_no}.ebp")
+                        file_path = self._path_file_name(time, bin_no)
                         if os.path.exists(file_path):
                             os.remove(file_path)
 
@@ -203,7 +247,21 @@ class AssignMAZSPDemand(Component):
         self._network = self.controller.emme_manager.get_network(
             self._scenario, {"NODE": ["@maz_id", "x", "y", "#node_county"], "LINK": []}
         )
-        self._network.create_attribute("LINK", "temp_flow")
+        # node numbers (sorted) and @maz_id by node position for bulk root / leaf flags
+        self._node_index, node_values = get_attribute_arrays(
+            self._scenario, "NODE", ["@maz_id"]
+        )
+        node_numbers = np.empty(len(self._node_index), dtype=np.int64)
+        node_numbers[list(self._node_index.values())] = list(self._node_index.keys())
+        order = np.argsort(node_numbers)
+        self._sorted_nodes = (node_numbers[order], order)
+        self._node_maz_ids = node_values["@maz_id"]
+        # MAZ flow by link position, summed over the bins and written to @maz_flow
+        self._link_index, _ = get_attribute_arrays(
+            self._scenario, "LINK", ["@maz_flow"]
+        )
+        self._link_lookup = LinkLookup(self._link_index)
+        self._maz_flow = np.zeros(self._link_lookup.num_links)
 
     def _get_county_mazs(self, counties: List[str]) -> List[EmmeNode]:
         """Get all MAZ nodes which are located in one of these counties.
@@ -236,7 +294,8 @@ class AssignMAZSPDemand(Component):
         mazs = []
         for county in counties:
             mazs.extend(self._mazs[county])
-        # highway emme network does not include the 5 inaccessiable MAZs, but the trip table is indexed by the full MAZ list
+        # highway emme network does not include the 5 inaccessiable MAZs,
+        # but the trip table is indexed by the full MAZ list
         # https://app.asana.com/0/12291104512575/1199091221400653/f
         if "San Francisco" in counties:
             mazs.extend(
@@ -253,11 +312,13 @@ class AssignMAZSPDemand(Component):
         return sorted(mazs, key=lambda n: n["@maz_id"])
 
     def _process_demand(self, time: str, index: int, maz_ids: List[EmmeNode]):
-        """Loads the demand from file and groups by origin node.
+        """Loads the demand from file and filters to the MAZ pairs to assign.
 
-        Sets the demand to self._demand for later processing, grouping the demand in
-        a dictionary by origin node (Emme Node object) to list of dictionaries
-        {"orig": orig_node, "dest": dest_node, "dem": demand, "dist": dist}
+        Appends the demand to self._demand for later processing, as a MazDemand
+        struct of arrays {"orig": origin node numbers, "dest": destination node
+        numbers, "dem": demand, "dist": straight-line distance}. Intra-MAZ demand,
+        demand for MAZs outside of the county group and demand over max_distance
+        are dropped.
 
         Args:
             time: time period name
@@ -274,50 +335,66 @@ class AssignMAZSPDemand(Component):
             f"non-zero origins {len(origins)} destinations {len(destinations)}",
             level="DEBUG",
         )
-        total_demand = 0
-        for orig, dest in zip(origins, destinations):
-            # skip intra-maz demand
-            if orig == dest:
-                continue
-            if orig > len(maz_ids) - 1:
-                self.logger.log(
-                    f"Network MAZ @maz_id={orig} #county_name does not match its county name in the input MAZ SE data.",
-                    level="DEBUG",
-                )
-                continue
-            if dest > len(maz_ids) - 1:
-                self.logger.log(
-                    f"Network MAZ @maz_id={dest} #county_name does not match its county name in the input MAZ SE data.",
-                    level="DEBUG",
-                )
-                continue
-            check = maz_ids[99]
-            orig_node = maz_ids[orig]
-            dest_node = maz_ids[dest]
-            dist = _sqrt(
-                (dest_node.x - orig_node.x) ** 2 + (dest_node.y - orig_node.y) ** 2
+        numbers, x_coord, y_coord = self._maz_node_arrays(maz_ids)
+        num_mazs = len(maz_ids)
+        in_group = (origins < num_mazs) & (destinations < num_mazs)
+        if not in_group.all():
+            self.logger.log(
+                f"{(~in_group).sum()} MAZ pairs with an index outside of the county "
+                "group MAZs: network MAZ #county_name does not match its county name "
+                "in the input MAZ SE data.",
+                level="DEBUG",
             )
-            if (dist / 5280) > self.config.max_distance:
-                self.logger.log(
-                    f"MAZ demand from {orig} to {dest} is over {self.config.max_distance} miles, do not assign",
-                    level="DEBUG",
-                )
-                continue
-            if dist > self._max_dist:
-                self._max_dist = dist
-            demand = data[orig][dest]
-            total_demand += demand
-            self._demand[orig_node].append(
-                {
-                    "orig": orig_node,
-                    "dest": dest_node,
-                    "dem": demand,
-                    "dist": dist,
-                }
+        # skip intra-maz demand
+        keep = in_group & (origins != destinations)
+        origins, destinations = origins[keep], destinations[keep]
+        dist = np.hypot(
+            x_coord[destinations] - x_coord[origins],
+            y_coord[destinations] - y_coord[origins],
+        )
+        # NaN distance for the MAZs which are not in the network
+        within = dist / 5280 <= self.config.max_distance
+        if not within.all():
+            self.logger.log(
+                f"{(~within).sum()} MAZ pairs over {self.config.max_distance} miles "
+                "(or not in the network), do not assign",
+                level="DEBUG",
             )
+        origins, destinations = origins[within], destinations[within]
+        dist = dist[within]
+        demand = {
+            "orig": numbers[origins],
+            "dest": numbers[destinations],
+            "dem": data[origins, destinations],
+            "dist": dist,
+        }
+        self._demand.append(demand)
+        if len(dist):
+            self._max_dist = max(self._max_dist, dist.max())
         self.logger.log(f"Max distance found {self._max_dist}", level="DEBUG")
+        total_demand = demand["dem"].sum()
         self.logger.log(f"Total inter-zonal demand {total_demand}", level="DEBUG")
 
+    @staticmethod
+    def _maz_node_arrays(maz_ids: List[EmmeNode]) -> List[NumpyArray]:
+        """Node number, x and y arrays for the list of MAZ nodes.
+
+        MAZs which are not in the network (placeholder dictionaries) have
+        number -1 and NaN coordinates.
+        """
+        nodes = [
+            (-1, np.nan, np.nan)
+            if isinstance(node, dict)
+            else (node.number, node.x, node.y)
+            for node in maz_ids
+        ]
+        numbers, x_coord, y_coord = zip(*nodes) if nodes else ((), (), ())
+        return (
+            np.array(numbers, dtype=np.int64),
+            np.array(x_coord, dtype=float),
+            np.array(y_coord, dtype=float),
+        )
+
     def _read_demand_array(self, time: str, index: int) -> NumpyArray:
         """Load the demand from file with the specified time and index name.
 
@@ -337,16 +414,12 @@ class AssignMAZSPDemand(Component):
             omx_file.close()
         return demand_array
 
-    def _group_demand(
-        self,
-    ) -> List[Dict[str, Union[float, List[Dict[str, Union[float, EmmeNode]]]]]]:
+    def _group_demand(self) -> List[Dict[str, Union[float, MazDemand]]]:
         """Process the demand loaded from files \
             and create groups based on the origin to the furthest destination with demand.
 
         Returns:
-            List of dictionaries, containing the demand in the format
-                {"orig": EmmeNode, "dest": EmmeNode, "dem": float (demand value)}
-
+            List of dictionaries {"dist": bin max distance (miles), "demand": MazDemand}
         """
         self.logger.log("Grouping demand in distance buckets", level="DETAIL")
         # group demand from same origin into distance bins by furthest
@@ -355,52 +428,60 @@ class AssignMAZSPDemand(Component):
         if bin_edges[-1] < self._max_dist / 5280.0:
             bin_edges.append(self._max_dist / 5280.0)
 
-        demand_groups = [
-            {"dist": edge, "demand": []} for i, edge in enumerate(bin_edges[1:])
-        ]
-        for data in self._demand.values():
-            max_dist = max(entry["dist"] for entry in data) / 5280.0
-            for group in demand_groups:
-                if max_dist < group["dist"]:
-                    group["demand"].extend(data)
-                    break
-        for group in demand_groups:
-            self.logger.log(
-                f"bin dist {group['dist']}, size {len(group['demand'])}", level="DEBUG"
-            )
-        # Filter out groups without any demand
-        demand_groups = [group for group in demand_groups if group["demand"]]
+        if not self._demand:
+            return []
+        demand = dict(
+            (key, np.concatenate([group[key] for group in self._demand]))
+            for key in ["orig", "dest", "dem", "dist"]
+        )
+        bins = distance_bins_by_origin(
+            demand["orig"], demand["dist"] / 5280.0, bin_edges
+        )
+        demand_groups = []
+        for bin_no, edge in enumerate(bin_edges[1:]):
+            in_bin = bins == bin_no
+            self.logger.log(f"bin dist {edge}, size {in_bin.sum()}", level="DEBUG")
+            # Filter out groups without any demand
+            if in_bin.any():
+                demand_groups.append(
+                    {
+                        "dist": edge,
+                        "demand": dict((k, v[in_bin]) for k, v in demand.items()),
+                    }
+                )
         return demand_groups
 
-    def _find_roots_and_leaves(self, demand: List[Dict[str, Union[float, EmmeNode]]]):
+    def _find_roots_and_leaves(self, demand: MazDemand):
         """Label available MAZ root nodes and leaf nodes for the path calculation.
 
         The MAZ nodes which are found as origins in the demand are "activated"
-        by setting @maz_root to non-zero, and similarly the leaves have @maz_leaf
-        set to non-zero.
+        by setting @maz_root to the @maz_id, and similarly the leaves have @maz_leaf
+        set to the @maz_id. All other nodes are set to 0. The flags are written to
+        the scenario in bulk.
 
         Args:
-            demand: list of dictionaries, containing the demand in the format
-                {"orig": EmmeNode, "dest": EmmeNode, "dem": float (demand value)}
+            demand: MazDemand struct of arrays
         """
-        network = self._network
-        attrs_to_init = [("NODE", ["@maz_root", "@maz_leaf"]), ("LINK", ["maz_cost"])]
-        for domain, attrs in attrs_to_init:
-            for name in attrs:
-                if name in network.attributes(domain):
-                    network.delete_attribute(domain, name)
-                network.create_attribute(domain, name)
-        root_maz_ids = {}
-        leaf_maz_ids = {}
-        for data in demand:
-            o_node, d_node = data["orig"], data["dest"]
-            root_maz_ids[o_node.number] = o_node["@maz_root"] = o_node["@maz_id"]
-            leaf_maz_ids[d_node.number] = d_node["@maz_leaf"] = d_node["@maz_id"]
-        self._root_index = {p: i for i, p in enumerate(sorted(root_maz_ids.keys()))}
-        self._leaf_index = {q: i for i, q in enumerate(sorted(leaf_maz_ids.keys()))}
-        self.controller.emme_manager.copy_attribute_values(
-            self._network, self._scenario, {"NODE": ["@maz_root", "@maz_leaf"]}
+        roots = np.unique(demand["orig"])
+        leaves = np.unique(demand["dest"])
+        root_flags = np.zeros(len(self._node_maz_ids))
+        leaf_flags = np.zeros(len(self._node_maz_ids))
+        for nodes, flags in [(roots, root_flags), (leaves, leaf_flags)]:
+            positions = self._node_positions(nodes)
+            flags[positions] = self._node_maz_ids[positions]
+        set_attribute_arrays(
+            self._scenario,
+            "NODE",
+            self._node_index,
+            {"@maz_root": root_flags, "@maz_leaf": leaf_flags},
         )
+        self._roots = roots
+        self._leaves = leaves
+
+    def _node_positions(self, node_numbers: NumpyArray) -> NumpyArray:
+        """Positions in the scenario node attribute arrays of the node numbers."""
+        sorted_numbers, order = self._sorted_nodes
+        return order[np.searchsorted(sorted_numbers, node_numbers)]
 
     def _set_link_cost_maz(self):
         """Set link cost used in the shortest path forbidden using unavailable connectors.
@@ -430,8 +511,6 @@ class AssignMAZSPDemand(Component):
             "inro.emme.network_calculation.shortest_path"
         )
         max_radius = max_radius * 5280 + 100  # add some buffer for rounding error
-        ext = "ebp" if _USE_BINARY else "txt"
-        file_name = f"sp_{time}_{bin_no}.{ext}"
 
         spec = {
             "type": "SHORTEST_PATH",
@@ -454,8 +533,8 @@ class AssignMAZSPDemand(Component):
                     "analyses": [],
                 },
                 "path_output": {
-                    "format": "BINARY" if _USE_BINARY else "TEXT",
-                    "file": os.path.join(self.eb_dir, file_name),
+                    "format": self.config.path_file_format,
+                    "file": self._path_file_name(time, bin_no),
                 },
             },
             "performance_settings": {
@@ -466,207 +545,370 @@ class AssignMAZSPDemand(Component):
         }
         shortest_paths_tool(spec, self._scenario)
 
-    def _assign_flow(
-        self, time: str, bin_no: int, demand: List[Dict[str, Union[float, EmmeNode]]]
-    ):
-        """Assign the demand along the paths generated from the shortest path tool.
+    def _path_file_name(self, time: str, bin_no: int) -> str:
+        """Full path of the shortest paths file for the time period and bin."""
+        ext = "ebp" if self.config.path_file_format == "BINARY" else "txt"
+        return os.path.join(self.eb_dir, f"sp_{time}_{bin_no}.{ext}")
 
-        Args:
-            time: time period name
-            bin_no: bin number (id) for this demand segment
-            demand: list of dictionaries, containing the demand in the format
-                {"orig": EmmeNode, "dest": EmmeNode, "dem": float (demand value)}
+    @_context
+    def _flow_processes(self):
+        """Process pool to load path flows while the next shortest paths are run.
+
+        If config num_flow_processes is 0 the flows are loaded in this process
+        by _assign_flow. Otherwise each bin is submitted to the pool and the
+        per-bin flow vectors are summed into self._maz_flow on exit.
         """
-        if _USE_BINARY:
-            self._assign_flow_binary(time, bin_no, demand)
-        else:
-            self._assign_flow_text(time, bin_no, demand)
+        if not self.config.num_flow_processes:
+            yield
+            return
+        with ProcessPoolExecutor(
+            max_workers=self.config.num_flow_processes,
+            initializer=_set_worker_link_lookup,
+            initargs=(self._link_lookup,),
+        ) as pool:
+            self._flow_pool = pool
+            self._flow_tasks = []
+            try:
+                yield
+                for bin_no, task in self._flow_tasks:
+                    self._add_bin_flow(bin_no, task.result())
+            finally:
+                self._flow_pool = None
+                self._flow_tasks = None
 
-    def _assign_flow_text(
-        self, time: str, bin_no: int, demand: List[Dict[str, Union[float, EmmeNode]]]
-    ):
+    def _assign_flow(self, time: str, bin_no: int, demand: MazDemand):
         """Assign the demand along the paths generated from the shortest path tool.
 
-        The paths are read from a text format file, see Emme help for details.
-        Demand is summed in self._network (in memory) using temp_flow attribute
-        and written to scenario (Emmebank / disk) @maz_flow.
+        The paths file is loaded with load_path_flows, in the process pool if
+        configured, and the flow is added to self._maz_flow.
 
         Args:
             time: time period name
             bin_no: bin number (id) for this demand segment
-            demand: list of dictionaries, containin the demand in the format
-                {"orig": EmmeNode, "dest": EmmeNode, "dem": float (demand value)}
+            demand: MazDemand struct of arrays
         """
-        paths = self._load_text_format_paths(time, bin_no)
-        not_assigned, assigned = 0, 0
-        for data in demand:
-            orig, dest, dem = data["orig"].number, data["dest"].number, data["dem"]
-            path = paths.get(orig, {}).get(dest)
-            if path is None:
-                not_assigned += dem
-                continue
-            i_node = orig
-            for j_node in path:
-                link = self._network.link(i_node, j_node)
-                link["temp_flow"] += dem
-                i_node = j_node
-            assigned += dem
-        self.logger.log(f"ASSIGN bin {bin_no}: total: {len(demand)}", level="DEBUG")
+        args = (self._path_file_name(time, bin_no), self._roots, self._leaves, demand)
+        if self._flow_pool is None:
+            self._add_bin_flow(bin_no, load_path_flows(*args, self._link_lookup))
+        else:
+            task = self._flow_pool.submit(load_path_flows, *args)
+            self._flow_tasks.append((bin_no, task))
+
+    def _add_bin_flow(self, bin_no: int, result: Tuple[NumpyArray, Dict[str, float]]):
+        """Add the flow vector from load_path_flows to self._maz_flow and log stats."""
+        flow, stats = result
+        self._maz_flow += flow
+        self._bin_times[bin_no][1] = stats["seconds"]
         self.logger.log(
-            f"assigned: {assigned}, not assigned: {not_assigned}", level="DEBUG"
+            f"ASSIGN bin {bin_no}: total {stats['pairs']}, "
+            f"assigned {stats['assigned']}, not assigned {stats['not_assigned']}, "
+            f"links {stats['links']}",
+            level="DEBUG",
         )
 
-        self.controller.emme_manager.copy_attribute_values(
-            self._network, self._scenario, {"LINK": ["temp_flow"]}, {"LINK": ["data1"]}
-        )
+    def _log_bin_times(self, demand_bins: List[Dict[str, Union[float, MazDemand]]]):
+        """Log the shortest path and flow loading time by bin, slowest first."""
+        order = sorted(self._bin_times, key=lambda b: -sum(self._bin_times[b]))
+        for bin_no in order:
+            sp_time, flow_time = self._bin_times[bin_no]
+            self.logger.log(
+                f"bin {bin_no} (max dist {demand_bins[bin_no]['dist']:.2f} miles, "
+                f"{len(demand_bins[bin_no]['demand']['dem'])} pairs): "
+                f"shortest path {sp_time:.2f}s, flow loading {flow_time:.2f}s",
+                level="DETAIL",
+            )
 
-    def _load_text_format_paths(
-        self, time: str, bin_no: int
-    ) -> Dict[int, Dict[int, List[int]]]:
-        """Load all paths from text file and return as nested dictionary.
 
-        Args:
-            time: time period name
-            bin_no: bin number (id) for this demand segment
+def _set_worker_link_lookup(link_lookup: LinkLookup):
+    """Process pool initializer: set the link lookup used by load_path_flows."""
+    global _worker_link_lookup  # pylint: disable=W0603
+    _worker_link_lookup = link_lookup
 
-        Returns:
-            All paths as a nested dictionary, path = paths[origin][destination],
-            using the node IDs as integers.
-        """
-        paths = _defaultdict(lambda: {})
-        with open(
-            os.path.join(self.eb_dir, f"sp_{time}_{bin_no}.txt"),
-            "r",
-            encoding="utf8",
-        ) as paths_file:
-            for line in paths_file:
-                nodes = [int(x) for x in line.split()]
-                paths[nodes[0]][nodes[-1]] = nodes[1:]
-        return paths
-
-    def _assign_flow_binary(
-        self, time: str, bin_no: int, demand: List[Dict[str, Union[float, EmmeNode]]]
-    ):
-        """Assign the demand along the paths generated from the shortest path tool.
 
-        The paths are read from a binary format file, see Emme help for details.
-        Demand is summed in self._network (in memory) using temp_flow attribute
-        and written to scenario (Emmebank / disk) @maz_flow.
+def load_path_flows(
+    file_path: str,
+    roots: NumpyArray,
+    leaves: NumpyArray,
+    demand: MazDemand,
+    link_lookup: LinkLookup = None,
+) -> Tuple[NumpyArray, Dict[str, float]]:
+    """Load the demand on the shortest paths in file_path to a dense link flow vector.
+
+    Runs in a worker process of AssignMAZSPDemand or in the main process.
+
+    Args:
+        file_path: shortest paths file, binary format if the extension is .ebp,
+            otherwise text format
+        roots: sorted root node numbers used in the shortest path
+        leaves: sorted leaf node numbers used in the shortest path
+        demand: MazDemand struct of arrays
+        link_lookup: LinkLookup for the network, defaults to the one set by the
+            worker process initializer
+
+    Returns:
+        The flow by link position and a dictionary of stats: number of O-D pairs,
+        assigned and not assigned demand, number of link hops and seconds taken
+    """
+    start_time = _time.perf_counter()
+    link_lookup = link_lookup or _worker_link_lookup
+    flow = np.zeros(link_lookup.num_links)
+    stats = dict(pairs=len(demand["dem"]), assigned=0.0, not_assigned=0.0, links=0)
+    if file_path.endswith(".ebp"):
+        path_file = BinaryPathFile(file_path, roots, leaves)
+    else:
+        path_file = TextPathFile(file_path)
+    with path_file:
+        for start in range(0, len(demand["dem"]), _PATH_BLOCK_SIZE):
+            block = slice(start, start + _PATH_BLOCK_SIZE)
+            dem = demand["dem"][block]
+            i_nodes, j_nodes, flows, found = path_file.link_hops(
+                demand["orig"][block], demand["dest"][block], dem
+            )
+            np.add.at(flow, link_lookup(i_nodes, j_nodes), flows)
+            stats["assigned"] += float(dem[found].sum())
+            stats["not_assigned"] += float(dem[~found].sum())
+            stats["links"] += len(flows)
+    stats["seconds"] = _time.perf_counter() - start_time
+    return flow, stats
+
+
+class LinkLookup:
+    """Vectorized lookup of link positions from (i_node, j_node) numbers.
+
+    The links are hashed as i_position * num_nodes + j_position, with the
+    node positions in the sorted node numbers, and the sorted hashes are
+    searched with np.searchsorted.
+    """
+
+    def __init__(self, link_index: Dict[int, Dict[int, int]]):
+        """Build the lookup from the LINK index of get_attribute_values.
 
         Args:
-            time: time period name
-            bin_no: bin number (id) for this demand segment
-            demand: list of dictionaries, containin the demand in the format
-                {"orig": EmmeNode, "dest": EmmeNode, "dem": float (demand value)}
+            link_index: nested dictionary of link i_node, j_node to position
         """
-        file_name = f"sp_{time}_{bin_no}.ebp"
-        with open(os.path.join(self.eb_dir, file_name), "rb") as paths_file:
-            # read set of path pointers by Orig-Dest sequence from file
-            offset, leaves_nb, path_indicies = self._get_path_indices(paths_file)
-            assigned = 0
-            not_assigned = 0
-            bytes_read = offset * 8
-            # for all orig-dest pairs with demand, load path from file
-            for data in demand:
-                # get file position based on orig-dest index
-                start, end = self._get_path_location(
-                    data["orig"].number, data["dest"].number, leaves_nb, path_indicies
-                )
-                # no path found, disconnected zone
-                if start == end:
-                    not_assigned += data["dem"]
-                    continue
-                paths_file.seek(start * 4 + offset * 8)
-                self._assign_path_flow(paths_file, start, end, data["dem"])
-                assigned += data["dem"]
-                bytes_read += (end - start) * 4
-        self.controller.emme_manager.copy_attribute_values(
-            self._network,
-            self._scenario,
-            {"LINK": ["temp_flow"]},
-            {"LINK": ["@maz_flow"]},
-        )
-        self.logger.log(
-            f"ASSIGN bin {bin_no}, total {len(demand)}, assign "
-            f"{assigned}, not assign {not_assigned}, bytes {bytes_read}",
-            level="DEBUG",
-        )
+        i_nodes = [i for i, out_links in link_index.items() for _ in out_links]
+        j_nodes = [j for out_links in link_index.values() for j in out_links]
+        positions = [p for out_links in link_index.values() for p in out_links.values()]
+        self.num_links = len(positions)
+        self._nodes = np.unique(np.array(i_nodes + j_nodes, dtype=np.int64))
+        keys = self._hash(np.array(i_nodes), np.array(j_nodes))
+        order = np.argsort(keys)
+        self._keys = keys[order]
+        self._positions = np.array(positions, dtype=np.int64)[order]
+
+    def _hash(self, i_nodes: NumpyArray, j_nodes: NumpyArray) -> NumpyArray:
+        num_nodes = len(self._nodes)
+        i_pos = np.searchsorted(self._nodes, i_nodes).clip(max=num_nodes - 1)
+        j_pos = np.searchsorted(self._nodes, j_nodes).clip(max=num_nodes - 1)
+        keys = i_pos.astype(np.int64) * num_nodes + j_pos
+        # node numbers not in the network do not hash to a link
+        keys[(self._nodes[i_pos] != i_nodes) | (self._nodes[j_pos] != j_nodes)] = -1
+        return keys
+
+    def __call__(self, i_nodes: NumpyArray, j_nodes: NumpyArray) -> NumpyArray:
+        """Return the link positions for arrays of i_node and j_node numbers.
+
+        Raises:
+            KeyError: if any of the (i_node, j_node) pairs is not a link
+        """
+        if len(self._keys) == 0:
+            if len(i_nodes):
+                raise KeyError(f"link {i_nodes[0]}-{j_nodes[0]} not found")
+            return np.zeros(0, dtype=np.int64)
+        keys = self._hash(np.asarray(i_nodes), np.asarray(j_nodes))
+        index = np.searchsorted(self._keys, keys).clip(max=len(self._keys) - 1)
+        missing = self._keys[index] != keys
+        if missing.any():
+            first = np.flatnonzero(missing)[0]
+            raise KeyError(f"link {i_nodes[first]}-{j_nodes[first]} not found")
+        return self._positions[index]
+
+
+class PathFile(ABC):
+    """Shortest paths file from the Emme shortest path tool as node number arrays.
+
+    Subclasses set self._nodes, the node numbers of all of the paths, and
+    implement path_bounds, the slice of self._nodes for each O-D path.
+    Use as a context manager, the file is closed on exit.
+    """
 
-    @staticmethod
-    def _get_path_indices(paths_file: BinaryIO) -> [int, int, _array.array]:
-        """Get the path header indices.
+    _nodes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the path node numbers."""
+        self._nodes = None
 
-        See the Emme Shortest path tool doc for additional details on reading
-        this file.
+    @abstractmethod
+    def path_bounds(
+        self, orig: NumpyArray, dest: NumpyArray
+    ) -> Tuple[NumpyArray, NumpyArray]:
+        """Start and end index in the path node numbers of each O-D path.
 
         Args:
-            paths_file: binary file access to the generated paths file
+            orig: origin (root) node numbers
+            dest: destination (leaf) node numbers
 
         Returns:
-            2 ints + array of ints: offset, leafs_nb, path_indicies
-            offset: starting index to read the paths
-            leafs_nb: number of leafs in the shortest path file
-            path_indicies: array of the start index for each root, leaf path in paths_file.
+            Start and end arrays, start == end if there is no path
         """
-        # read first 4 integers from file (Q=64-bit unsigned integers)
-        header = _array.array("Q")
-        header.fromfile(paths_file, 4)
-        roots_nb, leaves_nb = header[2:4]
-        # Load sequence of path indices (positions by orig-dest index),
-        # pointing to list of path node IDs in file
-        path_indicies = _array.array("Q")
-        path_indicies.fromfile(paths_file, roots_nb * leaves_nb + 1)
-        offset = roots_nb * leaves_nb + 1 + 4
-        return offset, leaves_nb, path_indicies
-
-    def _get_path_location(
-        self,
-        orig: EmmeNode,
-        dest: EmmeNode,
-        leaves_nb: int,
-        path_indicies: _array.array,
-    ) -> [int, int]:
-        """Get the location in the paths_file to read.
+
+    def link_hops(
+        self, orig: NumpyArray, dest: NumpyArray, values: NumpyArray
+    ) -> Tuple[NumpyArray, NumpyArray, NumpyArray, NumpyArray]:
+        """Links used by the paths for the O-D pairs with the O-D value by link.
 
         Args:
-            orig: Emme Node object, origin MAZ to query the path
-            dest: Emme Node object, destination MAZ to query the path
-            leaves_nb: number of leaves
-            path_indicies: array of the start index for each root, leaf path in paths_file.
+            orig: origin (root) node numbers
+            dest: destination (leaf) node numbers
+            values: value for each O-D pair, e.g. demand
 
         Returns:
-            Two integers, start, end
-            start: starting index to read Node ID bytes from paths_file
-            end: ending index to read bytes from paths_file
+            Arrays of i_node, j_node and value for each link on all of the
+            paths, and the boolean array of which O-D pairs have a path
         """
-        p_index = self._root_index[orig]
-        q_index = self._leaf_index[dest]
-        index = p_index * leaves_nb + q_index
-        start = path_indicies[index]
-        end = path_indicies[index + 1]
+        start, end = self.path_bounds(orig, dest)
+        num_links = np.maximum(end - start - 1, 0)
+        hops = np.repeat(start - np.cumsum(num_links) + num_links, num_links)
+        hops += np.arange(len(hops))
+        i_nodes = self._nodes[hops].astype(np.int64)
+        j_nodes = self._nodes[hops + 1].astype(np.int64)
+        return i_nodes, j_nodes, np.repeat(values, num_links), end > start
+
+
+class BinaryPathFile(PathFile):
+    """Memory-mapped reader for the Emme shortest path tool binary paths file.
+
+    The file has a header of 4 64-bit unsigned integers, the last two are the
+    number of roots and leaves, followed by the roots * leaves + 1 path
+    start indices in root, leaf order, followed by the path node numbers as
+    32-bit unsigned integers. The path from root p to leaf q is the node
+    numbers from path_index[p * leaves + q] to path_index[p * leaves + q + 1].
+    The roots and leaves are in node number order.
+    """
+
+    def __init__(self, file_path: str, roots: NumpyArray, leaves: NumpyArray):
+        """Memory-map the paths file and read the header.
+
+        Args:
+            file_path: path to the .ebp paths file
+            roots: sorted root node numbers used in the shortest path
+            leaves: sorted leaf node numbers used in the shortest path
+        """
+        self._roots = np.asarray(roots)
+        self._leaves = np.asarray(leaves)
+        with open(file_path, "rb") as paths_file:
+            self._mmap = _mmap.mmap(paths_file.fileno(), 0, access=_mmap.ACCESS_READ)
+        header = np.frombuffer(self._mmap, dtype=np.uint64, count=4)
+        roots_nb, leaves_nb = int(header[2]), int(header[3])
+        if (roots_nb, leaves_nb) != (len(self._roots), len(self._leaves)):
+            self.close()
+            raise ValueError(
+                f"{file_path} has {roots_nb} roots and {leaves_nb} leaves, "
+                f"expected {len(roots)} and {len(leaves)}"
+            )
+        self._path_index = np.frombuffer(
+            self._mmap, dtype=np.uint64, count=roots_nb * leaves_nb + 1, offset=32
+        )
+        self._nodes = np.frombuffer(
+            self._mmap,
+            dtype=np.uint32,
+            count=int(self._path_index[-1]),
+            offset=(roots_nb * leaves_nb + 1 + 4) * 8,
+        )
+
+    def close(self):
+        """Release the arrays which reference the file and close the memory map."""
+        self._path_index = None
+        self._nodes = None
+        self._mmap.close()
+
+    def path_bounds(
+        self, orig: NumpyArray, dest: NumpyArray
+    ) -> Tuple[NumpyArray, NumpyArray]:
+        """Start and end index in the path node numbers of each O-D path."""
+        index = np.searchsorted(self._roots, orig) * len(self._leaves)
+        index += np.searchsorted(self._leaves, dest)
+        start = self._path_index[index].astype(np.int64)
+        end = self._path_index[index + 1].astype(np.int64)
         return start, end
 
-    def _assign_path_flow(
-        self, paths_file: BinaryIO, start: int, end: int, demand: float
-    ):
-        """Add demand to link temp_flow for the path.
+
+class TextPathFile(PathFile):
+    """Reader for the Emme shortest path tool text paths file.
+
+    Each line is a path as the sequence of node numbers from root to leaf.
+    The paths are indexed by (root, leaf), the last path is used if repeated.
+    """
+
+    def __init__(self, file_path: str):
+        """Read all paths from the text file.
 
         Args:
-            paths_file: binary file access to read path from
-            start: starting index to read Node ID bytes from paths_file
-            end: ending index to read bytes from paths_file
-            demand: flow demand to add on link
+            file_path: path to the .txt paths file
         """
-        # load sequence of Node IDs which define the path (L=32-bit unsigned integers)
-        path = _array.array("L")
-        path.fromfile(paths_file, end - start)
-        # process path to sequence of links and add flow
-        path_iter = iter(path)
-        i_node = next(path_iter)
-        for j_node in path_iter:
-            link = self._network.link(i_node, j_node)
-            link["temp_flow"] += demand
-            i_node = j_node
+        with open(file_path, "r", encoding="utf8") as paths_file:
+            paths = [line.split() for line in paths_file if line.strip()]
+        lengths = np.array([len(path) for path in paths], dtype=np.int64)
+        self._nodes = np.array(
+            [node for path in paths for node in path], dtype=np.int64
+        )
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        keys = self._od_keys(self._nodes[starts], self._nodes[ends - 1])
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._starts = starts[order]
+        self._ends = ends[order]
+
+    @staticmethod
+    def _od_keys(orig: NumpyArray, dest: NumpyArray) -> NumpyArray:
+        orig = np.asarray(orig, dtype=np.int64)
+        return (orig << 32) | np.asarray(dest, dtype=np.int64)
+
+    def path_bounds(
+        self, orig: NumpyArray, dest: NumpyArray
+    ) -> Tuple[NumpyArray, NumpyArray]:
+        """Start and end index in the path node numbers of each O-D path."""
+        keys = self._od_keys(orig, dest)
+        if len(self._keys) == 0:
+            no_paths = np.zeros(len(keys), dtype=np.int64)
+            return no_paths, no_paths
+        index = (np.searchsorted(self._keys, keys, side="right") - 1).clip(min=0)
+        found = self._keys[index] == keys
+        start = np.where(found, self._starts[index], 0)
+        end = np.where(found, self._ends[index], 0)
+        return start, end
+
+
+def distance_bins_by_origin(
+    origins: NumpyArray, distances: NumpyArray, bin_edges: List[float]
+) -> NumpyArray:
+    """Distance bin of each O-D pair by the furthest destination from its origin.
+
+    All pairs from the same origin are in the same bin, the first bin (from 0)
+    with upper edge above the distance to the furthest destination from the
+    origin, the last bin also includes its upper edge.
+
+    Args:
+        origins: origin ID of each O-D pair
+        distances: distance of each O-D pair
+        bin_edges: bin edges, starting with the lower edge of the first bin
+
+    Returns:
+        Array of the bin number of each O-D pair.
+    """
+    unique_origins, origin_index = np.unique(origins, return_inverse=True)
+    max_dist = np.zeros(len(unique_origins))
+    np.maximum.at(max_dist, origin_index, distances)
+    origin_bins = np.digitize(max_dist, bin_edges[1:])
+    origin_bins = np.minimum(origin_bins, len(bin_edges) - 2)
+    return origin_bins[origin_index]
 
 
 class SkimMAZCosts(Component):
@@ -737,12 +979,34 @@ class SkimMAZCosts(Component):
             counties.extend(group.counties)
         with self._setup():
             self._prepare_network()
+            cache, cache_key, link_cost = None, None, None
+            if self.config.skim_cache_dir is not None:
+                cache = MazSkimCache(
+                    self.get_abs_path(self.config.skim_cache_dir),
+                    self.config.skim_cache_max_cost_change,
+                )
+                cache_key, link_cost = self._cache_key(counties)
+                results = cache.load(cache_key, link_cost)
+                if results is not None:
+                    self.logger.log(
+                        f"MAZ skims loaded from cache {cache_key}", level="DETAIL"
+                    )
+                    self._write_results(pd.DataFrame(results))
+                    return
+            county_results = []
             for county in counties:
                 num_roots = self._mark_roots(county)
                 if num_roots == 0:
                     continue
                 sp_values = self._run_shortest_path()
-                self._export_results(sp_values)
+                county_results.append(self._export_results(sp_values))
+            if cache is not None and county_results:
+                results = pd.concat(county_results)
+                cache.save(
+                    cache_key,
+                    link_cost,
+                    dict((name, results[name].to_numpy()) for name in results),
+                )
 
     @_context
     def _setup(self):
@@ -751,6 +1015,8 @@ class SkimMAZCosts(Component):
             ("LINK", "@link_cost", "total cost MAZ-MAZ"),
             ("NODE", "@maz_root", "selected roots (origins)"),
         ]
+        if self.config.skim_cache_dir is not None:
+            attributes.append(("LINK", "@link_mode_maz", "MAZ-MAZ mode flag"))
         with self.controller.emme_manager.temp_attributes_and_restore(
             self.scenario, attributes
         ):
@@ -762,8 +1028,8 @@ class SkimMAZCosts(Component):
     @LogStartEnd(level="DEBUG")
     def _prepare_network(self):
         """Calculates the link cost in @link_cost and loads the network to self._network."""
-        net_calc = NetworkCalculator(self.controller.emme_manager, self._scenario)
-        if self._scenario.has_traffic_results:
+        net_calc = NetworkCalculator(self.controller.emme_manager, self.scenario)
+        if self.scenario.has_traffic_results:
             time_attr = "(@free_flow_time.max.timau)"
         else:
             time_attr = "@free_flow_time"
@@ -771,10 +1037,50 @@ class SkimMAZCosts(Component):
         vot = self.config.value_of_time
         op_cost = self.config.operating_cost_per_mile
         net_calc("@link_cost", f"{time_attr} + 0.6 / {vot} * (length * {op_cost})")
+        if self.config.skim_cache_dir is not None:
+            net_calc("@link_mode_maz", "1", f"modes={self.config.mode_code}")
         self._network = self.controller.emme_manager.get_network(
             self.scenario, {"NODE": ["@maz_id", "#node_county"]}
         )
 
+    def _cache_key(self, counties: List[str]) -> Tuple[str, NumpyArray]:
+        """Skim cache key and the link costs to compare with the cached link costs.
+
+        The key is the hash of the network links, MAZ-MAZ mode, link lengths and
+        bridge tolls, the MAZ roots by county, the leaves and the shortest
+        path parameters, i.e. everything except the link costs which affects
+        the skim results.
+
+        Args:
+            counties: list of county names, in order of the skims
+
+        Returns:
+            The cache key and @link_cost by link
+        """
+        attrs = ["@link_cost", "@link_mode_maz", "length", "@bridgetoll_da"]
+        link_index, links = get_attribute_arrays(self.scenario, "LINK", attrs)
+        link_ids = [(i, j) for i, out_links in link_index.items() for j in out_links]
+        mazs = sorted(
+            (node.number, node["@maz_id"], node["#node_county"])
+            for node in self._network.nodes()
+            if node["@maz_id"] > 0
+        )
+        roots = [
+            [maz_id for _, maz_id, name in mazs if name == county]
+            for county in counties
+        ]
+        key = MazSkimCache.key(
+            np.array(link_ids),
+            links["@link_mode_maz"],
+            links["length"],
+            links["@bridgetoll_da"],
+            np.array([(number, maz_id) for number, maz_id, _ in mazs]),
+            *[np.array(county_roots) for county_roots in roots],
+            mode_code=self.config.mode_code,
+            max_skim_cost=float(self.config.max_skim_cost),
+        )
+        return key, links["@link_cost"]
+
     def _mark_roots(self, county: str) -> int:
         """Mark the available roots in the county."""
         count_roots = 0
@@ -851,14 +1157,18 @@ class SkimMAZCosts(Component):
         sp_values = shortest_paths_tool(spec, self.scenario)
         return sp_values
 
-    def _export_results(self, sp_values: Dict[str, NumpyArray]):
+    def _export_results(self, sp_values: Dict[str, NumpyArray]) -> pd.DataFrame:
         """Write matrix skims to CSV.
 
         The matrices are filtered to omit rows for which the COST is
         < 0 or > 1e19 (Emme uses 1e20 to indicate inaccessible zone pairs).
 
-        sp_values: dictionary of matrix costs, with the three keys
-            "COST", "DISTANCE", and "BRIDGETOLL" and Numpy arrays of values
+        Args:
+            sp_values: dictionary of matrix costs, with the three keys
+                "COST", "DISTANCE", and "BRIDGETOLL" and Numpy arrays of values
+
+        Returns:
+            The skim values written, FROM_ZONE, TO_ZONE, COST, DISTANCE, BRIDGETOLL
         """
         # get list of MAZ IDS
         roots = [
@@ -879,8 +1189,90 @@ class SkimMAZCosts(Component):
         )
         # drop 0's / 1e20
         result_df = result_df.query("COST > 0 & COST < 1e19")
+        self._write_results(result_df)
+        return result_df
+
+    def _write_results(self, result_df: pd.DataFrame):
+        """Append skim values to the output CSV file."""
         # write remaining values to text file
         # FROM_ZONE,TO_ZONE,COST,DISTANCE,BRIDGETOLL
         output = self.get_abs_path(self.config.output_skim_file)
         with open(output, "a", newline="", encoding="utf8") as output_file:
             result_df.to_csv(output_file, header=False, index=False)
+
+
+class MazSkimCache:
+    """Content-addressed store on disk of the MAZ-to-MAZ shortest path skims.
+
+    Entries are .npz files in cache_dir named by a hash of the skim inputs
+    (see SkimMAZCosts._cache_key), with the link costs used for the skims.
+    An entry is used if the link costs have not changed by more than
+    max_cost_change on any link, 0 requires identical costs.
+    """
+
+    def __init__(self, cache_dir: str, max_cost_change: float = 0.0):
+        """Constructor for MazSkimCache.
+
+        Args:
+            cache_dir: directory for the cache files
+            max_cost_change: max absolute change in link cost to use an entry
+        """
+        self.cache_dir = cache_dir
+        self.max_cost_change = max_cost_change
+
+    @staticmethod
+    def key(*arrays: NumpyArray, **params) -> str:
+        """Hash of the arrays (values and shapes) and the keyword parameters."""
+        digest = hashlib.sha256()
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            digest.update(f"{array.dtype.str}{array.shape}".encode("utf8"))
+            digest.update(array.tobytes())
+        digest.update(repr(sorted(params.items())).encode("utf8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"maz_skims_{key}.npz")
+
+    def load(self, key: str, link_cost: NumpyArray) -> Optional[Dict[str, NumpyArray]]:
+        """Return the cached skims for key if link costs are within the threshold.
+
+        Args:
+            key: cache key
+            link_cost: current link costs
+
+        Returns:
+            Dictionary of column name to array of skim values, or None
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                cached_cost = data["link_cost"]
+                if cached_cost.shape != np.shape(link_cost):
+                    return None
+                cost_change = np.abs(cached_cost - link_cost)
+                if cost_change.size and cost_change.max() > self.max_cost_change:
+                    return None
+                return dict(
+                    (name, data[name]) for name in data.files if name != "link_cost"
+                )
+        except (OSError, ValueError, KeyError):
+            return None  # invalid cache, replaced after skims are run
+
+    def save(self, key: str, link_cost: NumpyArray, results: Dict[str, NumpyArray]):
+        """Write the skims and link costs to the cache entry for key.
+
+        Args:
+            key: cache key
+            link_cost: link costs used for the skims
+            results: dictionary of column name to array of skim values
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # write to temp file first so an interrupted run does not leave partial entry
+        temp_path = f"{path[:-4]}_tmp.npz"
+        with open(temp_path, "wb") as cache_file:
+            np.savez(cache_file, link_cost=link_cost, **results)
+        os.replace(temp_path, path)
@@ -48,17 +48,116 @@ The following attributes are calculated:
 
 import heapq as _heapq
 import os
-from typing import TYPE_CHECKING, Dict, List, Set
+from typing import TYPE_CHECKING, Collection, Dict, List, Set, Tuple
 
+import numpy as np
 import pandas as pd
 
 from tm2py.components.component import Component, FileFormatError
 from tm2py.emme.manager import EmmeNetwork, EmmeScenario
+from tm2py.emme.network import get_attribute_arrays, set_attribute_arrays
 from tm2py.logger import LogStartEnd
 
 if TYPE_CHECKING:
+    from tm2py.config import HighwayClassConfig
     from tm2py.controller import RunController
 
+NumpyArray = np.array
+
+
+def read_toll_table(file_path: str) -> pd.DataFrame:
+    """Read the toll reference file into a DataFrame indexed by fac_index.
+
+    The fac_index is the toll facility code tollbooth * 1000 + tollseg * 10 +
+    useclass, as calculated from the link attributes in calc_link_tolls.
+    """
+    toll_table = pd.read_csv(file_path, skipinitialspace=True)
+    toll_table.columns = toll_table.columns.str.strip()
+    toll_table = toll_table.set_index(toll_table["fac_index"].astype(int))
+    # the last row is used for a repeated fac_index
+    return toll_table[~toll_table.index.duplicated(keep="last")]
+
+
+def calc_link_tolls(
+    toll_table: pd.DataFrame,
+    links: Dict[str, NumpyArray],
+    time_period: str,
+    src_veh_groups: Collection[str],
+    dst_veh_groups: Collection[str],
+    valuetoll_start_tollbooth_code: int,
+) -> Tuple[Dict[str, NumpyArray], pd.Series]:
+    """Calculate the link bridge and value tolls from the toll table.
+
+    Links with 0 < @tollbooth < valuetoll_start_tollbooth_code have a bridge
+    toll of the table value and links with @tollbooth >=
+    valuetoll_start_tollbooth_code a value toll of the table value per mile,
+    both in cents. Links which are not tolled or not found in the table keep
+    their input toll values.
+
+    Args:
+        toll_table: tolls indexed by fac_index, from read_toll_table
+        links: link attribute arrays, "@tollbooth", "@tollseg", "@useclass",
+            "length" and the input "@bridgetoll_{dst_veh}" and
+            "@valuetoll_{dst_veh}" arrays
+        time_period: time period name, for the "toll{period}_{src_veh}" columns
+        src_veh_groups: vehicle group names used in the toll table columns
+        dst_veh_groups: corresponding vehicle group names in the toll attributes
+        valuetoll_start_tollbooth_code: first @tollbooth code of the value tolls
+
+    Returns:
+        Dictionary of toll attribute name to array of values, and a Series of the
+        number of links by fac_index not found in the toll table
+    """
+    tollbooth = links["@tollbooth"]
+    fac_index = (tollbooth * 1000 + links["@tollseg"] * 10 + links["@useclass"]).astype(
+        np.int64
+    )
+    is_bridge = (tollbooth > 0) & (tollbooth < valuetoll_start_tollbooth_code)
+    is_value = tollbooth >= valuetoll_start_tollbooth_code
+    is_tolled = is_bridge | is_value
+    row = toll_table.index.get_indexer(fac_index[is_tolled])
+    found = np.zeros(len(fac_index), dtype=bool)
+    found[is_tolled] = row >= 0
+    missing = pd.Series(fac_index[is_tolled & ~found]).value_counts(sort=False)
+    row = row[row >= 0]
+    tolls = {}
+    for src_veh, dst_veh in zip(src_veh_groups, dst_veh_groups):
+        column = toll_table[f"toll{time_period.lower()}_{src_veh}"]
+        toll = np.zeros(len(fac_index))
+        toll[found] = column.to_numpy(dtype=float)[row]
+        bridge_attr, value_attr = f"@bridgetoll_{dst_veh}", f"@valuetoll_{dst_veh}"
+        tolls[bridge_attr] = np.where(found & is_bridge, toll * 100, links[bridge_attr])
+        tolls[value_attr] = np.where(
+            found & is_value, toll * links["length"] * 100, links[value_attr]
+        )
+    return tolls, missing
+
+
+def calc_link_class_costs(
+    links: Dict[str, NumpyArray], classes: Collection["HighwayClassConfig"]
+) -> Dict[str, NumpyArray]:
+    """Calculate the per-class link costs, operating cost plus factored tolls.
+
+    Args:
+        links: link attribute arrays, "length" and the toll attributes of classes
+        classes: highway assignment classes, with operating_cost_per_mile, toll
+            (list of toll attributes) and optional toll_factor
+
+    Returns:
+        Dictionary of "@cost_{class name}" to array of values
+    """
+    costs = {}
+    for assign_class in classes:
+        toll_factor = assign_class.toll_factor
+        if toll_factor is None:
+            toll_factor = 1.0
+        toll_value = sum(links[toll_attr] for toll_attr in assign_class.toll)
+        costs[f"@cost_{assign_class.name.lower()}"] = (
+            links["length"] * assign_class.operating_cost_per_mile
+            + toll_value * toll_factor
+        )
+    return costs
+
 
 class PrepareNetwork(Component):
     """Highway network preparation."""
@@ -189,63 +288,32 @@ class PrepareNetwork(Component):
 
     def _set_tolls(self, network: EmmeNetwork, time_period: str):
         """Set the tolls in the network from the toll reference file."""
-        toll_index = self._get_toll_indices()
-        src_veh_groups = self.config.tolls.src_vehicle_group_names
+        toll_table = read_toll_table(self.get_abs_path(self.config.tolls.file_path))
         dst_veh_groups = self.config.tolls.dst_vehicle_group_names
-        valuetoll_start_tollbooth_code = (
-            self.config.tolls.valuetoll_start_tollbooth_code
+        toll_attrs = [
+            f"@{toll_type}toll_{dst_veh}"
+            for toll_type in ("bridge", "value")
+            for dst_veh in dst_veh_groups
+        ]
+        index, links = get_attribute_arrays(
+            network,
+            "LINK",
+            ["@tollbooth", "@tollseg", "@useclass", "length"] + toll_attrs,
         )
-        for link in network.links():
-            # set bridgetoll
-            if (
-                link["@tollbooth"] > 0
-                and link["@tollbooth"] < valuetoll_start_tollbooth_code
-            ):
-                index = int(
-                    link["@tollbooth"] * 1000
-                    + link["@tollseg"] * 10
-                    + link["@useclass"]
-                )
-                data_row = toll_index.get(index)
-                if data_row is None:
-                    self.logger.warn(
-                        f"set tolls failed index lookup {index}, link {link.id}",
-                        indent=True,
-                    )
-                    continue  # tolls will remain at zero
-                for src_veh, dst_veh in zip(src_veh_groups, dst_veh_groups):
-                    link[f"@bridgetoll_{dst_veh}"] = (
-                        float(data_row[f"toll{time_period.lower()}_{src_veh}"]) * 100
-                    )
-            # set valuetoll
-            elif link["@tollbooth"] >= valuetoll_start_tollbooth_code:
-                data_row = toll_index.get(index)
-                if data_row is None:
-                    self.logger.warn(
-                        f"set tolls failed index lookup {index}, link {link.id}",
-                        indent=True,
-                    )
-                    continue  # tolls will remain at zero
-                for src_veh, dst_veh in zip(src_veh_groups, dst_veh_groups):
-                    link[f"@valuetoll_{dst_veh}"] = (
-                        float(data_row[f"toll{time_period.lower()}_{src_veh}"])
-                        * link.length
-                        * 100
-                    )
-            else:
-                continue
-
-    def _get_toll_indices(self) -> Dict[int, Dict[str, str]]:
-        """Get the mapping of toll lookup table from the toll reference file."""
-        toll_file_path = self.get_abs_path(self.config.tolls.file_path)
-        self.logger.debug(f"toll_file_path {toll_file_path}", indent=True)
-        tolls = {}
-        with open(toll_file_path, "r", encoding="UTF8") as toll_file:
-            header = [h.strip() for h in next(toll_file).split(",")]
-            for line in toll_file:
-                data = dict(zip(header, line.split(",")))
-                tolls[int(data["fac_index"])] = data
-        return tolls
+        tolls, missing = calc_link_tolls(
+            toll_table,
+            links,
+            time_period,
+            self.config.tolls.src_vehicle_group_names,
+            dst_veh_groups,
+            self.config.tolls.valuetoll_start_tollbooth_code,
+        )
+        for fac_index, num_links in missing.items():
+            self.logger.warn(
+                f"set tolls failed index lookup {fac_index}, {num_links} links",
+                indent=True,
+            )  # tolls will remain at zero
+        set_attribute_arrays(network, "LINK", index, tolls)
 
     def _set_vdf_attributes(self, network: EmmeNetwork, time_period: str):
         """Set capacity, VDF and critical speed on links."""
@@ -373,34 +441,32 @@ class PrepareNetwork(Component):
         valuetoll_start_tollbooth_code = (
             self.config.tolls.valuetoll_start_tollbooth_code
         )
-        for link in network.links():
-            # distance in hov lanes / facilities
-            if 2 <= link["@useclass"] <= 3:
-                link["@hov_length"] = link.length
-            else:
-                link["@hov_length"] = 0
-            # distance on non-bridge toll facilities
-            if link["@tollbooth"] > valuetoll_start_tollbooth_code:
-                link["@toll_length"] = link.length
-            else:
-                link["@toll_length"] = 0
+        index, links = get_attribute_arrays(
+            network, "LINK", ["@useclass", "@tollbooth", "length"]
+        )
+        length = links["length"]
+        # distance in hov lanes / facilities
+        is_hov = (links["@useclass"] >= 2) & (links["@useclass"] <= 3)
+        # distance on non-bridge toll facilities
+        is_toll = links["@tollbooth"] > valuetoll_start_tollbooth_code
+        set_attribute_arrays(
+            network,
+            "LINK",
+            index,
+            {
+                "@hov_length": np.where(is_hov, length, 0.0),
+                "@toll_length": np.where(is_toll, length, 0.0),
+            },
+        )
 
     def _calc_link_class_costs(self, network: EmmeNetwork):
         """Calculate the per-class link cost from the tolls and operating costs."""
-        for assign_class in self.config.classes:
-            cost_attr = f"@cost_{assign_class.name.lower()}"
-            op_cost = assign_class["operating_cost_per_mile"]
-            toll_factor = assign_class.get("toll_factor")
-            if toll_factor is None:
-                toll_factor = 1.0
-            for link in network.links():
-                try:
-                    toll_value = sum(
-                        link[toll_attr] for toll_attr in assign_class["toll"]
-                    )
-                except:
-                    link
-                link[cost_attr] = link.length * op_cost + toll_value * toll_factor
+        toll_attrs = sorted(
+            set(attr for class_ in self.config.classes for attr in class_.toll)
+        )
+        index, links = get_attribute_arrays(network, "LINK", ["length"] + toll_attrs)
+        costs = calc_link_class_costs(links, self.config.classes)
+        set_attribute_arrays(network, "LINK", index, costs)
 
     def _calc_interchange_distance(self, network: EmmeNetwork):
         """
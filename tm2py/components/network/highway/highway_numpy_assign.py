@@ -0,0 +1,938 @@
+"""Reference static traffic assignment engine in NumPy / SciPy.
+
+Multi-class user equilibrium assignment with the (conjugate) Frank-Wolfe
+algorithm, used in place of the Emme SOLA traffic assignment tool for
+Emme-free subarea runs, profiling and regression tests.
+
+StaticTrafficAssignment runs on network arrays: link end nodes, volume delay
+functions (the Emme function expressions, see compile_emme_expression), and
+for each class the allowed links, link costs and demand. NumpyTrafficAssignment
+is a stand-in for the Emme SOLA tool: it is called with the same
+specification and scenario, reads the network, functions and demand through
+the Emme API and writes the same link volumes, auto times and skim matrices.
+The assignment can be warm started from the class link volumes of a previous
+assignment, adjusted for the change in demand.
+
+Differences to SOLA:
+    - the path analysis skims are summed along the shortest paths at the final
+      link costs, not averaged over the paths used
+    - turn components and selected link analyses are not supported
+    - the demand is in PCE (as for SOLA), the background traffic is included
+      in volau and volad is zero (no transit vehicles)
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time as _time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+NumpyArray = np.array
+
+# value for unreachable O-D pairs, as in Emme
+UNREACHABLE = 1e20
+_ORIGIN_BLOCK_SIZE = 16
+_LINE_SEARCH_STEPS = 24
+# max. conjugate weight of the previous direction in conjugate Frank-Wolfe
+_MAX_CONJUGATE_WEIGHT = 0.99
+
+_TOKENS = re.compile(
+    r"\s*(?:"
+    r"(?P<op>\.(?:min|max|gt|lt|ge|le|eq|ne|and|or|mod)\.|\*\*|[-+*/^(),])"
+    r"|(?P<num>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>@?[A-Za-z_]\w*)"
+    r")"
+)
+# binding power of the Emme expression binary operators
+_BINARY_OPERATORS = {
+    ".or.": (1, "np.logical_or({0}, {1})"),
+    ".and.": (2, "np.logical_and({0}, {1})"),
+    ".gt.": (3, "(({0}) > ({1}))"),
+    ".lt.": (3, "(({0}) < ({1}))"),
+    ".ge.": (3, "(({0}) >= ({1}))"),
+    ".le.": (3, "(({0}) <= ({1}))"),
+    ".eq.": (3, "(({0}) == ({1}))"),
+    ".ne.": (3, "(({0}) != ({1}))"),
+    "+": (4, "({0} + {1})"),
+    "-": (4, "({0} - {1})"),
+    "*": (5, "({0} * {1})"),
+    "/": (5, "({0} / {1})"),
+    ".mod.": (5, "np.mod({0}, {1})"),
+    ".min.": (6, "np.minimum({0}, {1})"),
+    ".max.": (6, "np.maximum({0}, {1})"),
+    "**": (8, "({0} ** {1})"),
+    "^": (8, "({0} ** {1})"),
+}
+_UNARY_BINDING_POWER = 7
+_FUNCTIONS = {
+    "sqrt": "np.sqrt",
+    "exp": "np.exp",
+    "log": "np.log",
+    "log10": "np.log10",
+    "abs": "np.abs",
+    "int": "np.trunc",
+    "min": "np.minimum",
+    "max": "np.maximum",
+}
+# Emme network calculator names for link attributes in the network API
+EMME_LINK_ATTRIBUTES = {
+    "ul1": "data1",
+    "ul2": "data2",
+    "ul3": "data3",
+    "lanes": "num_lanes",
+    "vdf": "volume_delay_func",
+}
+
+
+def _variable_name(name: str) -> str:
+    return f"_at_{name[1:]}" if name.startswith("@") else name
+
+
+class _ExpressionParser:
+    """Pratt parser from Emme expression tokens to a Python / NumPy expression."""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = _TOKENS.match(expression, position)
+            if match is None or match.end() == position:
+                raise ValueError(f"invalid expression at {position}: {self.expression}")
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        self.position = 0
+        self.names = set()
+        self._num_puts = 0
+
+    def _next(self) -> Tuple[str, str]:
+        if self.position >= len(self.tokens):
+            raise ValueError(f"unexpected end of expression: {self.expression}")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _peek(self) -> Tuple[str, str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def _expect(self, value: str):
+        if self._next()[1] != value:
+            raise ValueError(f"expected '{value}' in expression: {self.expression}")
+
+    def parse(self) -> str:
+        source = self._parse(0)
+        if self.position != len(self.tokens):
+            raise ValueError(f"unexpected '{self._peek()[1]}' in {self.expression}")
+        return source
+
+    def _parse(self, binding_power: int) -> str:
+        kind, value = self._next()
+        if kind == "num":
+            left = value
+        elif kind == "name":
+            left = self._name(value)
+        elif value == "(":
+            left = f"({self._parse(0)})"
+            self._expect(")")
+        elif value in "-+":
+            left = f"({value}{self._parse(_UNARY_BINDING_POWER)})"
+        else:
+            raise ValueError(f"unexpected '{value}' in expression: {self.expression}")
+        while True:
+            kind, value = self._peek()
+            if kind != "op" or value not in _BINARY_OPERATORS:
+                return left
+            power, template = _BINARY_OPERATORS[value]
+            if power <= binding_power:
+                return left
+            self.position += 1
+            # ** and ^ are right associative
+            right = self._parse(power - 1 if power == 8 else power)
+            left = template.format(left, right)
+
+    def _name(self, name: str) -> str:
+        if self._peek()[1] != "(":
+            self.names.add(name)
+            return _variable_name(name)
+        self.position += 1
+        args = [self._parse(0)]
+        while self._peek()[1] == ",":
+            self.position += 1
+            args.append(self._parse(0))
+        self._expect(")")
+        if name == "put":
+            self._num_puts += 1
+            return f"(_register_{self._num_puts} := {args[0]})"
+        if name == "get":
+            return f"_register_{int(float(args[0]))}"
+        if name not in _FUNCTIONS:
+            raise ValueError(f"unsupported function {name} in {self.expression}")
+        return f"{_FUNCTIONS[name]}({', '.join(args)})"
+
+
+def compile_emme_expression(expression: str) -> Tuple[Callable, List[str]]:
+    """Compile an Emme function expression into a function of NumPy arrays.
+
+    Supports the network calculator arithmetic, the .min., .max., comparison,
+    .and., .or. and .mod. operators, put() and get(), and the common math
+    functions.
+
+    Example::
+        func, names = compile_emme_expression("el1 * (1 + (volau / el2) .min. 2)")
+        times = func(el1=free_flow_time, volau=volume, el2=capacity)
+
+    Args:
+        expression: Emme expression, e.g. a volume delay function with the el1,
+            el2, ... parameters replaced by the link attribute names
+
+    Returns:
+        The function, with the expression names (link attributes) as keyword
+        arguments, and the list of these names
+    """
+    parser = _ExpressionParser(expression)
+    code = compile(parser.parse(), f"<{expression}>", "eval")
+
+    def evaluate(**values):
+        namespace = {_variable_name(name): value for name, value in values.items()}
+        return eval(code, {"np": np, "__builtins__": {}}, namespace)
+
+    return evaluate, sorted(parser.names)
+
+
+class VolumeDelayFunctions:
+    """Link travel times from the Emme volume delay function expressions."""
+
+    def __init__(
+        self,
+        functions: Dict[int, str],
+        vdf: NumpyArray,
+        link_values: Dict[str, NumpyArray],
+    ):
+        """Constructor for VolumeDelayFunctions.
+
+        Args:
+            functions: expression by VDF number (e.g. 1 for fd1)
+            vdf: link VDF number
+            link_values: link attribute values used in the expressions, by the
+                name used in the expressions (e.g. "@capacity", "length", "ul1")
+        """
+        vdf = np.asarray(vdf).astype(int)
+        unknown = set(np.unique(vdf)) - set(functions)
+        if unknown:
+            raise ValueError(f"links with undefined VDFs: {sorted(unknown)}")
+        self._groups = []
+        for number in np.unique(vdf):
+            links = np.flatnonzero(vdf == number)
+            func, names = compile_emme_expression(functions[number])
+            values = {
+                name: np.asarray(link_values[name], dtype=float)[links]
+                for name in names
+                if name not in ("volau", "volad")
+            }
+            self._groups.append((links, func, names, values))
+        self.num_links = len(vdf)
+
+    def __call__(self, volau: NumpyArray, volad: NumpyArray = None) -> NumpyArray:
+        """Link travel times for the volumes.
+
+        Args:
+            volau: link auto volume
+            volad: link additional volume, default zero
+        """
+        if volad is None:
+            volad = np.zeros(self.num_links)
+        times = np.empty(self.num_links)
+        for links, func, names, values in self._groups:
+            kwargs = dict(values)
+            if "volau" in names:
+                kwargs["volau"] = volau[links]
+            if "volad" in names:
+                kwargs["volad"] = volad[links]
+            times[links] = np.broadcast_to(func(**kwargs), links.shape)
+        return times
+
+    def derivative(self, volau: NumpyArray, volad: NumpyArray = None) -> NumpyArray:
+        """Numerical derivative of the link travel times by volume."""
+        step = 1e-4 * np.maximum(volau, 1.0)
+        lower = np.maximum(volau - step, 0.0)
+        upper = volau + step
+        return (self(upper, volad) - self(lower, volad)) / (upper - lower)
+
+
+class AssignmentGraph:
+    """Shortest path trees, all-or-nothing loading and skims on the link network.
+
+    Paths do not pass through the zones (centroids), which have no outgoing
+    links in the graph; a copy of each zone, node num_nodes + k for zones[k],
+    has the outgoing links of the zone and is used as the origin.
+    """
+
+    def __init__(
+        self,
+        i_nodes: NumpyArray,
+        j_nodes: NumpyArray,
+        num_nodes: int,
+        zones: NumpyArray,
+    ):
+        """Constructor for AssignmentGraph.
+
+        Args:
+            i_nodes: link from node position
+            j_nodes: link to node position
+            num_nodes: number of nodes
+            zones: node positions of the zones, in zone order
+        """
+        self.i_nodes = np.asarray(i_nodes, dtype=np.int64)
+        self.j_nodes = np.asarray(j_nodes, dtype=np.int64)
+        self.num_nodes = num_nodes
+        self.zones = np.asarray(zones, dtype=np.int64)
+        self.num_links = len(self.i_nodes)
+        zone_index = np.full(num_nodes, -1, dtype=np.int64)
+        zone_index[self.zones] = np.arange(len(self.zones))
+        # graph from node: the zone copy for the links from zones
+        self._from_nodes = np.where(
+            zone_index[self.i_nodes] >= 0,
+            num_nodes + zone_index[self.i_nodes],
+            self.i_nodes,
+        )
+        keys = self._from_nodes * num_nodes + self.j_nodes
+        self._key_order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._key_order]
+
+    def graph(self, costs: NumpyArray, allowed: NumpyArray = None) -> csr_matrix:
+        """CSR graph of the link costs, for the allowed links.
+
+        Args:
+            costs: link costs (> = 0)
+            allowed: boolean array of the links which can be used, default all
+        """
+        links = np.arange(self.num_links)
+        if allowed is not None:
+            links = links[np.asarray(allowed, dtype=bool)]
+        size = self.num_nodes + len(self.zones)
+        return csr_matrix(
+            (costs[links], (self._from_nodes[links], self.j_nodes[links])),
+            shape=(size, size),
+        )
+
+    def _tree_links(self, predecessors: NumpyArray) -> NumpyArray:
+        """Link index of the tree link to each node, -1 if none."""
+        in_tree = predecessors >= 0
+        in_tree[:, self.num_nodes :] = False
+        nodes = np.broadcast_to(np.arange(predecessors.shape[1]), predecessors.shape)
+        keys = predecessors[in_tree] * self.num_nodes + nodes[in_tree]
+        tree_links = np.full(predecessors.shape, -1, dtype=np.int64)
+        tree_links[in_tree] = self._key_order[np.searchsorted(self._sorted_keys, keys)]
+        return tree_links
+
+    @staticmethod
+    def _levels(predecessors: NumpyArray) -> List[Tuple[NumpyArray, NumpyArray]]:
+        """Tree nodes by depth (number of links from the origin), from depth 1.
+
+        The depth is calculated by pointer jumping, in log(max depth) steps.
+
+        Returns:
+            List of (row, node) index arrays by depth
+        """
+        rows = np.arange(predecessors.shape[0])[:, None]
+        ancestors = np.where(predecessors >= 0, predecessors, -1)
+        depth = (ancestors >= 0).astype(np.int64)
+        while True:
+            has_ancestor = ancestors >= 0
+            if not has_ancestor.any():
+                break
+            jump = np.where(has_ancestor, ancestors, 0)
+            depth = depth + np.where(has_ancestor, depth[rows, jump], 0)
+            ancestors = np.where(has_ancestor, ancestors[rows, jump], -1)
+        flat_depth = depth.ravel()
+        order = np.argsort(flat_depth, kind="stable")
+        bounds = np.searchsorted(flat_depth[order], np.arange(1, depth.max() + 2))
+        levels = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            row, node = np.divmod(order[start:end], depth.shape[1])
+            levels.append((row, node))
+        return levels
+
+    def assign(
+        self,
+        graph: csr_matrix,
+        origins: NumpyArray,
+        demand: NumpyArray,
+        link_values: Dict[str, NumpyArray] = None,
+    ) -> Tuple[NumpyArray, NumpyArray, Dict[str, NumpyArray]]:
+        """All-or-nothing assignment from a block of origins.
+
+        Args:
+            graph: CSR graph from the graph method
+            origins: zone indices of the origins
+            demand: demand from the origins to all zones, intrazonal is ignored
+            link_values: optional, link values to sum along the paths (skims)
+
+        Returns:
+            Link volumes, shortest path costs from the origins to all zones, and
+            the skims of the link_values, UNREACHABLE if there is no path
+        """
+        num_nodes = self.num_nodes
+        origins = np.asarray(origins)
+        rows = np.arange(len(origins))
+        costs, predecessors = dijkstra(
+            graph, indices=num_nodes + origins, return_predecessors=True
+        )
+        tree_links = self._tree_links(predecessors)
+        levels = self._levels(predecessors)
+        node_volumes = np.zeros(predecessors.shape)
+        demand = np.array(demand, dtype=float)
+        demand[rows, origins] = 0.0
+        node_volumes[:, self.zones] = demand
+        # accumulate the volumes from the leaves to the origins
+        for row, node in reversed(levels):
+            np.add.at(
+                node_volumes, (row, predecessors[row, node]), node_volumes[row, node]
+            )
+        in_tree = tree_links >= 0
+        link_volumes = np.bincount(
+            tree_links[in_tree],
+            weights=node_volumes[in_tree],
+            minlength=self.num_links,
+        )
+        zone_costs = costs[:, self.zones]
+        reachable = np.isfinite(zone_costs)
+        reachable[rows, origins] = True
+        zone_costs[rows, origins] = 0.0
+        skims = {}
+        for name, values in (link_values or {}).items():
+            node_values = np.zeros(predecessors.shape)
+            for row, node in levels:
+                node_values[row, node] = (
+                    node_values[row, predecessors[row, node]]
+                    + values[tree_links[row, node]]
+                )
+            skim = np.where(reachable, node_values[:, self.zones], UNREACHABLE)
+            skim[rows, origins] = 0.0
+            skims[name] = skim
+        zone_costs[~reachable] = UNREACHABLE
+        return link_volumes, zone_costs, skims
+
+
+class AssignmentClassData:
+    """Network and demand data for one assignment class."""
+
+    def __init__(
+        self,
+        name: str,
+        demand: NumpyArray,
+        allowed: NumpyArray = None,
+        link_costs: NumpyArray = None,
+        perception_factor: float = 0.0,
+        skim_values: Dict[str, NumpyArray] = None,
+    ):
+        """Constructor for AssignmentClassData.
+
+        Args:
+            name: class name
+            demand: zone to zone demand in PCE
+            allowed: boolean array of the links the class can use, default all
+            link_costs: link costs (e.g. tolls and operating costs), added to the
+                link times with the perception_factor in the generalized cost
+            perception_factor: factor to convert the link_costs to time
+            skim_values: link values to sum along the shortest paths, by skim name
+        """
+        self.name = name
+        self.demand = np.asarray(demand, dtype=float)
+        self.allowed = allowed
+        self.link_costs = link_costs
+        self.perception_factor = perception_factor
+        self.skim_values = skim_values or {}
+
+    def generalized_cost(self, times: NumpyArray) -> NumpyArray:
+        """Link generalized cost, the times plus the perceived link costs."""
+        if self.link_costs is None or not self.perception_factor:
+            return times
+        return times + self.perception_factor * self.link_costs
+
+
+class StaticTrafficAssignment:
+    """Multi-class user equilibrium assignment with conjugate Frank-Wolfe.
+
+    Each iteration all-or-nothing assigns the classes on the shortest paths at
+    the current generalized costs, in parallel threads across blocks of
+    origins. The conjugate Frank-Wolfe direction is combined from the
+    all-or-nothing volumes and the previous direction, and the step size found
+    by bisection on the derivative of the objective function.
+
+    Example::
+        assignment = StaticTrafficAssignment(graph, vdfs, classes, num_threads=4)
+        results = assignment.run(max_iterations=100, relative_gap=0.0005)
+    """
+
+    def __init__(
+        self,
+        graph: AssignmentGraph,
+        volume_delay: VolumeDelayFunctions,
+        classes: List[AssignmentClassData],
+        background_volumes: NumpyArray = None,
+        num_threads: int = 1,
+        conjugate: bool = True,
+        logger=None,
+    ):
+        """Constructor for StaticTrafficAssignment.
+
+        Args:
+            graph: the network graph
+            volume_delay: link travel time functions
+            classes: the assignment classes
+            background_volumes: link volumes which are not assigned, included
+                in volau (e.g. MAZ to MAZ flows), default zero
+            num_threads: number of threads for the shortest paths and loading
+            conjugate: use the conjugate Frank-Wolfe direction, if False the
+                Frank-Wolfe (all-or-nothing) direction is used
+            logger: optional logger for the iteration gaps
+        """
+        self.graph = graph
+        self.volume_delay = volume_delay
+        self.classes = classes
+        num_links = graph.num_links
+        if background_volumes is None:
+            background_volumes = np.zeros(num_links)
+        self.background_volumes = np.asarray(background_volumes, dtype=float)
+        self.num_threads = max(int(num_threads), 1)
+        self.conjugate = conjugate
+        self.logger = logger
+        self.iterations = []
+
+    def _log(self, text: str):
+        if self.logger is not None:
+            self.logger.log(text, level="DEBUG")
+
+    def _all_or_nothing(
+        self, times: NumpyArray, skims: bool = False, demand: NumpyArray = None
+    ) -> Tuple[NumpyArray, NumpyArray, List[Dict[str, NumpyArray]]]:
+        """All-or-nothing volumes, shortest path costs and skims by class.
+
+        The demand by class is the class demand, unless specified.
+        """
+        if demand is None:
+            demand = [class_data.demand for class_data in self.classes]
+        num_zones = len(self.graph.zones)
+        blocks = [
+            np.arange(start, min(start + _ORIGIN_BLOCK_SIZE, num_zones))
+            for start in range(0, num_zones, _ORIGIN_BLOCK_SIZE)
+        ]
+        volumes = np.zeros((len(self.classes), self.graph.num_links))
+        costs = np.zeros((len(self.classes), num_zones, num_zones))
+        class_skims = []
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            for index, class_data in enumerate(self.classes):
+                graph = self.graph.graph(
+                    class_data.generalized_cost(times), class_data.allowed
+                )
+                skim_values = class_data.skim_values if skims else None
+                results = executor.map(
+                    lambda origins: self.graph.assign(
+                        graph, origins, demand[index][origins], skim_values
+                    ),
+                    blocks,
+                )
+                skim_blocks = []
+                for origins, (link_volumes, zone_costs, skim) in zip(blocks, results):
+                    volumes[index] += link_volumes
+                    costs[index, origins] = zone_costs
+                    skim_blocks.append(skim)
+                class_skims.append(
+                    {
+                        name: np.concatenate([skim[name] for skim in skim_blocks])
+                        for name in (skim_values or {})
+                    }
+                )
+        return volumes, costs, class_skims
+
+    def _perceived_costs(self) -> NumpyArray:
+        """Perceived link costs by class, the fixed part of the generalized cost."""
+        perceived = np.zeros((len(self.classes), self.graph.num_links))
+        for index, class_data in enumerate(self.classes):
+            if class_data.link_costs is not None:
+                perceived[index] = class_data.perception_factor * class_data.link_costs
+        return perceived
+
+    def _line_search(
+        self, volumes: NumpyArray, direction: NumpyArray, perceived: NumpyArray
+    ) -> float:
+        """Step size in [0, 1] which minimizes the objective along the direction."""
+        total_direction = direction.sum(axis=0)
+        volau = volumes.sum(axis=0) + self.background_volumes
+        fixed = float((perceived * direction).sum())
+
+        def derivative(step):
+            times = self.volume_delay(volau + step * total_direction)
+            return float(times @ total_direction) + fixed
+
+        if derivative(1.0) <= 0:
+            return 1.0
+        lower, upper = 0.0, 1.0
+        for _ in range(_LINE_SEARCH_STEPS):
+            step = 0.5 * (lower + upper)
+            if derivative(step) > 0:
+                upper = step
+            else:
+                lower = step
+        return 0.5 * (lower + upper)
+
+    def _conjugate_target(
+        self,
+        volumes: NumpyArray,
+        aon_volumes: NumpyArray,
+        prev_target: NumpyArray,
+    ) -> NumpyArray:
+        """Conjugate Frank-Wolfe target, combination of the AON and previous target."""
+        if prev_target is None:
+            return aon_volumes
+        volau = volumes.sum(axis=0) + self.background_volumes
+        hessian = self.volume_delay.derivative(volau)
+        prev_direction = (prev_target - volumes).sum(axis=0)
+        numerator = float(prev_direction @ (hessian * (aon_volumes - volumes).sum(0)))
+        denominator = float(
+            prev_direction @ (hessian * (aon_volumes - prev_target).sum(axis=0))
+        )
+        weight = 0.0
+        if denominator != 0:
+            weight = min(max(numerator / denominator, 0.0), _MAX_CONJUGATE_WEIGHT)
+        return weight * prev_target + (1 - weight) * aon_volumes
+
+    def warm_start(
+        self, prev_volumes: NumpyArray, prev_demand: NumpyArray
+    ) -> Union[NumpyArray, None]:
+        """Starting class link volumes from a previous assignment of other demand.
+
+        The change in demand is assigned all-or-nothing at the link times of
+        the previous volumes and added to the previous volumes, which keeps the
+        flow conservation for the current demand.
+
+        Args:
+            prev_volumes: link volumes by class from the previous assignment
+            prev_demand: demand by class of the previous assignment
+
+        Returns:
+            The link volumes by class, or None if the change in demand gives
+            negative link volumes (the previous volumes cannot be used)
+        """
+        times = self.volume_delay(prev_volumes.sum(axis=0) + self.background_volumes)
+        demand_change = [
+            class_data.demand - prev
+            for class_data, prev in zip(self.classes, prev_demand)
+        ]
+        if not any(change.any() for change in demand_change):
+            return np.array(prev_volumes, dtype=float)
+        change, _, _ = self._all_or_nothing(times, demand=demand_change)
+        volumes = prev_volumes + change
+        tolerance = 1e-6 * max(float(np.abs(prev_volumes).max()), 1.0)
+        if (volumes < -tolerance).any():
+            return None
+        return np.maximum(volumes, 0.0)
+
+    def run(
+        self,
+        max_iterations: int,
+        relative_gap: float = 0.0,
+        initial_volumes: NumpyArray = None,
+    ) -> Dict:
+        """Run the assignment to the max_iterations or relative_gap.
+
+        Args:
+            max_iterations: maximum number of iterations
+            relative_gap: stop when the relative gap is at or below this value
+            initial_volumes: optional, starting link volumes by class, e.g. from
+                warm_start, default is all-or-nothing at the free flow times
+
+        Returns:
+            Dictionary of results: "volumes" link volumes by class (array of
+            classes x links), "volau" total link volume, "times" link times,
+            "costs" shortest path generalized costs by class (classes x zones x
+            zones) and "skims" list by class of skim arrays by name
+        """
+        perceived = self._perceived_costs()
+        demand = np.stack([class_data.demand for class_data in self.classes])
+        if initial_volumes is None:
+            times = self.volume_delay(self.background_volumes)
+            volumes, _, _ = self._all_or_nothing(times)
+        else:
+            volumes = np.array(initial_volumes, dtype=float)
+        target = None
+        self.iterations = []
+        for iteration in range(1, max_iterations + 1):
+            start = _time.perf_counter()
+            times = self.volume_delay(volumes.sum(axis=0) + self.background_volumes)
+            aon_volumes, costs, _ = self._all_or_nothing(times)
+            total_cost = float(((times + perceived) * volumes).sum())
+            # demand without a path is not assigned
+            min_cost = float((demand * np.where(costs < UNREACHABLE, costs, 0.0)).sum())
+            gap = (total_cost - min_cost) / total_cost if total_cost > 0 else 0.0
+            if gap <= relative_gap:
+                seconds = _time.perf_counter() - start
+                self._log(f"iteration {iteration} relative gap {gap:.6f}, converged")
+                self.iterations.append(
+                    {
+                        "iteration": iteration,
+                        "gap": gap,
+                        "step": 0.0,
+                        "seconds": seconds,
+                    }
+                )
+                break
+            if self.conjugate:
+                target = self._conjugate_target(volumes, aon_volumes, target)
+            else:
+                target = aon_volumes
+            direction = target - volumes
+            step = self._line_search(volumes, direction, perceived)
+            volumes = volumes + step * direction
+            seconds = _time.perf_counter() - start
+            self._log(
+                f"iteration {iteration} relative gap {gap:.6f} step {step:.4f} "
+                f"({seconds:.2f} s)"
+            )
+            self.iterations.append(
+                {"iteration": iteration, "gap": gap, "step": step, "seconds": seconds}
+            )
+        volau = volumes.sum(axis=0) + self.background_volumes
+        times = self.volume_delay(volau)
+        _, costs, skims = self._all_or_nothing(times, skims=True)
+        return {
+            "volumes": volumes,
+            "volau": volau,
+            "times": times,
+            "costs": costs,
+            "skims": skims,
+        }
+
+
+class NumpyTrafficAssignment:
+    """Stand-in for the Emme SOLA traffic assignment tool.
+
+    Called with the same arguments as the SOLA tool, the SOLA specification
+    and the scenario, reads the network, volume delay functions and demand
+    through the Emme API, runs StaticTrafficAssignment and writes the class
+    link volumes, auto_volume, auto_time and the skim matrices (the
+    od_travel_times and path analyses od_values).
+
+    With a warm_start_path the class link volumes and demand are saved at the
+    end of the assignment, and the next assignment (of the same network and
+    classes) starts from them, see StaticTrafficAssignment.warm_start.
+    """
+
+    def __init__(
+        self, logger=None, conjugate: bool = True, warm_start_path: str = None
+    ):
+        """Constructor for NumpyTrafficAssignment.
+
+        Args:
+            logger: optional logger for the iteration gaps
+            conjugate: use conjugate Frank-Wolfe, see StaticTrafficAssignment
+            warm_start_path: optional, path to .npz file of the assignment state
+                used to start the assignment and replaced with the final state
+        """
+        self.logger = logger
+        self.conjugate = conjugate
+        self.warm_start_path = warm_start_path
+
+    def _load_state(
+        self, i_nodes: NumpyArray, j_nodes: NumpyArray, class_names: List[str]
+    ) -> Union[Tuple[NumpyArray, NumpyArray], Tuple[None, None]]:
+        """Saved class volumes and demand if for the same links and classes."""
+        if not self.warm_start_path or not os.path.exists(self.warm_start_path):
+            return None, None
+        with np.load(self.warm_start_path) as state:
+            if (
+                list(state["class_names"]) != class_names
+                or not np.array_equal(state["i_nodes"], i_nodes)
+                or not np.array_equal(state["j_nodes"], j_nodes)
+            ):
+                return None, None
+            return state["volumes"], state["demand"]
+
+    def _save_state(
+        self,
+        i_nodes: NumpyArray,
+        j_nodes: NumpyArray,
+        class_names: List[str],
+        volumes: NumpyArray,
+        demand: NumpyArray,
+    ):
+        os.makedirs(
+            os.path.dirname(os.path.abspath(self.warm_start_path)), exist_ok=True
+        )
+        # write to temp file first so an interrupted run does not leave partial state
+        temp_path = f"{self.warm_start_path[:-4]}_tmp.npz"
+        np.savez_compressed(
+            temp_path,
+            i_nodes=i_nodes,
+            j_nodes=j_nodes,
+            class_names=np.array(class_names),
+            volumes=volumes,
+            demand=demand,
+        )
+        os.replace(temp_path, self.warm_start_path)
+
+    @staticmethod
+    def _functions(emmebank) -> Dict[int, str]:
+        """Volume delay function expressions by number, el1 to el4 replaced."""
+        parameters = emmebank.extra_function_parameters
+        functions = {}
+        for function in emmebank.functions():
+            if function.type != "VOLUME_DELAY":
+                continue
+            expression = function.expression
+            for name in ["el1", "el2", "el3", "el4"]:
+                expression = expression.replace(name, getattr(parameters, name))
+            functions[int(function.id[2:])] = expression
+        return functions
+
+    @staticmethod
+    def _matrix_data(emmebank, name: str, scenario, num_zones: int) -> NumpyArray:
+        matrix = emmebank.matrix(name)
+        if matrix.type == "SCALAR":
+            return np.full((num_zones, num_zones), float(matrix.data))
+        return np.asarray(matrix.get_numpy_data(scenario.id), dtype=float)
+
+    def __call__(self, specification: Dict, scenario, chart_log_interval: int = None):
+        """Run the assignment on the scenario.
+
+        Args:
+            specification: Emme SOLA traffic assignment specification
+            scenario: Emme scenario
+            chart_log_interval: not used, for compatibility with the SOLA tool
+
+        Returns:
+            Report in the form of the SOLA report: "stopping_criterion" and
+            "iterations", list of "number", "gaps": {"relative": gap} and "time",
+            and "warm_start" True if started from the saved state
+        """
+        emmebank = scenario.emmebank
+        network = scenario.get_network()
+        functions = self._functions(emmebank)
+        classes = specification["classes"]
+        background = (specification.get("background_traffic") or {}).get(
+            "link_component"
+        )
+        names = set(["length"])
+        for expression in functions.values():
+            names.update(compile_emme_expression(expression)[1])
+        for class_spec in classes:
+            names.add(class_spec["generalized_cost"]["link_costs"])
+            for analysis in class_spec.get("path_analyses") or []:
+                names.add(analysis["link_component"])
+        if background:
+            names.add(background)
+        names -= {"volau", "volad"}
+
+        node_index = {}
+        for position, node in enumerate(network.nodes()):
+            node_index[node.number] = position
+        zones = np.array([node_index[n] for n in scenario.zone_numbers])
+        links = list(network.links())
+        i_numbers = np.array([link.i_node.number for link in links])
+        j_numbers = np.array([link.j_node.number for link in links])
+        i_nodes = np.array([node_index[n] for n in i_numbers.tolist()])
+        j_nodes = np.array([node_index[n] for n in j_numbers.tolist()])
+        link_values = {
+            name: np.array(
+                [link[EMME_LINK_ATTRIBUTES.get(name, name)] for link in links],
+                dtype=float,
+            )
+            for name in sorted(names)
+        }
+        link_modes = ["".join(mode.id for mode in link.modes) for link in links]
+        vdf = np.array([link.volume_delay_func for link in links])
+
+        graph = AssignmentGraph(i_nodes, j_nodes, len(node_index), zones)
+        volume_delay = VolumeDelayFunctions(functions, vdf, link_values)
+        class_data = []
+        for class_spec in classes:
+            cost_spec = class_spec["generalized_cost"]
+            skim_values = {}
+            for analysis in class_spec.get("path_analyses") or []:
+                skim_values[analysis["results"]["od_values"]] = link_values[
+                    analysis["link_component"]
+                ]
+            class_data.append(
+                AssignmentClassData(
+                    class_spec["results"]["link_volumes"],
+                    self._matrix_data(
+                        emmebank, class_spec["demand"], scenario, len(zones)
+                    ),
+                    np.array([class_spec["mode"] in modes for modes in link_modes]),
+                    link_values[cost_spec["link_costs"]],
+                    cost_spec["perception_factor"],
+                    skim_values,
+                )
+            )
+        criteria = specification["stopping_criteria"]
+        num_threads = specification.get("performance_settings", {}).get(
+            "number_of_processors", 1
+        )
+        assignment = StaticTrafficAssignment(
+            graph,
+            volume_delay,
+            class_data,
+            link_values[background] if background else None,
+            num_threads=num_threads,
+            conjugate=self.conjugate,
+            logger=self.logger,
+        )
+        class_names = [data.name for data in class_data]
+        prev_volumes, prev_demand = self._load_state(i_numbers, j_numbers, class_names)
+        initial_volumes = None
+        if prev_volumes is not None:
+            initial_volumes = assignment.warm_start(prev_volumes, prev_demand)
+        relative_gap = criteria.get("relative_gap") or 0.0
+        results = assignment.run(
+            criteria["max_iterations"], relative_gap, initial_volumes
+        )
+        if self.warm_start_path:
+            self._save_state(
+                i_numbers,
+                j_numbers,
+                class_names,
+                results["volumes"],
+                np.stack([data.demand for data in class_data]),
+            )
+
+        for index, class_spec in enumerate(classes):
+            volume_attr = class_spec["results"]["link_volumes"]
+            for link, volume in zip(links, results["volumes"][index].tolist()):
+                link[volume_attr] = volume
+            travel_times = class_spec["results"].get("od_travel_times") or {}
+            if travel_times.get("shortest_paths"):
+                emmebank.matrix(travel_times["shortest_paths"]).set_numpy_data(
+                    results["costs"][index], scenario.id
+                )
+            for name, skim in results["skims"][index].items():
+                emmebank.matrix(name).set_numpy_data(skim, scenario.id)
+        for link, volau, time in zip(
+            links, results["volau"].tolist(), results["times"].tolist()
+        ):
+            link.auto_volume = volau
+            link.auto_time = time
+        scenario.publish_network(network)
+        iterations = assignment.iterations
+        converged = bool(iterations) and iterations[-1]["gap"] <= relative_gap
+        return {
+            "stopping_criterion": "RELATIVE_GAP" if converged else "MAX_ITERATIONS",
+            "warm_start": initial_volumes is not None,
+            "iterations": [
+                {
+                    "number": item["iteration"],
+                    "gaps": {"relative": item["gap"]},
+                    "time": item["seconds"],
+                }
+                for item in iterations
+            ],
+        }
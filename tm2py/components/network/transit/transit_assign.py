@@ -7,6 +7,7 @@ import json as _json
 import os
 import textwrap
 import copy
+import numpy as np
 import pandas as pd
 from collections import defaultdict as _defaultdict
 from functools import partial
@@ -16,6 +17,13 @@ from tm2py import tools
 from tm2py.components.component import Component
 from tm2py.components.demand.prepare_demand import PrepareTransitDemand
 from tm2py.emme.manager import EmmeNetwork, EmmeScenario
+from tm2py.emme.network import (
+    NetworkSnapshotCache,
+    get_attribute_arrays,
+    set_attribute_arrays,
+    sum_by_line,
+    transit_tables,
+)
 from tm2py.logger import LogStartEnd
 from tm2py.components.network.transit.transit_network import PrepareTransitNetwork
 
@@ -398,6 +406,88 @@ EmmeTransitSpec = Dict[
 ]
 
 
+def calc_peaking_factor_headways(
+    time_period: str,
+    line_names: pd.Series,
+    headway: np.ndarray,
+    total_capacity: np.ndarray,
+    duration: float,
+    peaking_factor: float,
+    ea_df: pd.DataFrame = None,
+) -> np.ndarray:
+    """Line headways with the AM or PM peaking factor applied.
+
+    In Emme transit assignment the capacity is computed for each transit line as
+    60 * duration * vehicle.total_capacity / line.headway, so instead of applying
+    the peaking factor to the calculated capacity, the line headway is multiplied
+    by the peaking factor.
+
+    AM: the park-and-ride access lines capacity is reduced by the EA boardings
+    from ea_df (headway of 999 if the EA boardings exceed the capacity), pnr
+    egress lines are unchanged and the headway of other lines is multiplied by
+    the peaking_factor.
+    PM: the headway of the non-pnr lines is multiplied by the peaking_factor.
+
+    Args:
+        time_period: "am" or "pm" (case insensitive)
+        line_names: transit line IDs
+        headway: original line headways
+        total_capacity: line vehicle total capacity
+        duration: time period duration in hours
+        peaking_factor: am_peaking_factor or pm_peaking_factor
+        ea_df: EA boardings by line, with columns line_name_am and boardings
+            (the ea_pnr boardings file), required for the AM period
+
+    Returns:
+        Array of the new headways
+    """
+    line_names = line_names.astype(str)
+    is_pnr = line_names.str.contains("pnr", regex=False).to_numpy()
+    if time_period.lower() == "pm":
+        return np.where(is_pnr, headway, headway * peaking_factor)
+    # EA boardings by AM line name (first match), 0 if no EA line
+    ea_boardings = (
+        ea_df.drop_duplicates("line_name_am")
+        .set_index("line_name_am")["boardings"]
+        .reindex(line_names)
+        .fillna(0)
+        .to_numpy(dtype=float)
+    )
+    line_cap = 60 * duration * total_capacity / headway
+    # substract ea boardings from am parking capacity
+    pnr_peaking_factor = (line_cap - ea_boardings) / line_cap
+    # if ea number of parkers exceed the am parking capacity, set the headway
+    # to a very large number
+    pnr_line_hdw = np.where(
+        pnr_peaking_factor > 0,
+        headway / np.where(pnr_peaking_factor > 0, pnr_peaking_factor, 1),
+        999,
+    )
+    is_acc = line_names.str.contains("acc", regex=False).to_numpy()
+    is_egr = line_names.str.contains("egr", regex=False).to_numpy()
+    return np.select(
+        [is_pnr & is_egr, is_pnr & is_acc],
+        [headway, pnr_line_hdw],
+        headway * peaking_factor,
+    )
+
+
+# columns of boardings by type and class in the transit segment export,
+# from the segment attributes <prefix>_<class name>
+_SEGMENT_BOARDING_TYPES = {
+    "initial_board": "@iboard",
+    "direct_transfer_board": "@dboard",
+    "auxiliary_transfer_board": "@aboard",
+}
+_SEGMENT_BOARDING_CLASSES = {
+    "ptw": "pnr_trn_wlk",
+    "wtp": "wlk_trn_pnr",
+    "ktw": "knr_trn_wlk",
+    "wtk": "wlk_trn_knr",
+    "wtw": "wlk_trn_wlk",
+}
+
+
 class TransitAssignment(Component):
     """Run transit assignment."""
 
@@ -418,6 +508,7 @@ class TransitAssignment(Component):
         self._time_period = None
         self._scenario = None
         self._transit_emmebank = None
+        self._network_snapshots = {}
 
     def validate_inputs(self):
         """Validate the inputs."""
@@ -451,6 +542,21 @@ class TransitAssignment(Component):
             print("updating auto time in transit network")
             self.transit_network.update_auto_times(time_period)
 
+            use_peaking_factor = self.config.congested.apply_peaking_factor_headways
+            if use_peaking_factor and time_period.lower() == "am":
+                # AM pnr capacity is reduced by the EA boardings, if EA is run first
+                if os.path.isfile(self._ea_pnr_boardings_path):
+                    ea_df = pd.read_csv(self._ea_pnr_boardings_path)
+                else:
+                    self.logger.warn(
+                        f"{self._ea_pnr_boardings_path} not found, AM park-and-ride "
+                        "capacity is not reduced by the EA boardings"
+                    )
+                    ea_df = pd.DataFrame(columns=["line_name_am", "boardings"])
+                self._apply_peaking_factor(time_period, ea_df=ea_df)
+            elif use_peaking_factor and time_period.lower() == "pm":
+                self._apply_peaking_factor(time_period)
+
             if self.controller.iteration == 0:
                 # iteration = 0 : run uncongested transit assignment
                 use_ccr = False
@@ -480,6 +586,10 @@ class TransitAssignment(Component):
                     time_period, use_ccr, congested_transit_assignment
                 )
 
+            if use_peaking_factor and time_period.lower() == "ea":
+                # EA boardings by line for the AM peaking factor
+                self._apply_peaking_factor(time_period)
+
             # output_summaries
             if self.config.output_stop_usage_path is not None:
                 network, class_stop_attrs = self._calc_connector_flows(time_period)
@@ -493,6 +603,40 @@ class TransitAssignment(Component):
                     self._export_boardings_by_station(time_period)
                 if self.config.output_transfer_at_station_path is not None:
                     self._export_transfer_at_stops(time_period)
+            snapshot = self._network_snapshots.pop(time_period, None)
+            if snapshot is not None:
+                snapshot.clear()
+
+    def _network_snapshot(self, time_period: str) -> NetworkSnapshotCache:
+        """Shared network snapshot of the time period scenario for the exports.
+
+        The network domains used by the exports which run in this iteration are
+        loaded with the first request, so that the network is loaded once, e.g.
+        only NODE and LINK for the connector flows before the last iteration.
+
+        Args:
+            time_period: time period name abbreviation
+        """
+        if time_period not in self._network_snapshots:
+            domains = set()
+            if self.config.output_stop_usage_path is not None:
+                domains.update(["NODE", "LINK"])
+            if self.controller.iteration == self.controller.config.run.end_iteration:
+                if self.config.output_transit_boardings_path is not None:
+                    domains.update(["TRANSIT_LINE", "TRANSIT_SEGMENT"])
+                if self.config.output_transit_segment_path is not None:
+                    domains.update(["TRANSIT_LINE", "TRANSIT_SEGMENT"])
+                if self.config.output_station_to_station_flow_path is not None:
+                    domains.add("TRANSIT_LINE")
+                if self.config.output_transfer_at_station_path is not None:
+                    domains.add("NODE")
+            self._network_snapshots[time_period] = NetworkSnapshotCache(
+                self.controller.emme_manager,
+                self.transit_emmebank.scenario(time_period),
+                domains=sorted(domains),
+                logger=self.logger,
+            )
+        return self._network_snapshots[time_period]
 
     @LogStartEnd("Transit assignments for a time period")
     def run_transit_assign(
@@ -508,81 +652,94 @@ class TransitAssignment(Component):
     def _apply_peaking_factor(self, time_period: str, ea_df=None):
         """apply peaking factors.
 
+        AM and PM: the line headways are set from the original headways with
+        the peaking factor applied, see calc_peaking_factor_headways. The
+        original headway is saved in @orig_hdw, and is used as the original
+        headway in later global iterations so that the factors do not compound.
+        EA: the boardings by line are saved to the ea_pnr boardings file.
+
         Args:
             time_period: time period name abbreviation
+            ea_df: EA boardings by line, with columns line_name_am and boardings
+                (the ea_pnr boardings file), required for the AM period
         """
         _emme_scenario = self.transit_emmebank.scenario(time_period)
-        _network = _emme_scenario.get_network()
-        _duration = self.time_period_durations[time_period.lower()]
+        # network structure only, attribute values are read in bulk
+        _network = self.controller.emme_manager.get_network(
+            _emme_scenario, {"TRANSIT_LINE": [], "TRANSIT_SEGMENT": []}
+        )
 
-        if time_period.lower() == "am":
-            for line in _network.transit_lines():
-                line["@orig_hdw"] = line.headway
-                line_name = line.id
-                line_veh = line.vehicle
-                line_hdw = line.headway
-                line_cap = 60 * _duration * line_veh.total_capacity / line_hdw
-                if line_name in ea_df["line_name_am"].to_list():
-                    ea_boardings = ea_df.loc[
-                        ea_df["line_name_am"] == line_name, "boardings"
-                    ].values[0]
-                else:
-                    ea_boardings = 0
-                pnr_peaking_factor = (
-                    line_cap - ea_boardings
-                ) / line_cap  # substract ea boardings from am parking capacity
-                non_pnr_peaking_factor = self.config.congested.am_peaking_factor
-                # in Emme transit assignment, the capacity is computed for each transit line as: 60 * _duration * vehicle.total_capacity / line.headway
-                # so instead of applying peaking factor to calculated capacity, we can divide line.headway by this peaking factor
-                # if ea number of parkers exceed the am parking capacity, set the headway to a very large number
-                if pnr_peaking_factor > 0:
-                    pnr_line_hdw = line_hdw / pnr_peaking_factor
-                else:
-                    pnr_line_hdw = 999
-                non_pnr_line_hdw = line_hdw * non_pnr_peaking_factor
-                if ("pnr" in line_name) and ("egr" in line_name):
-                    continue
-                elif ("pnr" in line_name) and ("acc" in line_name):
-                    line.headway = pnr_line_hdw
-                else:
-                    line.headway = non_pnr_line_hdw
-
-        if time_period.lower() == "pm":
-            for line in _network.transit_lines():
-                line["@orig_hdw"] = line.headway
-                line_name = line.id
-                line_hdw = line.headway
-                non_pnr_peaking_factor = self.config.congested.pm_peaking_factor
-                non_pnr_line_hdw = line_hdw * non_pnr_peaking_factor
-                if "pnr" in line_name:
-                    continue
-                else:
-                    line.headway = non_pnr_line_hdw
+        if time_period.lower() in ["am", "pm"]:
+            lines, _ = transit_tables(
+                _emme_scenario, _network, ["headway", "@orig_hdw"], []
+            )
+            orig_hdw = lines["@orig_hdw"].to_numpy(dtype=float)
+            line_hdw = np.where(
+                orig_hdw > 0, orig_hdw, lines["headway"].to_numpy(dtype=float)
+            )
+            if time_period.lower() == "am":
+                peaking_factor = self.config.congested.am_peaking_factor
+            else:
+                peaking_factor = self.config.congested.pm_peaking_factor
+            headway = calc_peaking_factor_headways(
+                time_period,
+                lines["line_id"],
+                line_hdw,
+                lines["total_capacity"].to_numpy(dtype=float),
+                self.time_period_durations[time_period.lower()],
+                peaking_factor,
+                ea_df,
+            )
+            self._set_line_headways(_emme_scenario, lines, line_hdw, headway)
 
         if time_period.lower() == "ea":
-            line_name = []
-            boards = []
-            ea_pnr_df = pd.DataFrame()
-            for line in _network.transit_lines():
-                boardings = 0
-                for segment in line.segments(include_hidden=True):
-                    boardings += segment.transit_boardings
-                line_name.append(line.id)
-                boards.append(boardings)
-            ea_pnr_df["line_name"] = line_name
-            ea_pnr_df["boardings"] = boards
+            lines, segments = transit_tables(
+                _emme_scenario, _network, [], ["transit_boardings"]
+            )
+            ea_pnr_df = pd.DataFrame(
+                {
+                    "line_name": lines["line_id"],
+                    "boardings": sum_by_line(lines, segments["transit_boardings"]),
+                }
+            )
             ea_pnr_df["line_name_am"] = ea_pnr_df["line_name"].str.replace(
                 "EA", "AM"
             )  # will substract ea boardings from am parking capacity
-            path_boardings = self.get_abs_path(
-                self.config.output_transit_boardings_path
+            ea_pnr_df.to_csv(self._ea_pnr_boardings_path, index=False)
+
+    @property
+    def _ea_pnr_boardings_path(self) -> str:
+        """Path to the EA boardings by line used for the AM pnr peaking factor."""
+        if self.config.output_transit_boardings_path is None:
+            raise Exception(
+                "ERROR: transit.output_transit_boardings_path is required for "
+                "congested.use_peaking_factor"
             )
-            ea_pnr_df.to_csv(path_boardings.format(period="ea_pnr"), index=False)
+        path_boardings = self.get_abs_path(self.config.output_transit_boardings_path)
+        return path_boardings.format(period="ea_pnr")
+
+    @staticmethod
+    def _set_line_headways(
+        emme_scenario: EmmeScenario,
+        lines: pd.DataFrame,
+        orig_headway: np.ndarray,
+        headway: np.ndarray,
+    ):
+        """Write the line headway and @orig_hdw to the scenario in bulk.
 
-        _update_attributes = {"TRANSIT_LINE": ["@orig_hdw", "headway"]}
-        self.controller.emme_manager.copy_attribute_values(
-            _network, _emme_scenario, _update_attributes
-        )
+        Args:
+            emme_scenario: Emme scenario to write to
+            lines: lines table from transit_tables, ordered as the headway arrays
+            orig_headway: original line headways
+            headway: new line headways
+        """
+        line_index, _ = get_attribute_arrays(emme_scenario, "TRANSIT_LINE", [])
+        positions = lines["line_id"].map(line_index).to_numpy(dtype=np.int64)
+        values = {}
+        for name, line_values in [("@orig_hdw", orig_headway), ("headway", headway)]:
+            values[name] = np.empty(len(line_index))
+            values[name][positions] = line_values
+        set_attribute_arrays(emme_scenario, "TRANSIT_LINE", line_index, values)
 
     def _transit_classes(self, time_period) -> List[TransitAssignmentClass]:
         emme_manager = self.controller.emme_manager
@@ -803,63 +960,35 @@ class TransitAssignment(Component):
             time_period (str): time period abbreviation
         """
         _emme_scenario = self.transit_emmebank.scenario(time_period)
-        network = _emme_scenario.get_network()
-
+        network = self._network_snapshot(time_period).get(
+            {"TRANSIT_LINE": [], "TRANSIT_SEGMENT": []}
+        )
+        line_attributes = ["headway", "#description", "#mode", "#faresystem"]
+        if self.config.use_fares:
+            line_attributes.append("#src_mode")
+        lines, segments = transit_tables(
+            _emme_scenario, network, line_attributes, ["transit_boardings"]
+        )
+        boardings = pd.DataFrame(
+            {
+                "line_name": lines["line_id"],
+                "description": lines["#description"],
+                "total_boarding": sum_by_line(lines, segments["transit_boardings"]),
+                "total_hour_cap": 60 * lines["total_capacity"] / lines["headway"],
+                "tm2_mode": lines["#mode"],
+                "line_mode": lines["#src_mode" if self.config.use_fares else "mode"],
+                "headway": lines["headway"],
+                "fare_system": lines["#faresystem"],
+            }
+        )
         output_transit_boardings_file = self.get_abs_path(
             self.config.output_transit_boardings_path
         )
-
-        os.makedirs(os.path.dirname(output_transit_boardings_file), exist_ok=True)
-
-        with open(
+        tools.write_table(
+            boardings,
             output_transit_boardings_file.format(period=time_period.lower()),
-            "w",
-            encoding="utf8",
-        ) as out_file:
-            out_file.write(
-                ",".join(
-                    [
-                        "line_name",
-                        "description",
-                        "total_boarding",
-                        "total_hour_cap",
-                        "tm2_mode",
-                        "line_mode",
-                        "headway",
-                        "fare_system",
-                    ]
-                )
-            )
-            out_file.write("\n")
-            for line in network.transit_lines():
-                boardings = 0
-                capacity = line.vehicle.total_capacity
-                hdw = line.headway
-                line_hour_cap = 60 * capacity / hdw
-                if self.config.use_fares:
-                    mode = line["#src_mode"]
-                else:
-                    mode = line.mode
-                for segment in line.segments(include_hidden=True):
-                    boardings += segment.transit_boardings
-                out_file.write(
-                    ",".join(
-                        [
-                            str(x)
-                            for x in [
-                                line.id,
-                                line["#description"],
-                                boardings,
-                                line_hour_cap,
-                                line["#mode"],
-                                mode,
-                                line.headway,
-                                line["#faresystem"],
-                            ]
-                        ]
-                    )
-                )
-                out_file.write("\n")
+            self.config.output_file_format,
+        )
 
     def _calc_connector_flows(
         self, time_period: str
@@ -870,7 +999,7 @@ class TransitAssignment(Component):
             time_period (str): time period abbreviation
 
         returns:
-            EmmeNetwork with aux_transit_volumes
+            EmmeNetwork with the centroid connectors (no attributes)
             transit class stop attributes: {<transit_class_name>: @aux_volume_<transit_class_name>...}
         """
         _emme_manager = self.controller.emme_manager
@@ -892,13 +1021,8 @@ class TransitAssignment(Component):
             network_results(spec, class_name=tclass.name, scenario=_emme_scenario)
             tclass_stop_attrs[tclass.name] = attr_name
 
-        # optimization: partial network to only load links and certain attributes
-        network = _emme_scenario.get_partial_network(["LINK"], include_attributes=True)
-        attributes = {
-            "LINK": tclass_stop_attrs.values(),
-            "NODE": ["@taz_id", "#node_id"],
-        }
-        _emme_manager.copy_attribute_values(_emme_scenario, network, attributes)
+        # attribute values are read from the scenario in _export_connector_flows
+        network = self._network_snapshot(time_period).get({"NODE": [], "LINK": []})
         return network, tclass_stop_attrs
 
     def _export_connector_flows(
@@ -910,32 +1034,66 @@ class TransitAssignment(Component):
             network: network to use
             class_stop_attrs: list of attributes to export
         """
+        _emme_scenario = self.transit_emmebank.scenario(time_period)
+        node_index, node_values = get_attribute_arrays(
+            _emme_scenario, "NODE", ["@taz_id", "#node_id"]
+        )
+        link_index, link_values = get_attribute_arrays(
+            _emme_scenario, "LINK", list(class_stop_attrs.values())
+        )
+        # connectors as zone and stop node positions, and link positions of the
+        # boarding and alighting link (-1 if none)
+        zone_pos, stop_pos, board_pos, alight_pos = [], [], [], []
+        for zone in network.centroids():
+            for link in zone.outgoing_links():
+                stop = link.j_node.id
+                zone_pos.append(node_index[zone.id])
+                stop_pos.append(node_index[stop])
+                board_pos.append(link_index[zone.id][stop])
+                alight_pos.append(
+                    link_index[stop][zone.id] if link.reverse_link else -1
+                )
+            for link in zone.incoming_links():
+                if link.reverse_link:  # already exported
+                    continue
+                stop = link.i_node.id
+                zone_pos.append(node_index[zone.id])
+                stop_pos.append(node_index[stop])
+                board_pos.append(-1)
+                alight_pos.append(link_index[stop][zone.id])
+
+        board_pos = np.asarray(board_pos, dtype=np.int64)
+        alight_pos = np.asarray(alight_pos, dtype=np.int64)
+
+        def _flows(positions):
+            # connectors by classes, 0.0 for missing links
+            return np.stack(
+                [
+                    np.where(positions >= 0, link_values[attr][positions], 0.0)
+                    for attr in class_stop_attrs.values()
+                ],
+                axis=1,
+            )
+
+        num_classes = len(class_stop_attrs)
+        flows = pd.DataFrame(
+            {
+                "mode": np.tile(list(class_stop_attrs), len(zone_pos)),
+                "taz": np.repeat(
+                    node_values["@taz_id"][zone_pos].astype(int), num_classes
+                ),
+                "stop": np.repeat(node_values["#node_id"][stop_pos], num_classes),
+                "boardings": _flows(board_pos).ravel(),
+                "alightings": _flows(alight_pos).ravel(),
+            }
+        )
         path_tmplt = self.get_abs_path(self.config.output_stop_usage_path)
-        os.makedirs(os.path.dirname(path_tmplt), exist_ok=True)
-        with open(
-            path_tmplt.format(period=time_period.lower()), "w", encoding="utf8"
-        ) as out_file:
-            out_file.write(",".join(["mode", "taz", "stop", "boardings", "alightings"]))
-            out_file.write("\n")
-            for zone in network.centroids():
-                taz_id = int(zone["@taz_id"])
-                for link in zone.outgoing_links():
-                    stop_id = link.j_node["#node_id"]
-                    for name, attr_name in class_stop_attrs.items():
-                        alightings = (
-                            link.reverse_link[attr_name] if link.reverse_link else 0.0
-                        )
-                        out_file.write(
-                            f"{name}, {taz_id}, {stop_id}, {link[attr_name]}, {alightings}\n"
-                        )
-                for link in zone.incoming_links():
-                    if link.reverse_link:  # already exported
-                        continue
-                    stop_id = link.i_node["#node_id"]
-                    for name, attr_name in class_stop_attrs.items():
-                        out_file.write(
-                            f"{name}, {taz_id}, {stop_id}, 0.0, {link[attr_name]}\n"
-                        )
+        tools.write_table(
+            flows,
+            path_tmplt.format(period=time_period.lower()),
+            self.config.output_file_format,
+            sep=", ",
+        )
 
     def _export_transit_segment(self, time_period: str):
         # add total boardings by access mode
@@ -979,112 +1137,88 @@ class TransitAssignment(Component):
             }
             network_results(spec, class_name=tclass.name, scenario=_emme_scenario)
 
-        network = _emme_scenario.get_network()
+        use_orig_headway = self.config.congested.use_peaking_factor and (
+            time_period.lower() in ["am", "pm"]
+        )
+        line_attributes = ["headway", "speed"]
+        if self.config.use_fares:
+            line_attributes.append("#src_mode")
+        if use_orig_headway:
+            line_attributes.append("@orig_hdw")
+        board_columns = {
+            f"{board_type}_{access}": f"{prefix}_{class_name}"
+            for board_type, prefix in _SEGMENT_BOARDING_TYPES.items()
+            for access, class_name in _SEGMENT_BOARDING_CLASSES.items()
+        }
+        network = self._network_snapshot(time_period).get(
+            {"TRANSIT_LINE": [], "TRANSIT_SEGMENT": []}
+        )
+        lines, segments = transit_tables(
+            _emme_scenario,
+            network,
+            line_attributes,
+            [
+                "#stop_name",
+                "dwell_time",
+                "transit_time_func",
+                "transit_volume",
+                "transit_boardings",
+                "transit_time",
+                "@trantime_seg",
+            ]
+            + list(board_columns.values()),
+        )
+        line_pos = segments["line_index"].to_numpy()
+
+        def _line_values(name):
+            return lines[name].to_numpy()[line_pos]
+
+        mode = _line_values("mode")
+        headway = _line_values("headway")
+        stop_name = segments["#stop_name"]
+        if self.config.output_file_format == "csv":
+            # stop names are always quoted in the CSV
+            stop_name = stop_name.map('"{0}"'.format)
+        table = pd.DataFrame(
+            {
+                "line": segments["segment_id"],
+                "stop_name": stop_name,
+                "i_node": segments["i_node"],
+                "j_node": segments["j_node"].map(str),
+                "dwt": segments["dwell_time"],
+                "ttf": segments["transit_time_func"].astype(int),
+                "voltr": segments["transit_volume"],
+                "board": segments["transit_boardings"],
+                "con_time": segments["transit_time"],
+                "uncon_time": segments["@trantime_seg"],
+                "mode": mode,
+                "src_mode": _line_values("#src_mode")
+                if self.config.use_fares
+                else mode,
+                "mdesc": _line_values("mode_description"),
+                "hdw": headway,
+                "orig_hdw": _line_values("@orig_hdw") if use_orig_headway else headway,
+                "speed": _line_values("speed"),
+                "vauteq": _line_values("auto_equivalent"),
+                "vcaps": _line_values("seated_capacity"),
+                "vcapt": _line_values("total_capacity"),
+            }
+        )
+        for column, attr_name in board_columns.items():
+            table[column] = segments[attr_name]
         path_boardings = self.get_abs_path(self.config.output_transit_segment_path)
-        with open(path_boardings.format(period=time_period.lower()), "w") as f:
-            f.write(
-                ",".join(
-                    [
-                        "line",
-                        "stop_name",
-                        "i_node",
-                        "j_node",
-                        "dwt",
-                        "ttf",
-                        "voltr",
-                        "board",
-                        "con_time",
-                        "uncon_time",
-                        "mode",
-                        "src_mode",
-                        "mdesc",
-                        "hdw",
-                        "orig_hdw",
-                        "speed",
-                        "vauteq",
-                        "vcaps",
-                        "vcapt",
-                        "initial_board_ptw",
-                        "initial_board_wtp",
-                        "initial_board_ktw",
-                        "initial_board_wtk",
-                        "initial_board_wtw",
-                        "direct_transfer_board_ptw",
-                        "direct_transfer_board_wtp",
-                        "direct_transfer_board_ktw",
-                        "direct_transfer_board_wtk",
-                        "direct_transfer_board_wtw",
-                        "auxiliary_transfer_board_ptw",
-                        "auxiliary_transfer_board_wtp",
-                        "auxiliary_transfer_board_ktw",
-                        "auxiliary_transfer_board_wtk",
-                        "auxiliary_transfer_board_wtw",
-                    ]
-                )
-            )
-            f.write("\n")
-
-            for line in network.transit_lines():
-                for segment in line.segments(include_hidden=True):
-                    if self.config.use_fares:
-                        mode = segment.line["#src_mode"]
-                    else:
-                        mode = segment.line.mode
-                    if self.config.congested.use_peaking_factor and (
-                        time_period.lower() in ["am", "pm"]
-                    ):
-                        orig_headway = segment.line["@orig_hdw"]
-                    else:
-                        orig_headway = segment.line.headway
-                    f.write(
-                        ",".join(
-                            [
-                                str(x)
-                                for x in [
-                                    segment.id,
-                                    '"{0}"'.format(segment["#stop_name"]),
-                                    segment.i_node,
-                                    segment.j_node,
-                                    segment.dwell_time,
-                                    segment.transit_time_func,
-                                    segment.transit_volume,
-                                    segment.transit_boardings,
-                                    segment.transit_time,
-                                    segment["@trantime_seg"],
-                                    segment.line.mode,
-                                    mode,
-                                    segment.line.mode.description,
-                                    segment.line.headway,
-                                    orig_headway,
-                                    segment.line.speed,
-                                    segment.line.vehicle.auto_equivalent,
-                                    segment.line.vehicle.seated_capacity,
-                                    segment.line.vehicle.total_capacity,
-                                    segment["@iboard_pnr_trn_wlk"],
-                                    segment["@iboard_wlk_trn_pnr"],
-                                    segment["@iboard_knr_trn_wlk"],
-                                    segment["@iboard_wlk_trn_knr"],
-                                    segment["@iboard_wlk_trn_wlk"],
-                                    segment["@dboard_pnr_trn_wlk"],
-                                    segment["@dboard_wlk_trn_pnr"],
-                                    segment["@dboard_knr_trn_wlk"],
-                                    segment["@dboard_wlk_trn_knr"],
-                                    segment["@dboard_wlk_trn_wlk"],
-                                    segment["@aboard_pnr_trn_wlk"],
-                                    segment["@aboard_wlk_trn_pnr"],
-                                    segment["@aboard_knr_trn_wlk"],
-                                    segment["@aboard_wlk_trn_knr"],
-                                    segment["@aboard_wlk_trn_wlk"],
-                                ]
-                            ]
-                        )
-                    )
-                    f.write("\n")
+        tools.write_table(
+            table,
+            path_boardings.format(period=time_period.lower()),
+            self.config.output_file_format,
+        )
 
     def _export_boardings_by_station(self, time_period: str):
         _emme_manager = self.controller.emme_manager
         _emme_scenario = self.transit_emmebank.scenario(time_period)
-        network = _emme_scenario.get_network()
+        network = self._network_snapshot(time_period).get(
+            {"TRANSIT_LINE": ["#src_mode"] if self.config.use_fares else []}
+        )
         sta2sta = _emme_manager.tool(
             "inro.emme.transit_assignment.extended.station_to_station_analysis"
         )
@@ -1140,7 +1274,7 @@ class TransitAssignment(Component):
     def _export_transfer_at_stops(self, time_period: str):
         _emme_manager = self.controller.emme_manager
         _emme_scenario = self.transit_emmebank.scenario(time_period)
-        network = _emme_scenario.get_network()
+        network = self._network_snapshot(time_period).get({"NODE": ["#node_id"]})
         transfers_at_stops = _emme_manager.tool(
             "inro.emme.transit_assignment.extended.apps.transfers_at_stops"
         )
@@ -10,6 +10,7 @@ from collections import defaultdict as _defaultdict
 from copy import deepcopy as _copy
 from typing import Dict
 
+import numpy as np
 import pandas as pd
 import shapely.geometry as _geom
 from inro.modeller import PageBuilder
@@ -18,13 +19,97 @@ from typing_extensions import TYPE_CHECKING, Literal
 
 from tm2py.components.component import Component
 from tm2py.emme.manager import EmmeLink, EmmeNetwork, EmmeScenario
-from tm2py.emme.network import NoPathFound, find_path
+from tm2py.emme.network import (
+    NoPathFound,
+    find_path,
+    get_attribute_arrays,
+    set_attribute_arrays,
+)
 from tm2py.logger import LogStartEnd
 
 if TYPE_CHECKING:
     from tm2py.controller import RunController
 
 
+def calc_transit_link_times(
+    auto_time: np.ndarray,
+    area_type: np.ndarray,
+    length: np.ndarray,
+    facility_type: np.ndarray,
+) -> np.ndarray:
+    """Calculate the bus link times from the auto link times.
+
+    The transit speed is the auto speed, with a minimum of 6 mph on freeways and
+    expressways (facility type 1-4 and 8) and 3 mph otherwise, see
+    https://github.com/BayAreaMetro/travel-model-one/blob/master/model-files/scripts/skims/PrepHwyNet.job#L106
+    A delay by area type is added per mile on links which are not freeways.
+
+    Args:
+        auto_time: auto link times (minutes)
+        area_type: link area types
+        length: link lengths (miles)
+        facility_type: link facility types
+
+    Returns:
+        Array of bus link times (minutes), NaN where the auto time is not positive.
+    """
+    auto_time = np.asarray(auto_time, dtype=float)
+    length = np.asarray(length, dtype=float)
+    facility_type = np.asarray(facility_type)
+    area_type = np.asarray(area_type)
+    has_time = auto_time > 0
+    tran_speed = 60 * length / np.where(has_time, auto_time, 1.0)
+    is_freeway = (facility_type <= 4) | (facility_type == 8)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trantime = np.select(
+            [is_freeway & (tran_speed < 6), tran_speed < 3],
+            [60 * length / 6, 60 * length / 3],
+            auto_time,
+        )
+    delay_factor = np.select(
+        [
+            np.isin(facility_type, [1, 2, 3, 8]),
+            np.isin(area_type, [0, 1]),
+            np.isin(area_type, [2, 3]),
+            area_type == 4,
+        ],
+        [0.0, 2.46, 1.74, 1.14],
+        0.08,
+    )
+    return np.where(has_time, trantime + delay_factor * length, np.nan)
+
+
+def _network_structure_key(link_index: Dict, segment_index: Dict) -> int:
+    """Hash of the link and transit segment indexes from get_attribute_values.
+
+    Changes if a link is added or removed, or the links or segments are
+    reordered, or a transit line is added, removed or has a segment added or
+    removed.
+    """
+    links = tuple(
+        (i_node, tuple(j_nodes.items())) for i_node, j_nodes in link_index.items()
+    )
+    segments = tuple(
+        (line_id, tuple(positions)) for line_id, positions in segment_index.items()
+    )
+    return hash((links, segments))
+
+
+def _join_link_ids(src_link_ids: np.ndarray, dst_link_ids: np.ndarray) -> np.ndarray:
+    """Return the position of the src link with the same ID for each dst link.
+
+    Matches the links as dictionaries by ID, i.e. only the last link with an ID
+    in either array is matched, and -1 is returned for unmatched dst links.
+    """
+    src_ids = pd.Index(src_link_ids)
+    src_unique = ~src_ids.duplicated(keep="last")
+    dst_ids = pd.Index(dst_link_ids)
+    positions = pd.Index(src_ids[src_unique]).get_indexer(dst_ids)
+    positions = np.where(positions >= 0, np.flatnonzero(src_unique)[positions], -1)
+    positions[dst_ids.duplicated(keep="last")] = -1
+    return positions
+
+
 class PrepareTransitNetwork(Component):
     """Transit assignment and skim-related network preparation."""
 
@@ -47,6 +132,7 @@ class PrepareTransitNetwork(Component):
         self._auto_scenarios = None
         self._access_connector_df = None
         self._egress_connector_df = None
+        self._segment_link_positions = {}
 
     @LogStartEnd(
         "Prepare transit network attributes and update times from auto network."
@@ -178,85 +264,75 @@ class PrepareTransitNetwork(Component):
     def update_auto_times(self, time_period: str):
         """Update the auto travel times from the last auto assignment to the transit scenario.
 
-        TODO Document steps more when understand them.
+        Joins the highway and transit links on #link_id as attribute arrays, and
+        calculates the transit link time @trantime (see calc_transit_link_times)
+        and the drive alone toll @drive_toll for the matched links. The link
+        @trantime is then copied to the segment @trantime_seg and data1 (us1,
+        used in the ttf expressions) for segments without a schedule time.
 
         Note: may need to remove "reliability" factor in future versions of VDF def
 
         Args:
             time_period: time period name abbreviation
         """
+        _transit_scenario = self.transit_scenarios[time_period]
+        link_index, transit_links = get_attribute_arrays(
+            _transit_scenario,
+            "LINK",
+            ["#link_id", "length", "@ft", "@trantime", "@drive_toll"],
+        )
+        trantime = transit_links["@trantime"].astype(float)
+        drive_toll = transit_links["@drive_toll"].astype(float)
 
-        _highway_link_dict = self._get_highway_links(time_period)
-        _transit_link_dict = self._get_transit_links(time_period)
-
-        for _link_id in _highway_link_dict.keys() & _transit_link_dict.keys():
-            auto_time = _highway_link_dict[_link_id].auto_time
-            area_type = _highway_link_dict[_link_id]["@area_type"]
-            # use @valuetoll_dam (cents/mile) here to represent the drive alone toll
-            # sov_toll_per_mile = _highway_link_dict[_link_id]['@valuetoll_dam']
-            link_length = _transit_link_dict[_link_id].length
-            facility_type = _transit_link_dict[_link_id]["@ft"]
-            # sov_toll = sov_toll_per_mile * link_length/100
-
+        highway_links = self._get_highway_links(time_period)
+        if highway_links is not None:
+            highway_pos = _join_link_ids(
+                highway_links["#link_id"], transit_links["#link_id"]
+            )
+            matched = highway_pos >= 0
+            highway_pos = highway_pos[matched]
             # using the @valuetoll_da to get drive alone toll
-            sov_toll = _highway_link_dict[_link_id]["@valuetoll_da"]
-
-            _transit_link_dict[_link_id]["@drive_toll"] = sov_toll
-
-            if auto_time > 0:
-                # https://github.com/BayAreaMetro/travel-model-one/blob/master/model-files/scripts/skims/PrepHwyNet.job#L106
-                tran_speed = 60 * link_length / auto_time
-                if (facility_type <= 4 or facility_type == 8) and (tran_speed < 6):
-                    tran_speed = 6
-                    _transit_link_dict[_link_id]["@trantime"] = (
-                        60 * link_length / tran_speed
-                    )
-                elif tran_speed < 3:
-                    tran_speed = 3
-                    _transit_link_dict[_link_id]["@trantime"] = (
-                        60 * link_length / tran_speed
-                    )
-                else:
-                    _transit_link_dict[_link_id]["@trantime"] = auto_time
-                # data1 is the auto time used in Mixed-Mode transit assigment
-                _transit_link_dict[_link_id].data1 = (
-                    _transit_link_dict[_link_id]["@trantime"]
-                    + 60 * sov_toll / self.config.value_of_time
-                )
-                # bus time calculation
-                if facility_type in [1, 2, 3, 8]:
-                    delayfactor = 0.0
-                else:
-                    if area_type in [0, 1]:
-                        delayfactor = 2.46
-                    elif area_type in [2, 3]:
-                        delayfactor = 1.74
-                    elif area_type == 4:
-                        delayfactor = 1.14
-                    else:
-                        delayfactor = 0.08
-                bus_time = _transit_link_dict[_link_id]["@trantime"] + (
-                    delayfactor * link_length
-                )
-                _transit_link_dict[_link_id]["@trantime"] = bus_time
+            drive_toll[matched] = highway_links["@valuetoll_da"][highway_pos]
+            matched_trantime = calc_transit_link_times(
+                highway_links["auto_time"][highway_pos],
+                highway_links["@area_type"][highway_pos],
+                transit_links["length"][matched],
+                transit_links["@ft"][matched],
+            )
+            # links without auto time keep the previous @trantime
+            trantime[matched] = np.where(
+                np.isnan(matched_trantime), trantime[matched], matched_trantime
+            )
 
-        # TODO document this! Consider copying to another method.
         # set us1 (segment data1), used in ttf expressions, from @trantime
-        _transit_net = self._transit_networks[time_period]
-        _transit_scenario = self.transit_scenarios[time_period]
-
-        for segment in _transit_net.transit_segments():
-            # ? why would we only do this is schedule time was negative -- ES
-            if segment["@schedule_time"] <= 0 and segment.link is not None:
-                # ? what is "data1" and why do we need to update all these?
-                segment["data1"] = segment["@trantime_seg"] = segment.link["@trantime"]
-
-        _update_attributes = {
-            "TRANSIT_SEGMENT": ["@trantime_seg", "data1"],
-            "LINK": ["@trantime", "@drive_toll"],
-        }
-        self.emme_manager.copy_attribute_values(
-            _transit_net, _transit_scenario, _update_attributes
+        segment_index, segments = get_attribute_arrays(
+            _transit_scenario,
+            "TRANSIT_SEGMENT",
+            ["@schedule_time", "@trantime_seg", "data1"],
+        )
+        segment_link_pos = self._get_segment_link_positions(
+            time_period, link_index, segment_index, len(segments["data1"])
+        )
+        # ? why would we only do this is schedule time was negative -- ES
+        update = (segments["@schedule_time"] <= 0) & (segment_link_pos >= 0)
+        segment_trantime = trantime[segment_link_pos]
+
+        set_attribute_arrays(
+            _transit_scenario,
+            "LINK",
+            link_index,
+            {"@trantime": trantime, "@drive_toll": drive_toll},
+        )
+        set_attribute_arrays(
+            _transit_scenario,
+            "TRANSIT_SEGMENT",
+            segment_index,
+            {
+                "@trantime_seg": np.where(
+                    update, segment_trantime, segments["@trantime_seg"]
+                ),
+                "data1": np.where(update, segment_trantime, segments["data1"]),
+            },
         )
 
     def _update_pnr_penalty(self, time_period: str):
@@ -383,57 +459,66 @@ class PrepareTransitNetwork(Component):
                 )
         return connectors_df
 
-    def _get_transit_links(
-        self,
-        time_period: str,
-    ):
-        """Create dictionary of link ids mapped to attributes.
+    def _get_highway_links(self, time_period: str) -> Dict[str, np.ndarray]:
+        """Return highway link attribute arrays used to update the transit link times.
 
         Args:
             time_period (str): time period abbreviation
+
+        Returns:
+            Dictionary of attribute name to array of values by link, or None if the
+            highway scenario has no traffic assignment results.
         """
-        _transit_scenario = self.transit_scenarios[time_period]
-        _transit_net = self.transit_networks[time_period]
-        transit_attributes = {
-            "LINK": ["#link_id", "@trantime", "@ft"],
-            "TRANSIT_SEGMENT": ["@schedule_time", "@trantime_seg", "data1"],
-        }
-        self.emme_manager.copy_attribute_values(
-            _transit_scenario, _transit_net, transit_attributes
+        _highway_scenario = self.highway_scenarios[time_period]
+        if not _highway_scenario.has_traffic_results:
+            return None
+        _, highway_links = get_attribute_arrays(
+            _highway_scenario,
+            "LINK",
+            ["#link_id", "auto_time", "@area_type", "@valuetoll_da"],
         )
-        _transit_link_dict = {
-            tran_link["#link_id"]: tran_link for tran_link in _transit_net.links()
-        }
-        return _transit_link_dict
+        return highway_links
 
-    def _get_highway_links(
-        self,
-        time_period: str,
-    ):
-        """Create dictionary of link ids mapped to auto travel times.
+    def _get_segment_link_positions(
+        self, time_period: str, link_index, segment_index, num_segments: int
+    ) -> np.ndarray:
+        """Return the link array position of each transit segment (-1 for no link).
+
+        The positions depend only on the network structure, and are cached by
+        time period, keyed by the contents of the link and segment indexes (see
+        _network_structure_key). Call clear_segment_link_positions after an edit
+        which keeps the same links and number of segments per line (e.g. moving
+        a line onto other existing links).
 
         Args:
             time_period (str): time period abbreviation
+            link_index: LINK index from get_attribute_values
+            segment_index: TRANSIT_SEGMENT index from get_attribute_values
+            num_segments (int): total number of transit segments
         """
-        _highway_scenario = self.highway_scenarios[time_period]
-        if not _highway_scenario.has_traffic_results:
-            return {}
-        _highway_net = _highway_scenario.get_partial_network(
-            ["LINK"], include_attributes=False
+        key = _network_structure_key(link_index, segment_index)
+        cached = self._segment_link_positions.get(time_period)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        network = self.emme_manager.get_network(
+            self.transit_scenarios[time_period],
+            {"TRANSIT_LINE": [], "TRANSIT_SEGMENT": []},
         )
+        positions = np.full(num_segments, -1, dtype=np.int64)
+        for line in network.transit_lines():
+            for segment_pos, segment in zip(
+                segment_index[line.id], line.segments(include_hidden=True)
+            ):
+                if segment.link is not None:
+                    positions[segment_pos] = link_index[segment.i_node.id][
+                        segment.j_node.id
+                    ]
+        self._segment_link_positions[time_period] = (key, positions)
+        return positions
 
-        highway_attributes = {
-            "LINK": ["#link_id", "auto_time", "@lanes", "@area_type", "@valuetoll_da"]
-        }
-
-        self.emme_manager.copy_attribute_values(
-            _highway_scenario, _highway_net, highway_attributes
-        )
-        # TODO can we just get the link attributes as a DataFrame and merge them?
-        auto_link_dict = {
-            auto_link["#link_id"]: auto_link for auto_link in _highway_net.links()
-        }
-        return auto_link_dict
+    def clear_segment_link_positions(self):
+        """Clear the cached transit segment link positions for all time periods."""
+        self._segment_link_positions = {}
 
     def prepare_connectors(self, network, period):
         for node in network.centroids():
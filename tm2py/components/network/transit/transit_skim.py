@@ -50,6 +50,7 @@ class TransitSkim(Component):
             )
         }
         self._skim_outputs = None
+        self._pending_export = None
 
     def validate_inputs(self):
         """Validate inputs."""
@@ -96,15 +97,26 @@ class TransitSkim(Component):
             self.time_period_names, self.config.classes, self.skim_properties
         )
         with self.logger.log_start_end(f"period transit skims"):
-            for _time_period in self.time_period_names:
-                with self.controller.emme_manager.logbook_trace(
-                    f"Transit skims for period {_time_period}"
-                ):
-                    for _transit_class in self.config.classes:
-                        self.run_skim_set(_time_period, _transit_class)
-                        self._export_skims(_time_period, _transit_class)
-                    if self.logger.debug_enabled:
-                        self._log_debug_report(_time_period)
+            try:
+                for _time_period in self.time_period_names:
+                    with self.controller.emme_manager.logbook_trace(
+                        f"Transit skims for period {_time_period}"
+                    ):
+                        for _transit_class in self.config.classes:
+                            self.run_skim_set(_time_period, _transit_class)
+                            self._export_skims(_time_period, _transit_class)
+                        if self.logger.debug_enabled:
+                            self._wait_for_export()
+                            self._log_debug_report(_time_period)
+            finally:
+                self._wait_for_export()
+
+    def _wait_for_export(self):
+        """Wait for the pending OMX export (if any) to complete and close the file."""
+        if self._pending_export is not None:
+            pending, self._pending_export = self._pending_export, None
+            # raises any exception from the writer thread
+            pending.close()
 
     @property
     def skim_matrices(self):
@@ -272,8 +284,8 @@ class TransitSkim(Component):
             1. determine if using transit capacity constraint
             2. skim walk, wait time, boardings, and fares
             3. skim in vehicle time by mode
-            4. mask transfers above max amount
-            5. mask if doesn't have required modes
+            4. if config.mask_skims, mask transfers above max amount and
+               if doesn't have required modes
         """
         use_ccr = False
         congested_transit_assignment = self.config.congested_transit_assignment
@@ -296,6 +308,11 @@ class TransitSkim(Component):
         if use_ccr:
             with self.controller.emme_manager.logbook_trace("CCR related skims"):
                 self.skim_reliability_crowding_capacity(time_period, transit_class)
+        if self.config.mask_skims:
+            with self.controller.emme_manager.logbook_trace(
+                "Mask max transfers and required modes"
+            ):
+                self.mask_skim_set(time_period, transit_class)
 
     def skim_walk_wait_boards_fares(self, time_period: str, transit_class: str):
         """Skim wait, walk, board, and fares for a given time period and transit assignment class.
@@ -386,7 +403,7 @@ class TransitSkim(Component):
         TODO convert this type of calculation to numpy
         """
         _tp_tclass = f"{time_period}_{transit_class_name}"
-        if ("PNR_TRN_WLK" in _tp_tclass) or ("WLK_TRN_PNR" in _tp_tclass):
+        if is_pnr_class(_tp_tclass):
             spec = {
                 "type": "MATRIX_CALCULATION",
                 "constraint": {
@@ -893,73 +910,44 @@ class TransitSkim(Component):
             num_processors=self._num_processors,
         )
 
-    def mask_if_not_required_modes(self, time_period: str, transit_class) -> None:
-        """
-        Enforce the `required_mode_combo` parameter by setting IVTs to 0 if don't have required modes.
-
-        Args:
-            time_period (str): Time period name abbreviation
-            transit_class (_type_): _description_
-        """
-        if not transit_class.required_mode_combo:
-            return
-
-        _ivt_skims = {}
-        for mode in transit_class.required_mode_combo:
-            transit_modes = [m for m in self.config.modes if m.type == mode]
-            for transit_mode in transit_modes:
-                if mode not in _ivt_skims.keys():
-                    _ivt_skims[mode] = self.matrix_cache[time_period].get_data(
-                        f'mf"{time_period}_{transit_class.name}_{transit_mode.name}IVTT"'
-                    )
-                else:
-                    _ivt_skims[mode] += self.matrix_cache[time_period].get_data(
-                        f'mf"{time_period}_{transit_class.name}_{transit_mode.name}IVTT"'
-                    )
-
-        # multiply all IVT skims together and see if they are greater than zero
-        has_all = None
-        for key, value in _ivt_skims.items():
-            if has_all is not None:
-                has_all = np.multiply(has_all, value)
-            else:
-                has_all = value
-
-        self._mask_skim_set(time_period, transit_class, has_all)
+    def mask_skim_set(self, time_period: str, transit_class) -> None:
+        """Mask the skim set for transfers above max_transfers and missing required modes.
 
-    def mask_above_max_transfers(self, time_period: str, transit_class):
-        """Reset skims to 0 if number of transfers is greater than max_transfers.
+        Builds one combined mask for the time period and transit class (see
+        skim_set_mask) and resets the masked O-D pairs to 0 in all skims of the set,
+        in place in the matrix cache. Each skim is then written to the Emmebank once,
+        and the OMX export reads the masked data from the cache.
 
         Args:
             time_period (str): Time period name abbreviation
-            transit_class (_type_): _description_
+            transit_class (_type_): transit class config
         """
-        max_transfers = self.config.max_transfers
-        xfers = self.matrix_cache[time_period].get_data(
-            f'mf"{time_period}_{transit_class.name}_XFERS"'
-        )
-        xfer_mask = np.less_equal(xfers, max_transfers)
-        self._mask_skim_set(time_period, transit_class, xfer_mask)
-
-    def _mask_skim_set(self, time_period: str, transit_class, mask_array: NumpyArray):
-        """Mask a skim set (set of skims for a given time period and transit class) based on an array.
-
-        Array values of >0 are kept. Zero are not.
-
-        TODO add in checks for mask_array dimensions and values
-
-        Args:
-            time_period (str): Time period name abbreviation
-            transit_class (_type_): _description_
-            mask_array (NumpyArray): _description_
-        """
-        mask_array = np.greater(mask_array, 0)
-        mask_array = np.less(mask_array, inf)
-        for skim_key, skim in self.emmebank_skim_matrices(
+        _cache = self.matrix_cache[time_period]
+        boards = _cache.get_data(f'mf"{time_period}_{transit_class.name}_BOARDS"')
+        required_ivts = []
+        for mode in transit_class.required_mode_combo or []:
+            mode_names = [m.name for m in self.config.modes if m.type == mode]
+            if not mode_names:
+                raise ValueError(
+                    f"transit class {transit_class.name} required_mode_combo type "
+                    f"{mode} has no modes in transit.modes"
+                )
+            required_ivts.append(
+                [
+                    _cache.get_data(f'mf"{time_period}_{transit_class.name}_IVT{name}"')
+                    for name in mode_names
+                ]
+            )
+        max_boards = max_skim_boardings(transit_class.name, self.config.max_transfers)
+        mask = skim_set_mask(boards, max_boards, required_ivts)
+        # the skims are masked after all values are used in the mask
+        not_mask = np.logical_not(mask, out=mask)
+        for skim in self.emmebank_skim_matrices(
             time_periods=[time_period], transit_classes=[transit_class]
-        ).items():
-            skim_data = self.matrix_cache[time_period].get_data(skim.name)
-            self.matrix_cache[time_period].set_data(skim.name, skim_data * mask_array)
+        ).values():
+            skim_data = _cache.get_data(skim)
+            np.copyto(skim_data, 0, where=not_mask)
+            _cache.set_data(skim, skim_data)
 
     def _export_skims(self, time_period: str, transit_class: str):
         """Export skims to OMX files by period."""
@@ -974,21 +962,32 @@ class TransitSkim(Component):
         os.makedirs(os.path.dirname(omx_file_path), exist_ok=True)
 
         _matrices = self.emmebank_skim_matrices(
-            time_periods=[time_period], 
+            time_periods=[time_period],
             transit_classes=[transit_class],
-            skim_properties=self.skim_outputs
-
+            skim_properties=self.skim_outputs,
         )
-
-        with OMXManager(
+        # with skim_export_thread the OMX file is written in the background
+        # while the next class is skimmed, at most one export is pending
+        self._wait_for_export()
+        scenario = self.scenarios[time_period]
+        self._pending_export = OMXManager(
             omx_file_path,
             "w",
-            self.scenarios[time_period],
+            scenario,
             matrix_cache=self.matrix_cache[time_period],
             mask_max_value=1e7,
             growth_factor=1,
-        ) as omx_file:
-            omx_file.write_matrices(_matrices)
+            async_write=self.config.skim_export_thread,
+            max_pending_bytes=self.controller.config.emme.omx_export_max_pending_mb
+            * 2**20,
+            storage_profile=self.config.omx_storage_profile,
+        )
+        # opened here and closed in _wait_for_export
+        self._pending_export.open()
+        self._pending_export.create_mapping("zone_number", scenario.zone_numbers)
+        self._pending_export.write_matrices(_matrices)
+        if not self.config.skim_export_thread:
+            self._wait_for_export()
 
     def _log_debug_report(self, _time_period):
         num_zones = len(self.scenarios[_time_period].zone_numbers)
@@ -1022,4 +1021,70 @@ class TransitSkim(Component):
     def _copy_attribute_values(src, dst, attributes):
         for domain, attrs in attributes.items():
             values = src.get_attribute_values(domain, attrs)
-            dst.set_attribute_values(domain, attrs, values)
\ No newline at end of file
+            dst.set_attribute_values(domain, attrs, values)
+
+
+def skim_set_mask(
+    boards: NumpyArray,
+    max_boards: int,
+    required_ivts: List[List[NumpyArray]] = None,
+) -> NumpyArray:
+    """Boolean mask of the O-D pairs to keep in a transit skim set.
+
+    An O-D pair is kept if the number of boardings is not more than max_boards
+    and, for each group of required mode IVT skims, the total IVT in the group is
+    greater than 0 (and finite).
+
+    Args:
+        boards: number of boardings skim
+        max_boards: maximum number of boardings (max transfers + 1)
+        required_ivts: optional, list of groups of IVT skims, one group for each
+            required mode type
+
+    Returns:
+        Boolean array, True for O-D pairs to keep.
+    """
+    mask = np.less_equal(boards, max_boards)
+    total_ivt = None
+    for group_number, ivts in enumerate(required_ivts or []):
+        if not ivts:
+            raise ValueError(f"required mode group {group_number} has no IVT skims")
+        if len(ivts) > 1:
+            # sum into one buffer, no stacked n_modes x zones x zones temporary
+            if total_ivt is None:
+                total_ivt = np.empty(np.shape(ivts[0]), dtype=float)
+            np.add(ivts[0], ivts[1], out=total_ivt)
+            for ivt in ivts[2:]:
+                np.add(total_ivt, ivt, out=total_ivt)
+            group_ivt = total_ivt
+        else:
+            group_ivt = ivts[0]
+        mask &= group_ivt > 0
+        mask &= group_ivt < inf
+    return mask
+
+
+def is_pnr_class(transit_class_name: str) -> bool:
+    """True for the PNR_TRN_WLK and WLK_TRN_PNR classes.
+
+    For these classes the BOARDS skim excludes the boarding of the park-and-ride
+    access or egress line, see TransitSkim._calc_boardings.
+    """
+    return ("PNR_TRN_WLK" in transit_class_name) or (
+        "WLK_TRN_PNR" in transit_class_name
+    )
+
+
+def max_skim_boardings(transit_class_name: str, max_transfers: int) -> int:
+    """Maximum value of the BOARDS skim for max_transfers.
+
+    The BOARDS skim is the number of transfers + 1, except for the pnr classes
+    (see is_pnr_class) where the adjusted BOARDS skim is the number of transfers.
+
+    Args:
+        transit_class_name: name of the transit class
+        max_transfers: maximum number of transfers
+    """
+    if is_pnr_class(transit_class_name):
+        return max_transfers
+    return max_transfers + 1
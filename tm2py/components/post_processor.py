@@ -11,7 +11,9 @@ import json
 
 from tm2py.components.component import Component, FileFormatError
 from tm2py.emme.manager import EmmeNetwork, EmmeScenario
+from tm2py.emme.network import transit_tables
 from tm2py.logger import LogStartEnd
+from tm2py.tools import write_table
 
 if TYPE_CHECKING:
     from tm2py.controller import RunController
@@ -149,60 +151,50 @@ class PostProcessor(Component):
         total and seated capacity of transit line per hour for each transit segment
         in the specified time period.
         """
-        transit_network = scenario.get_network()
+        # network structure only, attribute values are read in bulk from the scenario
+        transit_network = self._emme_manager.get_network(
+            scenario, {"TRANSIT_LINE": [], "TRANSIT_SEGMENT": []}
+        )
+        lines, segments = transit_tables(
+            scenario,
+            transit_network,
+            ["headway"],
+            [
+                "dwell_time",
+                "transit_time_func",
+                "transit_volume",
+                "data1",
+                "data2",
+                "data3",
+            ],
+            link_attributes=["length"],
+            include_hidden=False,
+        )
+        line_pos = segments["line_index"].to_numpy()
+        headway = lines["headway"].to_numpy()[line_pos]
+        boardings = pd.DataFrame(
+            {
+                "Line": lines["line_id"].to_numpy()[line_pos],
+                "From": segments["i_node"],
+                "To": segments["j_node"],
+                "Length": segments["length"],
+                "Dwt": segments["dwell_time"],
+                "capt": 60 * lines["total_capacity"].to_numpy()[line_pos] / headway,
+                "TTF": segments["transit_time_func"].astype(int),
+                "voltr": segments["transit_volume"],
+                "caps": 60 * lines["seated_capacity"].to_numpy()[line_pos] / headway,
+                "Data1": segments["data1"],
+                "Data2": segments["data2"],
+                "Data3": segments["data3"],
+            }
+        )
         path_tmplt = self.get_abs_path(self.config.boardings_by_segment_file_path)
         period_scen_id = self._tp_mapping[time_period]
-        output_path = path_tmplt.format(period=period_scen_id)
-        with open(output_path, "w") as f:
-            f.write(
-                ",".join(
-                    [
-                    "Line", 
-                    "From",
-                    "To",
-                    "Length", 
-                    "Dwt",
-                    "capt",
-                    "TTF",
-                    "voltr",
-                    "caps",
-                    "Data1",
-                    "Data2",
-                    "Data3"
-                    ]
-                )
-            )
-            f.write("\n")
-
-            for line in transit_network.transit_lines():
-                total_capacity = line.vehicle.total_capacity
-                seated_capacity = line.vehicle.seated_capacity
-                hdw = line.headway
-                line_hour_total_cap = 60 * total_capacity / hdw
-                line_hour_seated_cap = 60 * seated_capacity / hdw
-                for segment in line.segments(include_hidden=False):
-                    f.write(
-                        ",".join(
-                            [
-                                str(x) 
-                                for x in [
-                                    segment.line.id, 
-                                    segment.i_node, 
-                                    segment.j_node,
-                                    segment.link.length,  
-                                    segment.dwell_time,
-                                    line_hour_total_cap,
-                                    segment.transit_time_func,
-                                    segment.transit_volume,
-                                    line_hour_seated_cap,
-                                    segment.data1,
-                                    segment.data2,
-                                    segment.data3
-                                ]
-                            ]
-                        )
-                    )
-                    f.write("\n")
+        write_table(
+            boardings,
+            path_tmplt.format(period=period_scen_id),
+            self.config.output_file_format,
+        )
 
     def _export_boardings_by_segment_geofile(self, scenario: EmmeScenario, time_period: str):
         """Export transit segment boardings to a geojson file.
@@ -3,7 +3,11 @@
 # pylint: disable=too-many-instance-attributes
 
 import datetime
+import hashlib
+import os
 import pathlib
+import pickle
+import warnings
 from abc import ABC
 from typing import Dict, List, Optional, Tuple, Union
 
@@ -13,6 +17,8 @@ from pydantic.dataclasses import dataclass
 from pydantic.error_wrappers import ValidationError
 from typing_extensions import Literal
 
+from ._version import __version__
+
 
 class ConfigItem(ABC):
     """Base class to add partial dict-like interface to tm2py model configuration.
@@ -78,6 +84,7 @@ ComponentNames = Literal[
     "internal_external",
     "truck",
     "post_processor",
+    "convergence_monitor",
 ]
 EmptyString = Literal[""]
 
@@ -175,6 +182,44 @@ class RunConfig(ConfigItem):
         return value
 
 
+@dataclass(frozen=True)
+class ConvergenceConfig(ConfigItem):
+    """Global iteration convergence monitor parameters.
+
+    Used by the convergence_monitor component, which should be listed last in
+    run.global_iteration_components. After each global iteration the change
+    from the previous iteration is summarized, and if all of the specified
+    thresholds are met the remaining global iterations are skipped and the
+    run continues with the final_components.
+
+    Properties:
+        max_skim_rmse: optional, maximum demand-weighted root mean square change in
+            highway time skims (minutes), over all periods and classes
+        max_demand_relative_change: optional, maximum sum of absolute cell changes in
+            assigned highway demand relative to the previous total demand
+        max_link_flow_relative_change: optional, maximum sum of absolute change in
+            link auto volumes from the previous global iteration relative to the
+            previous total link volume. This is the change between global
+            iterations, not the highway assignment relative gap.
+        min_iterations: minimum global iteration before stopping early, default is 2
+        classes: highway class names used for the skim and demand summaries,
+            default is all classes with time skims
+        output_file: relative path to CSV summary of changes by iteration and period
+        state_dir: relative path to folder to store the previous iteration's
+            demand, skims and link volumes for comparison. The state_dir and
+            output_file are cleared on global iteration 1, and kept for a run
+            restarted at a later iteration.
+    """
+
+    max_skim_rmse: Optional[float] = Field(default=None, ge=0)
+    max_demand_relative_change: Optional[float] = Field(default=None, ge=0)
+    max_link_flow_relative_change: Optional[float] = Field(default=None, ge=0)
+    min_iterations: int = Field(default=2, ge=1)
+    classes: Tuple[str, ...] = Field(default=())
+    output_file: str = Field(default="logs/convergence.csv")
+    state_dir: str = Field(default="convergence")
+
+
 LogLevel = Literal[
     "TRACE", "DEBUG", "DETAIL", "INFO", "STATUS", "WARN", "ERROR", "FATAL"
 ]
@@ -205,6 +250,18 @@ class LoggingConfig(ConfigItem):
             more detail in the log_file_path.
             Example: [ [2, "highway", "TRACE"] ] to record all messages
             during the highway component run at iteration 2.
+        buffered_file_writes: if True log files are written by a background
+            thread in batches instead of flushed on every message, default is True
+        flush_interval: maximum time in seconds between log file flushes if
+            buffered_file_writes, default is 1.0
+        flush_size: maximum number of messages between log file flushes if
+            buffered_file_writes, default is 1000
+        log_cache_size: maximum number of most recent messages kept for the
+            log_on_error_file_path, default is 100000, None for no limit
+        repeated_message_limit: optional, number of consecutive similar DEBUG or
+            TRACE messages (same level and text other than numbers) to log before
+            the rest are suppressed and reported as a count, default is None to
+            log all. The log_on_error file still has all messages.
     """
 
     display_level: Optional[LogLevel] = Field(default="STATUS")
@@ -231,6 +288,11 @@ class LoggingConfig(ConfigItem):
     iter_component_level: Optional[Tuple[Tuple[int, ComponentNames, LogLevel], ...]] = (
         Field(default=None)
     )
+    buffered_file_writes: Optional[bool] = Field(default=True)
+    flush_interval: Optional[float] = Field(default=1.0, gt=0)
+    flush_size: Optional[int] = Field(default=1000, ge=1)
+    log_cache_size: Optional[int] = Field(default=100000, ge=1)
+    repeated_message_limit: Optional[int] = Field(default=None, ge=1)
 
 
 @dataclass(frozen=True)
@@ -671,10 +733,21 @@ class ActiveModeShortestPathSkimConfig(ConfigItem):
 
 @dataclass(frozen=True)
 class ActiveModesConfig(ConfigItem):
-    """Active Mode skim parameters."""
+    """Active Mode skim parameters.
+
+    Properties:
+        emme_scenario_id: scenario ID in the active mode emmebanks
+        shortest_path_skims: list of skims, see ActiveModeShortestPathSkimConfig
+        engine: shortest path engine, "emme" (shortest path tool) or
+            "csgraph" (scipy.sparse.csgraph dijkstra with max_dist_miles limit)
+        num_processes: number of processes to run the counties in parallel
+            with the csgraph engine, 0 to run in the model process
+    """
 
     emme_scenario_id: int
     shortest_path_skims: Tuple[ActiveModeShortestPathSkimConfig, ...]
+    engine: Literal["emme", "csgraph"] = Field(default="emme")
+    num_processes: int = Field(default=0, ge=0)
 
 
 @dataclass(frozen=True)
@@ -731,6 +804,24 @@ class HighwayRelativeGapConfig(ConfigItem):
     relative_gap: float = Field(gt=0)
 
 
+@dataclass(frozen=True)
+class HighwayRelativeGapScheduleConfig(ConfigItem):
+    """Highway assignment relative gap schedule by global iteration.
+
+    The relative gap is reduced geometrically from initial_relative_gap in
+    global iteration 0 to final_relative_gap in run.end_iteration, looser
+    assignments in the early iterations when the demand is changing and the
+    tightest in the final iteration.
+
+    Properties:
+        initial_relative_gap: relative gap for global iteration 0
+        final_relative_gap: relative gap for the last global iteration
+    """
+
+    initial_relative_gap: float = Field(gt=0)
+    final_relative_gap: float = Field(gt=0)
+
+
 @dataclass(frozen=True)
 class HighwayClassConfig(ConfigItem):
     """Highway assignment class definition.
@@ -905,6 +996,19 @@ class HighwayMazToMazConfig(ConfigItem):
         skim_period: period name to use for the shotest path skims, must
             match one of the names listed in the time_periods
         output_skim_file: relative path to resulting MAZ-to-MAZ skims
+        path_file_format: format of the shortest paths file written by Emme
+            and read to assign the demand, "TEXT" or "BINARY" (memory-mapped,
+            faster for large demand)
+        num_flow_processes: number of worker processes to load the demand on
+            the paths by distance bin while the next shortest paths are run,
+            0 to load in the model process
+        skim_cache_dir: relative path to a directory for cached MAZ-to-MAZ
+            skims, the shortest paths are skipped and the skims are written
+            from the cache if the network, roots and leaves are unchanged and
+            the link costs are within skim_cache_max_cost_change.
+            Default None (no cache).
+        skim_cache_max_cost_change: max absolute change in any link cost to use
+            the cached skims, default 0 (identical link costs)
     """
 
     mode_code: str = Field(min_length=1, max_length=1)
@@ -917,6 +1021,10 @@ class HighwayMazToMazConfig(ConfigItem):
     demand_county_groups: Tuple[DemandCountyGroupConfig, ...] = Field()
     skim_period: str = Field()
     output_skim_file: pathlib.Path = Field()
+    path_file_format: Literal["TEXT", "BINARY"] = Field(default="TEXT")
+    num_flow_processes: int = Field(default=0, ge=0)
+    skim_cache_dir: Optional[pathlib.Path] = Field(default=None)
+    skim_cache_max_cost_change: float = Field(default=0.0, ge=0)
 
     @validator("demand_county_groups")
     def unique_group_numbers(cls, value):
@@ -934,6 +1042,9 @@ class HighwayConfig(ConfigItem):
         generic_highway_mode_code: single character unique mode ID for entire
             highway network (no excluded_links)
         relative_gaps: relative gaps for assignment convergence, specific to global iteration, see HighwayRelativeGapConfig
+        relative_gap_schedule: optional, relative gap schedule from a loose initial
+            to a tight final gap, used instead of relative_gaps (which can then
+            be empty), see HighwayRelativeGapScheduleConfig
         max_iterations: maximum iterations stopping criteria
         area_type_buffer_dist_miles: used to in calculation to categorize link @areatype
             The area type is determined based on the average density of nearby
@@ -960,10 +1071,40 @@ class HighwayConfig(ConfigItem):
             reliability skim will stay the same as global iteration 1.
             If false, reliability will not be calculated nor skimmed in all global
             iterations, and the resulting reliability skims will be 0.
+        averaged_demand_path: optional, relative path to folder for the averaged
+            demand store (.npy files by period, class and global iteration),
+            used as the previous iteration demand for averaging, to resume from
+            any iteration, and to load demand for assignment in separate processes
+        averaged_demand_dtype: data type of the averaged demand store, default
+            float64 as the Emme matrices, float32 halves the disk space
+        demand_step_sizes: optional, weight of the new demand when averaging by
+            global iteration, starting from iteration 1. Default (or for iterations
+            beyond the list) is MSA, 1 / iteration.
+        skim_export_thread: write the skims to OMX in a background thread, the
+            export of a period overlaps with the assignment of the next period.
+            Default to False. See also emme.omx_export_max_pending_mb.
+        omx_storage_profile: data type, compression and chunk shape for the OMX
+            skims, one of default (float64 as in prior versions), fast, compact
+            or archival, see tm2py.emme.matrix.OMX_STORAGE_PROFILES
+        upload_skims_to_emme: write the post-processed time and distance skims
+            (with the intrazonal values) back to the Emme matrices. If False, the
+            Emme skim matrices keep the assignment results and only the OMX skims
+            are post-processed. Default to True.
+        assignment_engine: "emme" for the Emme SOLA traffic assignment (default),
+            or "numpy" for the reference conjugate Frank-Wolfe assignment, see
+            tm2py.components.network.highway.highway_numpy_assign
+        warm_start_dir: optional, relative path to folder for the assignment state
+            (class link volumes and demand) by period, saved at the end of each
+            assignment and used to start the next assignment of the period, in
+            the same or the next global iteration. Used with the numpy
+            assignment_engine only, the Emme SOLA assignment starts from free flow.
+        assignment_summary_file: optional, relative path to CSV file of the
+            assignment runtime, number of iterations and final relative gap by
+            global iteration and period
     """
 
     generic_highway_mode_code: str = Field(min_length=1, max_length=1)
-    relative_gaps: Tuple[HighwayRelativeGapConfig, ...] = Field()
+    relative_gaps: Tuple[HighwayRelativeGapConfig, ...] = Field(default=())
     max_iterations: int = Field(ge=0)
     network_acceleration: bool = Field()
     area_type_buffer_dist_miles: float = Field(gt=0)
@@ -978,6 +1119,20 @@ class HighwayConfig(ConfigItem):
     interchange_nodes_file: str = Field()
     apply_msa_demand: bool = True
     reliability: bool = Field(default=True)
+    averaged_demand_path: Optional[str] = Field(default=None)
+    averaged_demand_dtype: Literal["float64", "float32"] = Field(default="float64")
+    demand_step_sizes: Tuple[float, ...] = Field(default=())
+    skim_export_thread: bool = Field(default=False)
+    omx_storage_profile: Literal["default", "fast", "compact", "archival"] = Field(
+        default="default"
+    )
+    upload_skims_to_emme: bool = Field(default=True)
+    assignment_engine: Literal["emme", "numpy"] = Field(default="emme")
+    relative_gap_schedule: Optional[HighwayRelativeGapScheduleConfig] = Field(
+        default=None
+    )
+    warm_start_dir: Optional[str] = Field(default=None)
+    assignment_summary_file: Optional[str] = Field(default=None)
 
     @validator("output_skim_filename_tmpl")
     def valid_skim_template(value):
@@ -1335,7 +1490,18 @@ class CongestedTransitStopCriteria(ConfigItem):
 
 @dataclass(frozen=True)
 class CongestedAssnConfig(ConfigItem):
-    "Congested transit assignment Configuration."
+    """Congested transit assignment Configuration.
+
+    Properties:
+        apply_peaking_factor_headways: apply the am_peaking_factor and
+            pm_peaking_factor to the AM and PM line headways before each
+            assignment, and reduce the AM park-and-ride capacity by the EA
+            boardings (written after the EA assignment). Default False, the
+            headways are not changed, as before this option was added. If
+            True the AM and PM line headways and capacities change. If the EA
+            boardings file is not found (e.g. EA is not run before AM) the AM
+            park-and-ride capacity is not reduced and a warning is logged.
+    """
 
     trim_demand_before_congested_transit_assignment: bool = False
     output_trimmed_demand_report_path: str = Field(default=None)
@@ -1343,11 +1509,34 @@ class CongestedAssnConfig(ConfigItem):
     use_peaking_factor: bool = False
     am_peaking_factor: float = Field(default=1.219)
     pm_peaking_factor: float = Field(default=1.262)
+    apply_peaking_factor_headways: bool = False
 
 
 @dataclass(frozen=True)
 class TransitConfig(ConfigItem):
-    """Transit assignment parameters."""
+    """Transit assignment parameters.
+
+    Properties:
+        averaged_demand_path: optional, relative path to folder for the averaged
+            demand store (.npy files by period, class and global iteration),
+            used as the previous iteration demand for averaging and to resume
+            from any iteration, see HighwayConfig
+        averaged_demand_dtype: data type of the averaged demand store, default
+            float64 as the Emme matrices, float32 halves the disk space
+        demand_step_sizes: optional, weight of the new demand when averaging by
+            global iteration, starting from iteration 1. Default (or for iterations
+            beyond the list) is MSA, 1 / iteration.
+        output_file_format: "csv" (default) or "parquet" for the transit line,
+            segment and stop usage outputs
+        mask_skims: set the skims of each class to 0 for O-D pairs with more than
+            max_transfers transfers or without in-vehicle time on each of the
+            class required_mode_combo modes. Default False, the skims are not
+            masked, as the masking was never applied in previous versions.
+        skim_export_thread: write the skims of each class to OMX in a background
+            thread while the next class is skimmed. Default to False.
+        omx_storage_profile: data type, compression and chunk shape for the OMX
+            skims, see tm2py.emme.matrix.OMX_STORAGE_PROFILES
+    """
 
     modes: Tuple[TransitModeConfig, ...]
     classes: Tuple[TransitClassConfig, ...]
@@ -1394,6 +1583,15 @@ class TransitConfig(ConfigItem):
     vehicles: Optional[TransitVehicleConfig] = Field(
         default_factory=TransitVehicleConfig
     )
+    averaged_demand_path: Optional[str] = Field(default=None)
+    averaged_demand_dtype: Literal["float64", "float32"] = Field(default="float64")
+    demand_step_sizes: Tuple[float, ...] = Field(default=())
+    output_file_format: Literal["csv", "parquet"] = Field(default="csv")
+    mask_skims: bool = False
+    skim_export_thread: bool = False
+    omx_storage_profile: Literal["default", "fast", "compact", "archival"] = Field(
+        default="default"
+    )
 
 
 @dataclass(frozen=True)
@@ -1416,6 +1614,7 @@ class PostProcessorConfig(ConfigItem):
     network_shapefile_path: str = Field(default=None)
     boardings_by_segment_file_path: str = Field(default=None)
     boardings_by_segment_geofile_path: str = Field(default=None)
+    output_file_format: Literal["csv", "parquet"] = Field(default="csv")
 
 
 @dataclass(frozen=True)
@@ -1434,6 +1633,9 @@ class EmmeConfig(ConfigItem):
             either as an integer, or value MAX, MAX-N. Typically recommend
             using MAX-1 (on desktop systems) or MAX-2 (on servers with many
             logical processors) to leave capacity for background / other tasks.
+        omx_export_max_pending_mb: memory budget in MB for the skim arrays queued
+            for the background OMX writer thread, used if highway or transit
+            skim_export_thread is True
     """
 
     all_day_scenario_id: int
@@ -1445,6 +1647,7 @@ class EmmeConfig(ConfigItem):
     num_processors: str = Field(regex=r"^MAX$|^MAX-\d+$|^\d+$|^MAX/\d+$")
     num_processors_transit_skim: str = Field(regex=r"^MAX$|^MAX-\d+$|^\d+$|^MAX/\d+$")
     highway_distribution: Optional[List[HighwayDistribution]] = Field(default=None)
+    omx_export_max_pending_mb: float = Field(default=2048, gt=0)
 
 
 @dataclass(frozen=True)
@@ -1465,20 +1668,32 @@ class Configuration(ConfigItem):
     post_processor: PostProcessorConfig
     emme: EmmeConfig
     logging: Optional[LoggingConfig] = Field(default_factory=LoggingConfig)
+    convergence: Optional[ConvergenceConfig] = Field(default_factory=ConvergenceConfig)
 
     @classmethod
     def load_toml(
         cls,
         toml_path: Union[List[Union[str, pathlib.Path]], str, pathlib.Path],
+        cache_dir: Union[str, pathlib.Path] = None,
     ) -> "Configuration":
         """Load configuration from .toml files(s).
 
         Normally the config is split into a scenario_config.toml file and a
         model_config.toml file.
 
+        If cache_dir is specified the validated Configuration is pickled to
+        cache_dir, keyed by the hash of the contents of the TOML files (in order)
+        together with the tm2py version and config schema, and is loaded from there
+        when the same TOML files are read again, skipping the TOML parsing and
+        validation. The logging config is always re-created so that default log
+        file names are timestamped for the current run. A cache file which
+        cannot be loaded (e.g. written by a different version) is reported with
+        a warning and replaced.
+
         Args:
             toml_path: a valid system path string or Path object to a TOML format config file or
                 list of paths of path objects to a set of TOML files.
+            cache_dir: optional, directory for cached validated Configurations
 
         Returns:
             A Configuration object
@@ -1487,10 +1702,58 @@ class Configuration(ConfigItem):
             toml_path = [toml_path]
         toml_path = list(map(pathlib.Path, toml_path))
 
+        if cache_dir is not None:
+            cache_path = pathlib.Path(cache_dir) / f"config_{_toml_hash(toml_path)}.pkl"
+            if cache_path.exists():
+                try:
+                    with open(cache_path, "rb") as cache_file:
+                        cached = pickle.load(cache_file)
+                    config = cached["config"]
+                    if isinstance(config, cls):
+                        # frozen dataclass: replace logging without re-validating all config
+                        logging_config = LoggingConfig(**cached["logging"])
+                        object.__setattr__(config, "logging", logging_config)
+                        return config
+                except Exception as error:  # pylint: disable=broad-except
+                    # invalid or incompatible cache, load and replace below
+                    warnings.warn(
+                        f"Configuration cache {cache_path} not used: {error!r}"
+                    )
+
         data = _load_toml(toml_path[0])
         for path_item in toml_path[1:]:
             _merge_dicts(data, _load_toml(path_item))
-        return cls(**data)
+        config = cls(**data)
+
+        if cache_dir is not None:
+            _write_pickle(
+                cache_path, {"config": config, "logging": data.get("logging", {})}
+            )
+        return config
+
+    def to_pickle(self, path: Union[str, pathlib.Path]):
+        """Write the validated Configuration to file, read with from_pickle.
+
+        Args:
+            path: file path to write to, read with Configuration.from_pickle
+        """
+        _write_pickle(pathlib.Path(path), self)
+
+    @classmethod
+    def from_pickle(cls, path: Union[str, pathlib.Path]) -> "Configuration":
+        """Load an already validated Configuration written by to_pickle.
+
+        Args:
+            path: file path written by Configuration.to_pickle
+
+        Returns:
+            A Configuration object
+        """
+        with open(path, "rb") as config_file:
+            config = pickle.load(config_file)
+        if not isinstance(config, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}")
+        return config
 
     @validator("highway")
     def maz_skim_period_exists(cls, value, values):
@@ -1505,7 +1768,7 @@ class Configuration(ConfigItem):
     @validator("highway", always=True)
     def relative_gap_length(cls, value, values):
         """Validate highway.relative_gaps is a list of length greater or equal to global iterations."""
-        if "run" in values:
+        if "run" in values and value.relative_gap_schedule is None:
             assert len(value.relative_gaps) >= (
                 values["run"]["end_iteration"] + 1
             ), f"'highway.relative_gaps must be the same or greater length as end_iteration+1,\
@@ -1539,6 +1802,25 @@ def _load_toml(path: str) -> dict:
     return data
 
 
+def _toml_hash(toml_paths: List[pathlib.Path]) -> str:
+    """Hash of the contents of the toml files, the tm2py version and this config schema."""
+    file_hash = hashlib.sha256()
+    file_hash.update(__version__.encode("utf8"))
+    file_hash.update(pathlib.Path(__file__).read_bytes())
+    for path in toml_paths:
+        file_hash.update(path.read_bytes())
+    return file_hash.hexdigest()
+
+
+def _write_pickle(path: pathlib.Path, obj):
+    """Pickle obj to path, writing to a temporary file first so readers never see partial files."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "wb") as out_file:
+        pickle.dump(obj, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
 def _merge_dicts(right, left, path=None):
     """Merges the contents of nested dict left into nested dict right.
 
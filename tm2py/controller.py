@@ -14,6 +14,7 @@ files in .toml format (by convention a scenario.toml and a model.toml)
 
 """
 
+import importlib
 import itertools
 import multiprocessing
 import os
@@ -21,51 +22,100 @@ import queue
 import re
 from collections import deque
 from pathlib import Path
-from typing import Collection, List, Tuple, Union
+from typing import Collection, Dict, List, Mapping, Tuple, Type, Union
 
 from datetime import datetime
 from tm2py.components.component import Component
-from tm2py.components.demand.air_passenger import AirPassenger
-from tm2py.components.demand.commercial import CommercialVehicleModel
-from tm2py.components.demand.household import HouseholdModel
-from tm2py.components.demand.internal_external import InternalExternal
-from tm2py.components.network.active.active_modes import ActiveModesSkim
-from tm2py.components.network.create_tod_scenarios import CreateTODScenarios
-from tm2py.components.network.highway.drive_access_skims import DriveAccessSkims
-from tm2py.components.network.highway.highway_assign import HighwayAssignment
-from tm2py.components.network.highway.highway_maz import AssignMAZSPDemand, SkimMAZCosts
-from tm2py.components.network.highway.highway_network import PrepareNetwork
-from tm2py.components.network.transit.transit_assign import TransitAssignment
-from tm2py.components.network.transit.transit_network import PrepareTransitNetwork
-from tm2py.components.network.transit.transit_skim import TransitSkim
-from tm2py.components.post_processor import PostProcessor
 from tm2py.config import Configuration
 from tm2py.emme.manager import EmmeManager
 from tm2py.logger import Logger
 from tm2py.tools import emme_context
 from tm2py.tools import initialize_log
 from tm2py.tools import add_run_log
+from tm2py.zone_system import ZoneSystem
 
 
-# mapping from names referenced in config.run to imported classes
+class ComponentRegistry(Mapping):
+    """Mapping of component names to Component classes which are imported on first use.
+
+    Component modules (and their dependencies) are only imported when the class
+    is accessed, so that a run of a subset of components only pays the import
+    cost of the components it uses.
+
+    Example::
+        registry = ComponentRegistry(
+            {"highway": "tm2py.components.network.highway.highway_assign.HighwayAssignment"}
+        )
+        highway_cls = registry["highway"]
+    """
+
+    def __init__(self, cls_paths: Mapping[str, str]):
+        """Constructor for ComponentRegistry.
+
+        Args:
+            cls_paths: mapping of component names to the full dotted import path
+                of the Component class
+        """
+        self._cls_paths = dict(cls_paths)
+        self._classes: Dict[str, Type[Component]] = {}
+
+    def __getitem__(self, name: str) -> Type[Component]:
+        """Return the Component class for name, importing its module if required."""
+        if name not in self._classes:
+            module_name, cls_name = self._cls_paths[name].rsplit(".", 1)
+            module = importlib.import_module(module_name)
+            self._classes[name] = getattr(module, cls_name)
+        return self._classes[name]
+
+    def __iter__(self):
+        """Iterate over the registered component names (without importing)."""
+        return iter(self._cls_paths)
+
+    def __len__(self):
+        """Number of registered components."""
+        return len(self._cls_paths)
+
+    def path(self, name: str) -> str:
+        """Return the dotted import path of the Component class for name."""
+        return self._cls_paths[name]
+
+
+# mapping from names referenced in config.run to component classes, imported on first use
 # NOTE: component names also listed as literal in tm2py.config for validation
-component_cls_map = {
-    "active_modes": ActiveModesSkim,
-    "create_tod_scenarios": CreateTODScenarios,
-    "prepare_network_highway": PrepareNetwork,
-    "highway": HighwayAssignment,
-    "highway_maz_assign": AssignMAZSPDemand,
-    "highway_maz_skim": SkimMAZCosts,
-    "drive_access_skims": DriveAccessSkims,
-    "prepare_network_transit": PrepareTransitNetwork,
-    "transit_assign": TransitAssignment,
-    "transit_skim": TransitSkim,
-    "air_passenger": AirPassenger,
-    "internal_external": InternalExternal,
-    "truck": CommercialVehicleModel,
-    "household": HouseholdModel,
-    "post_processor":PostProcessor,
-}
+component_cls_map = ComponentRegistry(
+    {
+        "active_modes": "tm2py.components.network.active.active_modes.ActiveModesSkim",
+        "create_tod_scenarios": (
+            "tm2py.components.network.create_tod_scenarios.CreateTODScenarios"
+        ),
+        "prepare_network_highway": (
+            "tm2py.components.network.highway.highway_network.PrepareNetwork"
+        ),
+        "highway": "tm2py.components.network.highway.highway_assign.HighwayAssignment",
+        "highway_maz_assign": (
+            "tm2py.components.network.highway.highway_maz.AssignMAZSPDemand"
+        ),
+        "highway_maz_skim": "tm2py.components.network.highway.highway_maz.SkimMAZCosts",
+        "drive_access_skims": (
+            "tm2py.components.network.highway.drive_access_skims.DriveAccessSkims"
+        ),
+        "prepare_network_transit": (
+            "tm2py.components.network.transit.transit_network.PrepareTransitNetwork"
+        ),
+        "transit_assign": (
+            "tm2py.components.network.transit.transit_assign.TransitAssignment"
+        ),
+        "transit_skim": "tm2py.components.network.transit.transit_skim.TransitSkim",
+        "air_passenger": "tm2py.components.demand.air_passenger.AirPassenger",
+        "internal_external": "tm2py.components.demand.internal_external.InternalExternal",
+        "truck": "tm2py.components.demand.commercial.CommercialVehicleModel",
+        "household": "tm2py.components.demand.household.HouseholdModel",
+        "post_processor": "tm2py.components.post_processor.PostProcessor",
+        "convergence_monitor": (
+            "tm2py.components.convergence_monitor.ConvergenceMonitor"
+        ),
+    }
+)
 
 # pylint: disable=too-many-instance-attributes
 
@@ -90,7 +140,10 @@ class RunController:
             (iteration, name, Component object)
 
     Internal properties:
+        _component_map: mapping of component names to Component objects, created
+            when the component is first queued
         _emme_manager: EmmeManager object, cached on first access
+        _zone_system: ZoneSystem object, cached on first access
         _iteration: current iteration
         _component: current running / last run Component
         _component_name: name of the current / last run component
@@ -102,6 +155,8 @@ class RunController:
         config_file: Union[Collection[Union[str, Path]], str, Path] = None,
         run_dir: Union[Path, str] = None,
         run_components: Collection[str] = component_cls_map.keys(),
+        config: Configuration = None,
+        config_cache_dir: Union[Path, str] = None,
     ):
         """Constructor for RunController class.
 
@@ -111,13 +166,24 @@ class RunController:
             run_dir: Model run directory as a Path object or string. If not provided, defaults
                 to the directory of the first config_file.
             run_components: List of component names to run. Defaults to all components.
+            config: an already validated Configuration to use instead of loading
+                config_file, e.g. as read by Configuration.from_pickle.
+                run_dir must be specified if config_file is not.
+            config_cache_dir: optional, directory to cache the validated Configuration
+                loaded from config_file, see Configuration.load_toml
         """
         if run_dir is None:
+            if config_file is None:
+                raise ValueError("run_dir must be specified if config_file is not")
+            if not isinstance(config_file, (list, tuple)):
+                config_file = [config_file]
             run_dir = Path(os.path.abspath(os.path.dirname(config_file[0])))
 
         self._run_dir = Path(run_dir)
 
-        self.config = Configuration.load_toml(config_file)
+        if config is None:
+            config = Configuration.load_toml(config_file, cache_dir=config_cache_dir)
+        self.config = config
         self.has_emme: bool = emme_context()
         self.top_sheet = None
         self.trace = None
@@ -125,6 +191,7 @@ class RunController:
 
         self._validated_components = set()
         self._emme_manager = None
+        self._zone_system = None
         self._iteration = None
         self._component = None
         self._component_name = None
@@ -137,10 +204,9 @@ class RunController:
             self.runtime_log_file, self.runtime_log_headers, self.runtime_log_col_width
         )
 
-        # mapping from defined names referenced in config to Component objects
-        self._component_map = {
-            k: v(self) for k, v in component_cls_map.items() if k in run_components
-        }
+        # mapping from defined names referenced in config to Component objects,
+        # components are only imported and created when queued
+        self._component_map = {}
 
         self.logger.set_emme_manager(self.emme_manager)
         self._queue_components(run_components=run_components)
@@ -234,6 +300,16 @@ class RunController:
                 self._emme_manager = MagicMock()
         return self._emme_manager
 
+    @property
+    def zone_system(self) -> ZoneSystem:
+        """Cached ZoneSystem of zone sequence lookups, see tm2py.zone_system."""
+        if self._zone_system is None:
+            self._zone_system = ZoneSystem(
+                self.get_abs_path(self.config.scenario.zone_seq_file),
+                self.get_abs_path(self.config.scenario.maz_landuse_file),
+            )
+        return self._zone_system
+
     def get_abs_path(self, rel_path: Union[Path, str]) -> Path:
         """Get the absolute path from the root run directory given a relative path."""
         if not isinstance(rel_path, Path):
@@ -339,6 +415,20 @@ class RunController:
             raise
         self.completed_components.append((iteration, name, component))
 
+    def skip_to_final_components(self):
+        """Remove the remaining global iteration components from the queue.
+
+        Used to stop the global iterations early (e.g. on convergence), the
+        final_components (after end_iteration) remain queued.
+        """
+        final_iteration = self.config.run.end_iteration + 1
+        skipped = [c for c in self._queued_components if c[0] < final_iteration]
+        self._queued_components = deque(
+            c for c in self._queued_components if c[0] >= final_iteration
+        )
+        for iteration, name, _component in skipped:
+            self.logger.detail(f"Skipping iteration {iteration} component {name}")
+
     def _queue_components(self, run_components: Collection[str] = None):
         """Add components per iteration to queue according to input Config.
 
@@ -413,7 +503,10 @@ class RunController:
             iteration (int): iteration to add component to.
             component_name (Component): Component to add to queue.
         """
-        _component = self._component_map[component_name]
+        _component = self._component_map.get(component_name)
+        if _component is None:
+            _component = component_cls_map[component_name](self)
+            self._component_map[component_name] = _component
         if component_name not in self._validated_components:
             _component.validate_inputs()
             self._validated_components.add(component_name)
@@ -548,9 +548,18 @@ class BaseAssignmentLauncher(ABC):
     and kicks off assignment in a subprocess.
     """
 
-    def __init__(self, emmebank: Emmebank, iteration: int):
+    def __init__(self, emmebank: Emmebank, iteration: int, demand_store=None):
+        """Constructor for BaseAssignmentLauncher.
+
+        Args:
+            emmebank (Emmebank): the primary emmebank with the scenarios and matrices
+            iteration (int): global iteration number
+            demand_store (AveragedDemandStore): optional, store of averaged demand to
+                copy demand matrices from instead of reading from the emmebank
+        """
         self._primary_emmebank = emmebank
         self._iteration = iteration
+        self._demand_store = demand_store
 
         self._times = []
         self._scenarios = []
@@ -760,10 +769,13 @@ class BaseAssignmentLauncher(ABC):
         for matrix_list in self._demand_matrices:
             for matrix_id in matrix_list:
                 src_matrix = self._primary_emmebank.matrix(matrix_id)
-                self.__copy_matrix(run_emmebank, src_matrix, ref_scenario_id)
+                data = None
+                if self._demand_store is not None and src_matrix.type == "FULL":
+                    data = self._demand_store.load(src_matrix.name, self._iteration)
+                self.__copy_matrix(run_emmebank, src_matrix, ref_scenario_id, data)
 
     @staticmethod
-    def __copy_matrix(emmebank, src_matrix, scenario_id):
+    def __copy_matrix(emmebank, src_matrix, scenario_id, data=None):
         dst_matrix = emmebank.matrix(src_matrix.name)
         if not dst_matrix:
             ident = emmebank.available_matrix_identifier(src_matrix.type)
@@ -772,6 +784,8 @@ class BaseAssignmentLauncher(ABC):
             dst_matrix.description = src_matrix.description
         if src_matrix.type == "SCALAR":
             dst_matrix.data = src_matrix.data
+        elif data is not None:
+            dst_matrix.set_numpy_data(data, scenario_id)
         else:
             dst_matrix.set_data(src_matrix.get_data(scenario_id), scenario_id)
         return dst_matrix
@@ -10,14 +10,42 @@ the MatrixCache to support easy write from Emmebank without re-reading data
 from disk.
 """
 
-from typing import Dict, List, Optional, Union
+import threading
+from collections import OrderedDict, deque, namedtuple
+from typing import Callable, Collection, Dict, List, Optional, Union
 
 import openmatrix as _omx
+import tables as _tables
+import numpy as np
 from numpy import array as NumpyArray
 from numpy import exp, pad, resize
 
 from tm2py.emme.manager import EmmeMatrix, EmmeScenario
 
+# dtype: data type to write, None to use the data_type of the write call
+# complib, complevel: HDF5 compression filter and level, None for the
+#    openmatrix file default (zlib level 1)
+# chunk_rows: number of matrix rows per HDF5 chunk
+# HDF5 (through PyTables) is not thread-safe and PyTables releases the GIL
+# during I/O, all OMXManager HDF5 calls are serialized with this lock so that
+# the background writer thread of an async_write OMXManager can run while
+# other OMXManagers in the same process read or write
+_HDF5_LOCK = threading.RLock()
+
+OMXStorageProfile = namedtuple(
+    "OMXStorageProfile", "dtype complib complevel chunk_rows"
+)
+
+OMX_STORAGE_PROFILES = {
+    "default": OMXStorageProfile(None, None, None, 1),
+    # quick write and read of single precision data
+    "fast": OMXStorageProfile("float32", "blosc:lz4", 1, 64),
+    # smaller files at moderate write cost
+    "compact": OMXStorageProfile("float32", "blosc:zstd", 3, 256),
+    # full precision and high compression for long term storage
+    "archival": OMXStorageProfile("float64", "blosc:zstd", 5, 256),
+}
+
 
 class MatrixCache:
     """Write through cache of Emme matrix data via Numpy arrays."""
@@ -126,6 +154,19 @@ class OMXManager:
 
     Write from Emmebank or Matrix Cache to OMX file, or read from OMX to Numpy.
     Supports "with" statement.
+
+    With async_write the OMX file is written by a background writer thread which
+    owns the file handle. The write methods snapshot the data (copy the array if
+    not already copied by the mask / growth / type conversion) into a queue and
+    return immediately. The queue is bounded by max_pending_bytes: a write blocks
+    until the pending data fits in the budget. flush() waits for all queued writes,
+    close() flushes and stops the writer thread. Errors in the writer thread are
+    raised in the next write, flush or close call.
+
+    All HDF5 calls of OMXManager objects are serialized by a module lock, as
+    HDF5 is not thread-safe. Other HDF5 access in the same process (e.g. direct
+    use of openmatrix or PyTables) must not run while an async_write export is
+    pending, call flush or close first.
     """
 
     def __init__(
@@ -137,6 +178,10 @@ class OMXManager:
         matrix_cache: MatrixCache = None,
         mask_max_value: float = None,
         growth_factor: float = None,
+        async_write: bool = False,
+        max_pending_bytes: int = None,
+        storage_profile: str = "default",
+        max_cache_bytes: int = None,
     ):  # pylint: disable=R0913
         """The OMXManager constructor.
 
@@ -152,6 +197,17 @@ class OMXManager:
             zero instead ("big to zero" behavior). Defaults to None.
             growth_factor (float, optional): grow the value in each cell by a factor
             (e.g. write out ivt skim in minute*100)
+            async_write (bool, optional): write in a background thread, for "w"
+            and "a" modes. Defaults to False.
+            max_pending_bytes (int, optional): memory budget for the arrays queued
+            for the writer thread, at least one array is always accepted.
+            Defaults to None (no limit).
+            storage_profile (str, optional): name of the OMX_STORAGE_PROFILES for
+            the data type, compression and chunk shape of written matrices.
+            Defaults to "default".
+            max_cache_bytes (int, optional): limit on the size of the full matrices
+            cached by read, least recently used matrices are dropped first, 0 for
+            no caching. Defaults to None (no limit).
         """
         self._file_path = file_path
         self._mode = mode
@@ -159,9 +215,25 @@ class OMXManager:
         self._omx_key = omx_key
         self._mask_max_value = mask_max_value
         self._growth_factor = growth_factor
+        if storage_profile not in OMX_STORAGE_PROFILES:
+            raise ValueError(
+                f"invalid storage_profile: {storage_profile}, "
+                f"must be one of {', '.join(OMX_STORAGE_PROFILES)}"
+            )
+        self._storage_profile = OMX_STORAGE_PROFILES[storage_profile]
         self._omx_file = None
+        self._scratch = {}
         self._emme_matrix_cache = matrix_cache
-        self._read_cache = {}
+        self._read_cache = OrderedDict()
+        self._max_cache_bytes = max_cache_bytes
+        self._cache_bytes = 0
+        self._async_write = async_write and mode in ["a", "w"]
+        self._max_pending_bytes = max_pending_bytes
+        self._queue = deque()
+        self._pending_bytes = 0
+        self._queue_changed = threading.Condition()
+        self._writer_thread = None
+        self._writer_error = None
 
     def _generate_name(self, matrix: EmmeMatrix) -> str:
         if self._omx_key == "ID_NAME":
@@ -174,31 +246,119 @@ class OMXManager:
 
     def open(self):
         """Open the OMX file."""
-        self._omx_file = _omx.open_file(self._file_path, self._mode)
+        with _HDF5_LOCK:
+            self._omx_file = _omx.open_file(self._file_path, self._mode)
+        if self._async_write:
+            self._writer_error = None
+            self._writer_thread = threading.Thread(
+                target=self._write_queued, name="OMXWriter", daemon=True
+            )
+            self._writer_thread.start()
 
     def close(self):
-        """Close the OMX file."""
-        if self._omx_file is not None:
-            self._omx_file.close()
-        self._omx_file = None
-        self._read_cache = {}
+        """Close the OMX file, waiting for all queued writes to complete."""
+        try:
+            if self._writer_thread is not None:
+                self._submit(None, 0)
+                self._writer_thread.join()
+                self._writer_thread = None
+                self._raise_writer_error()
+        finally:
+            if self._omx_file is not None:
+                with _HDF5_LOCK:
+                    self._omx_file.close()
+            self._omx_file = None
+            self._scratch = {}
+            self._read_cache = OrderedDict()
+            self._cache_bytes = 0
+
+    def flush(self):
+        """Wait for all queued writes to complete (no-op if not async_write)."""
+        if self._writer_thread is None:
+            return
+        with self._queue_changed:
+            self._queue_changed.wait_for(
+                lambda: not self._queue or self._writer_error is not None
+            )
+        self._raise_writer_error()
+
+    def _raise_writer_error(self):
+        if self._writer_error is not None:
+            error, self._writer_error = self._writer_error, None
+            raise error
+
+    def _submit(self, task: Optional[Callable], num_bytes: int):
+        """Add write task to the writer thread queue, blocking if over budget.
+
+        Args:
+            task: function to call in the writer thread, None to stop the thread
+            num_bytes: size of the array data referenced by the task
+        """
+        with self._queue_changed:
+            if self._max_pending_bytes is not None:
+                self._queue_changed.wait_for(
+                    lambda: not self._queue
+                    or self._writer_error is not None
+                    or self._pending_bytes + num_bytes <= self._max_pending_bytes
+                )
+            if self._writer_error is not None and task is not None:
+                self._raise_writer_error()
+            self._queue.append((task, num_bytes))
+            self._pending_bytes += num_bytes
+            self._queue_changed.notify_all()
+
+    def _write_queued(self):
+        """Writer thread: run the queued write tasks in order until stopped."""
+        while True:
+            with self._queue_changed:
+                self._queue_changed.wait_for(lambda: self._queue)
+                task, num_bytes = self._queue[0]
+            if task is None:
+                with self._queue_changed:
+                    self._queue.popleft()
+                    self._queue_changed.notify_all()
+                return
+            try:
+                if self._writer_error is None:
+                    task()
+            except Exception as error:  # pylint: disable=W0703
+                self._writer_error = error
+            with self._queue_changed:
+                self._queue.popleft()
+                self._pending_bytes -= num_bytes
+                self._queue_changed.notify_all()
 
     def __enter__(self):
         """Allows for context-based usage using 'with' statement."""
         self.open()
         if self._mode in ["a", "w"] and self._scenario is not None:
-            try:
-                self._omx_file.create_mapping(
-                    "zone_number", self._scenario.zone_numbers
-                )
-            except LookupError:
-                pass
+            self.create_mapping("zone_number", self._scenario.zone_numbers)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Allows for context-based usage using 'with' statement."""
         self.close()
 
+    def create_mapping(self, name: str, zone_numbers: List[int]):
+        """Write zone mapping to OMX file, if not already in the file.
+
+        Args:
+            name: name of the mapping, e.g. "zone_number"
+            zone_numbers: list of zone numbers in matrix order
+        """
+
+        def _create_mapping():
+            try:
+                with _HDF5_LOCK:
+                    self._omx_file.create_mapping(name, zone_numbers)
+            except LookupError:
+                pass
+
+        if self._writer_thread is not None:
+            self._submit(_create_mapping, 0)
+        else:
+            _create_mapping()
+
     def write_matrices(self, matrices: List[Union[EmmeMatrix, str]]):
         """Write the list of emme matrices to OMX file.
 
@@ -278,28 +438,83 @@ class OMXManager:
             numpy_array:: Numpy array
             name: name to use for the OMX key
             attrs: additional attribute key value pairs to write to OMX file
-            data_type: int, float32, float64, etc.
+            data_type: int, float32, float64, etc., overridden by the storage
+                profile dtype (if specified)
         """
         if self._mode not in ["a", "w"]:
             raise Exception(f"{self._file_path}: open in read-only mode")
+        profile = self._storage_profile
+        if profile.dtype is not None:
+            data_type = profile.dtype
         shape = numpy_array.shape
         if len(shape) == 2:
-            chunkshape = (1, shape[0])
+            chunkshape = (min(profile.chunk_rows, shape[0]), shape[1])
         else:
             chunkshape = None
-        if self._mask_max_value:
-            numpy_array[numpy_array > self._mask_max_value] = 0
+        filters = None
+        if profile.complib is not None:
+            filters = _tables.Filters(
+                complevel=profile.complevel, complib=profile.complib, shuffle=True
+            )
+        numpy_array = self._transform(numpy_array, data_type)
+
+        def _create_matrix():
+            with _HDF5_LOCK:
+                self._omx_file.create_matrix(
+                    name,
+                    obj=numpy_array,
+                    chunkshape=chunkshape,
+                    filters=filters,
+                    attrs=attrs,
+                )
+
+        if self._writer_thread is None:
+            _create_matrix()
+        else:
+            # with async_write the transformed array is a snapshot owned by the queue
+            self._submit(_create_matrix, numpy_array.nbytes)
+
+    def _transform(self, numpy_array: NumpyArray, data_type: str) -> NumpyArray:
+        """Apply mask_max_value, growth_factor and data type in one pass.
+
+        The input array is never modified. The result is written to a scratch
+        buffer reused for all arrays of the same shape and type, or, for
+        async_write, to a new array which is owned by the writer queue. If there
+        is no mask, growth or type change the input array is returned as is
+        (for immediate write only).
+        """
+        dtype = np.dtype(data_type)
+        if self._writer_thread is None:
+            if (
+                not self._mask_max_value
+                and not self._growth_factor
+                and numpy_array.dtype == dtype
+            ):
+                return numpy_array
+            out = self._scratch_buffer(numpy_array.shape, dtype)
+        else:
+            out = np.empty(numpy_array.shape, dtype)
         if self._growth_factor:
-            numpy_array = numpy_array * self._growth_factor
-        numpy_array = numpy_array.astype(dtype=data_type, copy=False)
-        self._omx_file.create_matrix(
-            name, obj=numpy_array, chunkshape=chunkshape, attrs=attrs
-        )
+            np.multiply(numpy_array, self._growth_factor, out=out, casting="unsafe")
+        else:
+            np.copyto(out, numpy_array, casting="unsafe")
+        if self._mask_max_value:
+            # "big to zero", values are compared before growth
+            is_big = self._scratch_buffer(numpy_array.shape, np.dtype(bool))
+            np.greater(numpy_array, self._mask_max_value, out=is_big)
+            np.copyto(out, 0, where=is_big)
+        return out
+
+    def _scratch_buffer(self, shape, dtype) -> NumpyArray:
+        key = (shape, dtype.str)
+        if key not in self._scratch:
+            self._scratch[key] = np.empty(shape, dtype)
+        return self._scratch[key]
 
     def read(self, name: str) -> NumpyArray:
         """Read OMX data as numpy array (standard interface).
 
-        Caches matrix data (arrays) already read from disk.
+        Caches matrix data (arrays) already read from disk, up to max_cache_bytes.
 
         Args:
             name: name of OMX matrix
@@ -308,11 +523,136 @@ class OMXManager:
             Numpy array from OMX file
         """
         if name in self._read_cache:
+            self._read_cache.move_to_end(name)
             return self._read_cache[name]
-        data = self._omx_file[name].read()
-        self._read_cache[name] = data
+        self.flush()
+        with _HDF5_LOCK:
+            data = self._omx_file[name].read()
+        self._add_to_cache(name, data)
         return data
 
+    def _add_to_cache(self, name: str, data: NumpyArray):
+        if self._max_cache_bytes is not None and data.nbytes > self._max_cache_bytes:
+            return
+        self._read_cache[name] = data
+        self._cache_bytes += data.nbytes
+        if self._max_cache_bytes is not None:
+            while self._cache_bytes > self._max_cache_bytes:
+                _name, dropped = self._read_cache.popitem(last=False)
+                self._cache_bytes -= dropped.nbytes
+
+    def read_rows(self, name: str, start: int, stop: int = None) -> NumpyArray:
+        """Read the rows from start to stop (exclusive) of an OMX matrix.
+
+        Only the requested rows are read from disk, the result is not cached.
+
+        Args:
+            name: name of OMX matrix
+            start: index of first row
+            stop: index after the last row, defaults to start + 1
+
+        Returns:
+            Numpy array of shape (stop - start, number of columns)
+        """
+        if stop is None:
+            stop = start + 1
+        return self.read_many([name], rows=slice(start, stop))[name]
+
+    def read_subset(
+        self,
+        name: str,
+        rows: Union[slice, Collection[int]] = None,
+        cols: Union[slice, Collection[int]] = None,
+    ) -> NumpyArray:
+        """Read a subset of the rows and columns of an OMX matrix.
+
+        See read_many.
+
+        Args:
+            name: name of OMX matrix
+            rows: slice or list of row indices, defaults to all rows
+            cols: slice or list of column indices, defaults to all columns
+
+        Returns:
+            Numpy array of shape (number of rows, number of columns)
+        """
+        return self.read_many([name], rows, cols)[name]
+
+    def read_many(
+        self,
+        names: Collection[str],
+        rows: Union[slice, Collection[int]] = None,
+        cols: Union[slice, Collection[int]] = None,
+        block_rows: int = 256,
+    ) -> Dict[str, NumpyArray]:
+        """Read a subset of rows and columns from several OMX matrices.
+
+        The row and column indices are processed once and shared by all matrices.
+        Rows are read from disk in blocks of up to block_rows (as HDF5 hyperslabs
+        where the rows are contiguous), and the columns are selected from each block,
+        so that the full matrix is never in memory. If rows and cols are both None
+        the full matrices are read (and cached) as for read.
+
+        Indices are positions in the matrix, use zone_index to get the positions
+        of zone numbers. Subsets are not cached.
+
+        Args:
+            names: names of OMX matrices
+            rows: slice or list of row indices (in any order), defaults to all rows
+            cols: slice or list of column indices, defaults to all columns
+            block_rows: maximum number of rows to read at once
+
+        Returns:
+            Dictionary of matrix name to Numpy array
+        """
+        if rows is None and cols is None:
+            return {name: self.read(name) for name in names}
+        self.flush()
+        with _HDF5_LOCK:
+            num_rows, num_cols = self._omx_file.shape()
+        row_index = np.arange(num_rows)[rows if rows is not None else slice(None)]
+        unique_rows, row_order = np.unique(row_index, return_inverse=True)
+        if np.array_equal(row_index, unique_rows):
+            row_order = None
+        col_index = slice(None) if cols is None else np.arange(num_cols)[cols]
+        # contiguous row blocks are read as one hyperslab
+        blocks = []
+        for start in range(0, len(unique_rows), block_rows):
+            block = unique_rows[start : start + block_rows]
+            if block[-1] - block[0] + 1 == len(block):
+                blocks.append(slice(int(block[0]), int(block[-1]) + 1))
+            else:
+                blocks.append(block.tolist())
+        result = {}
+        for name in names:
+            with _HDF5_LOCK:
+                node = self._omx_file[name]
+                num_out_cols = num_cols if cols is None else len(col_index)
+                data = np.empty((len(unique_rows), num_out_cols), dtype=node.dtype)
+                position = 0
+                for block in blocks:
+                    block_data = node[block, :][:, col_index]
+                    data[position : position + len(block_data)] = block_data
+                    position += len(block_data)
+            result[name] = data if row_order is None else data[row_order]
+        return result
+
+    def zone_index(
+        self, zone_numbers: Collection[int], mapping: str = "zone_number"
+    ) -> NumpyArray:
+        """Matrix positions (row / column indices) of zone numbers.
+
+        Args:
+            zone_numbers: list of zone numbers
+            mapping: name of the zone mapping in the OMX file
+
+        Returns:
+            Numpy array of indices, for use with read_many
+        """
+        with _HDF5_LOCK:
+            lookup = self._omx_file.mapping(mapping)
+        return np.array([lookup[zone] for zone in zone_numbers], dtype=int)
+
     def read_hdf5(self, path: str) -> NumpyArray:
         """Read data directly from PyTables interface.
 
@@ -324,4 +664,6 @@ class OMXManager:
         Returns:
             Numpy array from OMX file
         """
-        return self._omx_file.get_node(path).read()
+        self.flush()
+        with _HDF5_LOCK:
+            return self._omx_file.get_node(path).read()
@@ -1,12 +1,17 @@
 """Module for Emme network calculations.
 
 Contains NetworkCalculator class to generate Emme format specifications for
-the Network calculator.
+the Network calculator, NetworkSnapshotCache for shared read access to a
+scenario network, and columnar (array) access to transit attribute values.
 """
 
 import heapq
+import time as _time
 from collections import defaultdict as _defaultdict
-from typing import Any, Callable, Dict, List, Union
+from typing import Any, Callable, Dict, List, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
 
 from inro.emme.network.link import Link as EmmeNetworkLink
 from inro.emme.network.node import Node as EmmeNetworkNode
@@ -14,6 +19,7 @@ from inro.emme.network.node import Node as EmmeNetworkNode
 import tm2py.emme.manager as _manager
 
 EmmeScenario = _manager.EmmeScenario
+EmmeNetwork = _manager.EmmeNetwork
 EmmeNetworkCalcSpecification = Dict[str, Union[str, Dict[str, str]]]
 
 _INF = 1e400
@@ -185,3 +191,332 @@ def find_path(
 
 class NoPathFound(Exception):
     pass
+
+
+class ReadOnlyNetwork:
+    """Read-only view of a shared Emme network snapshot.
+
+    Passes all read access through to the wrapped Emme Network, and raises
+    AttributeError for the network methods which change the network
+    (create_*, delete_*, set_*, split_*, merge_*). Element attribute values
+    (e.g. line.headway) are not protected and must not be modified, as the
+    same network is shared by all users of the NetworkSnapshotCache.
+    """
+
+    _MUTATOR_PREFIXES = ("create_", "delete_", "set_", "split_", "merge_")
+
+    def __init__(self, network: EmmeNetwork):
+        """Constructor for ReadOnlyNetwork.
+
+        Args:
+            network: the Emme Network object to wrap
+        """
+        self._network = network
+
+    def __getattr__(self, name: str):
+        """Return network attribute, raise AttributeError for network modifications."""
+        if name.startswith(self._MUTATOR_PREFIXES):
+            raise AttributeError(f"network snapshot is read-only, {name} not allowed")
+        return getattr(self._network, name)
+
+
+class NetworkSnapshotCache:
+    """Shared partial network snapshot of a scenario for repeated reads.
+
+    Loads the partial network for the union of the required domains once, and
+    copies attribute values from the scenario only the first time they are
+    requested, or after they have been marked as changed with invalidate().
+    Replaces repeated scenario.get_network() calls, which load the full network
+    with all attributes, when several exports read the same scenario.
+
+    The network is returned as a ReadOnlyNetwork view, use
+    EmmeManagerLight.get_network for a network which will be modified.
+    """
+
+    _ELEMENT_TOTALS = {
+        "NODE": ["centroids", "regular_nodes"],
+        "LINK": ["links"],
+        "TURN": ["turns"],
+        "TRANSIT_LINE": ["transit_lines"],
+        "TRANSIT_SEGMENT": ["transit_segments"],
+    }
+
+    def __init__(
+        self,
+        emme_manager,
+        scenario: EmmeScenario,
+        domains: List[str] = None,
+        logger=None,
+    ):
+        """Constructor for NetworkSnapshotCache.
+
+        Args:
+            emme_manager: EmmeManager or EmmeManagerLight object
+            scenario: Emme scenario object to load the network from
+            domains: Optional, network domains to load with the first request,
+                avoids reloading the network if later requests use more domains
+            logger: Optional, Logger for debug messages with load time and memory
+        """
+        self._emme_manager = emme_manager
+        self._scenario = scenario
+        self._domains = set(domains or [])
+        self._logger = logger
+        self._network = None
+        self._loaded_attributes = dict((d, set()) for d in self._ELEMENT_TOTALS)
+
+    def get(self, attributes: Dict[str, List[str]]) -> ReadOnlyNetwork:
+        """Return the network snapshot with the attributes values from the scenario.
+
+        Args:
+            attributes: dictionary of domain names to lists of attribute names
+
+        Returns:
+            ReadOnlyNetwork view of the shared Emme network object.
+        """
+        start_time = _time.time()
+        if self._network is None or not set(attributes).issubset(self._domains):
+            self._load(set(attributes))
+        new_attributes = {}
+        for domain, names in attributes.items():
+            loaded = self._loaded_attributes[domain]
+            new_names = [name for name in names if name not in loaded]
+            if new_names:
+                new_attributes[domain] = new_names
+        self._copy(new_attributes)
+        self._log(
+            f"network snapshot {self._scenario.id}: copied "
+            f"{sum(len(names) for names in new_attributes.values())} attributes "
+            f"in {_time.time() - start_time:.2f}s"
+        )
+        return ReadOnlyNetwork(self._network)
+
+    def invalidate(self, attributes: Dict[str, List[str]] = None):
+        """Mark attributes as changed in the scenario, values are copied on next get().
+
+        Args:
+            attributes: Optional, dictionary of domain names to lists of attribute
+                names, all attributes if not specified
+        """
+        if attributes is None:
+            for loaded in self._loaded_attributes.values():
+                loaded.clear()
+            return
+        for domain, names in attributes.items():
+            self._loaded_attributes[domain].difference_update(names)
+
+    def clear(self):
+        """Release the network snapshot."""
+        self._network = None
+        self.invalidate()
+
+    @property
+    def memory_estimate(self) -> int:
+        """Approximate memory use in bytes of the loaded attribute values."""
+        if self._network is None:
+            return 0
+        totals = self._network.element_totals
+        num_values = 0
+        for domain, loaded in self._loaded_attributes.items():
+            if domain in self._domains:
+                count = sum(totals.get(key, 0) for key in self._ELEMENT_TOTALS[domain])
+                num_values += count * max(len(loaded), 1)
+        return 8 * num_values
+
+    def _load(self, domains: Set[str]):
+        """Load partial network for domains, reloading previously copied attributes."""
+        start_time = _time.time()
+        reload_attributes = dict(
+            (d, sorted(names)) for d, names in self._loaded_attributes.items() if names
+        )
+        self._domains.update(domains)
+        self._network = self._scenario.get_partial_network(
+            list(self._domains), include_attributes=False
+        )
+        self.invalidate()
+        self._copy(reload_attributes)
+        self._log(
+            f"network snapshot {self._scenario.id}: loaded {sorted(self._domains)} "
+            f"in {_time.time() - start_time:.2f}s"
+        )
+
+    def _copy(self, attributes: Dict[str, List[str]]):
+        """Copy attribute values from scenario to network, adding missing attributes."""
+        if not attributes:
+            return
+        for domain, names in attributes.items():
+            existing = set(self._network.attributes(domain))
+            for name in names:
+                if name not in existing:
+                    # attribute created in the scenario after the network was loaded
+                    self._network.create_attribute(domain, name)
+        self._emme_manager.copy_attribute_values(
+            self._scenario, self._network, attributes
+        )
+        for domain, names in attributes.items():
+            self._loaded_attributes[domain].update(names)
+
+    def _log(self, text: str):
+        if self._logger is not None:
+            self._logger.debug(
+                f"{text}, approx. {self.memory_estimate / 2**20:.1f} MB attribute values"
+            )
+
+
+def get_attribute_arrays(
+    source, domain: str, attributes: List[str]
+) -> Tuple[Any, Dict[str, np.ndarray]]:
+    """Read attribute values in bulk as numpy arrays.
+
+    Wrapper for get_attribute_values on an Emme scenario or network.
+
+    Args:
+        source: Emme scenario or network object
+        domain: network domain, one of NODE, LINK, TURN, TRANSIT_LINE, TRANSIT_SEGMENT
+        attributes: list of attribute names
+
+    Returns:
+        The index of element IDs to array position (see Emme API Reference for
+        get_attribute_values) and a dictionary of attribute name to values array.
+    """
+    values = source.get_attribute_values(domain, list(attributes))
+    arrays = dict(
+        (name, np.asarray(array)) for name, array in zip(attributes, values[1:])
+    )
+    return values[0], arrays
+
+
+def set_attribute_arrays(
+    target, domain: str, index: Any, arrays: Dict[str, np.ndarray]
+):
+    """Write attribute values in bulk from arrays.
+
+    Wrapper for set_attribute_values on an Emme scenario or network, the
+    reverse of get_attribute_arrays.
+
+    Args:
+        target: Emme scenario or network object
+        domain: network domain, one of NODE, LINK, TURN, TRANSIT_LINE, TRANSIT_SEGMENT
+        index: the index returned by get_attribute_arrays for the same domain
+        arrays: dictionary of attribute name to values array in index order
+    """
+    values = [index] + [np.asarray(array).tolist() for array in arrays.values()]
+    target.set_attribute_values(domain, list(arrays), values)
+
+
+def transit_tables(
+    scenario: EmmeScenario,
+    network: EmmeNetwork,
+    line_attributes: List[str],
+    segment_attributes: List[str],
+    link_attributes: List[str] = None,
+    include_hidden: bool = True,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Columnar tables of the transit lines and segments with attribute values.
+
+    The network structure (IDs, modes, vehicles and segment nodes) is read from the
+    network in one pass, without accessing any element attributes, and the attribute
+    values are read from the scenario in bulk with get_attribute_values. The network
+    only requires the TRANSIT_LINE and TRANSIT_SEGMENT domains, with no attributes.
+
+    Args:
+        scenario: Emme scenario to read the attribute values from
+        network: Emme network (or ReadOnlyNetwork) of the scenario
+        line_attributes: list of transit line attribute names
+        segment_attributes: list of transit segment attribute names
+        link_attributes: optional, list of link attribute names, for the link of
+            each segment (NaN for the hidden segment)
+        include_hidden: include the hidden last segment of each line
+
+    Returns:
+        DataFrame of lines, with columns line_id, mode, mode_description,
+        auto_equivalent, seated_capacity, total_capacity, num_segments and
+        the line_attributes.
+        DataFrame of segments ordered by line and itinerary, with columns
+        line_index (row position in the lines table), segment_id, i_node, j_node
+        (None for the hidden segment), the segment_attributes and link_attributes.
+    """
+    line_index, line_values = get_attribute_arrays(
+        scenario, "TRANSIT_LINE", line_attributes
+    )
+    segment_index, segment_values = get_attribute_arrays(
+        scenario, "TRANSIT_SEGMENT", segment_attributes
+    )
+    line_columns = _defaultdict(list)
+    segment_columns = _defaultdict(list)
+    line_positions, segment_positions = [], []
+    for line in network.transit_lines():
+        segments = list(line.segments(include_hidden=include_hidden))
+        vehicle = line.vehicle
+        line_columns["line_id"].append(line.id)
+        line_columns["mode"].append(line.mode.id)
+        line_columns["mode_description"].append(line.mode.description)
+        line_columns["auto_equivalent"].append(vehicle.auto_equivalent)
+        line_columns["seated_capacity"].append(vehicle.seated_capacity)
+        line_columns["total_capacity"].append(vehicle.total_capacity)
+        line_columns["num_segments"].append(len(segments))
+        line_positions.append(line_index[line.id])
+        # the hidden segment is last in the itinerary
+        segment_positions.extend(list(segment_index[line.id])[: len(segments)])
+        for segment in segments:
+            j_node = segment.j_node
+            segment_columns["segment_id"].append(segment.id)
+            segment_columns["i_node"].append(segment.i_node.id)
+            segment_columns["j_node"].append(j_node.id if j_node else None)
+
+    lines = pd.DataFrame(line_columns, columns=_LINE_COLUMNS)
+    line_positions = np.asarray(line_positions, dtype=np.int64)
+    for name in line_attributes:
+        lines[name] = line_values[name][line_positions]
+
+    # object dtype keeps integer node IDs with None for the hidden segment
+    segment_columns["j_node"] = np.array(segment_columns["j_node"], dtype=object)
+    segments = pd.DataFrame(segment_columns, columns=_SEGMENT_COLUMNS)
+    segments.insert(
+        0, "line_index", np.repeat(np.arange(len(lines)), lines["num_segments"])
+    )
+    segment_positions = np.asarray(segment_positions, dtype=np.int64)
+    for name in segment_attributes:
+        segments[name] = segment_values[name][segment_positions]
+    if link_attributes:
+        link_index, link_values = get_attribute_arrays(
+            scenario, "LINK", link_attributes
+        )
+        link_positions = np.array(
+            [
+                link_index[i_node][j_node] if j_node is not None else -1
+                for i_node, j_node in zip(segments["i_node"], segments["j_node"])
+            ],
+            dtype=np.int64,
+        )
+        for name in link_attributes:
+            values = link_values[name].astype(float)[link_positions]
+            segments[name] = np.where(link_positions >= 0, values, np.nan)
+    return lines, segments
+
+
+def sum_by_line(lines: pd.DataFrame, values: np.ndarray) -> np.ndarray:
+    """Sum segment values by line for the tables from transit_tables.
+
+    Args:
+        lines: lines DataFrame from transit_tables
+        values: array of segment values in the order of the segments DataFrame
+
+    Returns:
+        Array of the sum of values by line.
+    """
+    if len(lines) == 0:
+        return np.zeros(0)
+    starts = np.concatenate([[0], np.cumsum(lines["num_segments"].to_numpy())[:-1]])
+    return np.add.reduceat(np.asarray(values, dtype=float), starts)
+
+
+_LINE_COLUMNS = [
+    "line_id",
+    "mode",
+    "mode_description",
+    "auto_equivalent",
+    "seated_capacity",
+    "total_capacity",
+    "num_segments",
+]
+_SEGMENT_COLUMNS = ["segment_id", "i_node", "j_node"]
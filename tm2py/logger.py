@@ -24,11 +24,17 @@ FATAL: severe problem requiring operation to stop immediately.
 
 from __future__ import annotations
 
+import atexit
 import functools
 import os
+import queue
+import re
 import socket
+import threading
+import time
 import traceback as _traceback
 from abc import abstractmethod
+from collections import deque
 from contextlib import contextmanager as _context
 from datetime import datetime
 from pprint import pformat
@@ -46,6 +52,12 @@ LogLevel = Literal[
 ]
 LEVELS_STR_TO_INT = dict((k, i) for i, k in enumerate(get_args(LogLevel)))
 LEVELS_INT_TO_STR = dict((i, k) for i, k in enumerate(get_args(LogLevel)))
+# messages at or above this level are always logged and flush the file buffers
+_FLUSH_LEVEL = LEVELS_STR_TO_INT["ERROR"]
+# only messages at or below this level are aggregated when repeated
+_SUPPRESS_LEVEL = LEVELS_STR_TO_INT["DEBUG"]
+# numbers are masked out when comparing messages for similarity
+_NUMBER_PATTERN = re.compile(r"[-+]?\d+(\.\d*)?([eE][-+]?\d+)?")
 
 # pylint: disable=too-many-instance-attributes
 
@@ -53,10 +65,23 @@ LEVELS_INT_TO_STR = dict((i, k) for i, k in enumerate(get_args(LogLevel)))
 class BaseLogger:
     "Base class for logging. Not to be constructed directly."
 
-    def __init__(self, log_formatters, log_cache_file):
+    def __init__(
+        self,
+        log_formatters,
+        log_cache_file,
+        log_cache_size: int = None,
+        repeated_message_limit: int = None,
+    ):
         self._indentation = 0
-        self._log_cache = LogCache(log_cache_file)
+        self._log_cache = LogCache(log_cache_file, log_cache_size)
         self._log_formatters = log_formatters + [self._log_cache]
+        # consecutive similar messages beyond this limit are counted, not logged
+        self._repeated_message_limit = repeated_message_limit
+        self._repeated_key = None
+        self._repeated_count = 0
+        self._repeated_last = None
+        # log may be called from the Emme logbook and OMX writer threads
+        self._repeated_lock = threading.Lock()
 
         # these will be set later via set_emme_manager()
         self._emme_manager = None
@@ -75,24 +100,104 @@ class BaseLogger:
         """
         Destructor for logger object
         """
-        if self._log_formatters:
+        self.close()
+
+    def close(self):
+        """Report any suppressed messages, then flush and close all log files."""
+        if getattr(self, "_log_formatters", None):
+            self._log_suppressed()
             for log_formatter in self._log_formatters:
                 if hasattr(log_formatter, "close"):
                     log_formatter.close()
+            self._log_formatters = []
+
+    def flush(self):
+        """Write out any buffered log messages to the log files."""
+        self._log_suppressed()
+        for log_formatter in self._log_formatters:
+            if hasattr(log_formatter, "flush"):
+                log_formatter.flush()
 
     def log(self, text: str, level: LogLevel = "INFO", indent: bool = True):
         """Log text to file and display depending upon log level and config.
 
+        If config.logging.repeated_message_limit is set, consecutive DEBUG and
+        TRACE messages which only differ by their numbers (e.g. node IDs) are
+        aggregated once the limit is reached, with a single "N similar messages
+        suppressed" message recorded when the sequence ends. The suppressed
+        messages are still kept in the log cache for the log_on_error file.
+        ERROR and FATAL messages flush all buffered log files.
+
         Args:
             text (str): text to log
             level (str): logging level
             indent (bool): if true indent text based on the number of open contexts
         """
-        timestamp = datetime.now().strftime("%d-%b-%Y (%H:%M:%S) ")
-        for log_formatter in self._log_formatters:
-            log_formatter.log(text, LEVELS_STR_TO_INT[level], indent, timestamp)
+        level_int = LEVELS_STR_TO_INT[level]
+        if self._repeated_message_limit is not None:
+            key = None
+            if level_int <= _SUPPRESS_LEVEL:
+                key = (level_int, _NUMBER_PATTERN.sub("#", text))
+            suppress, suppressed = False, None
+            with self._repeated_lock:
+                if key is not None and key == self._repeated_key:
+                    self._repeated_count += 1
+                    if self._repeated_count > self._repeated_message_limit:
+                        self._repeated_last = (text, level, indent)
+                        suppress = True
+                else:
+                    suppressed = self._pop_suppressed()
+                    self._repeated_key = key
+                    self._repeated_count = 1
+            if suppressed is not None:
+                self._write(*suppressed, formatters=self._file_formatters)
+            if suppress:
+                self._write(text, level_int, indent, formatters=[self._log_cache])
+                return
+        self._write(text, level_int, indent)
         if self._use_emme_logbook:
             self._emme_manager.logbook_write(text)
+        if level_int >= _FLUSH_LEVEL:
+            self.flush()
+
+    def _write(self, text: str, level: int, indent: bool, formatters=None):
+        timestamp = datetime.now().strftime("%d-%b-%Y (%H:%M:%S) ")
+        if formatters is None:
+            formatters = self._log_formatters
+        for log_formatter in formatters:
+            log_formatter.log(text, level, indent, timestamp)
+
+    @property
+    def _file_formatters(self):
+        """The log formatters other than the log cache."""
+        return [f for f in self._log_formatters if f is not self._log_cache]
+
+    def _pop_suppressed(self):
+        """Reset the similar message count, return any suppressed count message.
+
+        Must be called with the _repeated_lock held.
+        """
+        num_suppressed = self._repeated_count - (self._repeated_message_limit or 0)
+        last = self._repeated_last
+        self._repeated_key = None
+        self._repeated_count = 0
+        self._repeated_last = None
+        if last is None or num_suppressed <= 0:
+            return None
+        text, level, indent = last
+        return (
+            f"{num_suppressed} similar messages suppressed, last: {text}",
+            LEVELS_STR_TO_INT[level],
+            indent,
+        )
+
+    def _log_suppressed(self):
+        """Record the count (and last message) of any suppressed similar messages."""
+        with self._repeated_lock:
+            suppressed = self._pop_suppressed()
+        if suppressed is not None:
+            # the log cache already has the suppressed messages
+            self._write(*suppressed, formatters=self._file_formatters)
 
     def trace(self, text: str, indent: bool = False):
         """Log text with level=TRACE.
@@ -327,23 +432,34 @@ class Logger(BaseLogger):
             ((i, c), LEVELS_STR_TO_INT[l]) for i, c, l in iter_component_level
         )
         display_logger = LogDisplay(LEVELS_STR_TO_INT[log_config.display_level])
+        file_writer_args = {
+            "buffered": log_config.buffered_file_writes,
+            "flush_interval": log_config.flush_interval,
+            "flush_size": log_config.flush_size,
+        }
         run_log_formatter = LogFile(
             LEVELS_STR_TO_INT[log_config.run_file_level],
             os.path.join(controller.run_dir, log_config.run_file_path),
+            **file_writer_args,
         )
         standard_log_formatter = LogFileLevelOverride(
             LEVELS_STR_TO_INT[log_config.log_file_level],
             os.path.join(controller.run_dir, log_config.log_file_path),
             iter_component_level,
             controller,
+            **file_writer_args,
         )
         log_formatters = [display_logger, run_log_formatter, standard_log_formatter]
         log_cache_file = os.path.join(
             controller.run_dir, log_config.log_on_error_file_path
         )
-        # set this latter via setEmmeManager()
-        emme_manager = None
-        super().__init__(log_formatters, log_cache_file)
+        # emme manager is set later via set_emme_manager()
+        super().__init__(
+            log_formatters,
+            log_cache_file,
+            log_config.log_cache_size,
+            log_config.repeated_message_limit,
+        )
 
         self._slack_notifier = SlackNotifier(self)
 
@@ -375,7 +491,8 @@ class ProcessLogger(BaseLogger):
         """
         run_log_formatter = LogFile(LEVELS_STR_TO_INT["INFO"], run_log_file_path)
         log_formatters = [run_log_formatter]
-        super().__init__(log_formatters, log_on_error_file_path, emme_manager)
+        super().__init__(log_formatters, log_on_error_file_path)
+        self._emme_manager = emme_manager
 
 
 class LogFormatter:
@@ -456,25 +573,50 @@ class LogFormatter:
 class LogFile(LogFormatter):
     """Format and write log text to file.
 
+    If buffered, the formatted text is passed to a background thread via a queue
+    and written to file in batches, with the file flushed every flush_size messages
+    or flush_interval seconds (whichever comes first), as well as on flush() and
+    close(). Otherwise each message is written and flushed immediately.
+
     Properties:
         - level: the log level as an int
         - file_path: the absolute file path to write to
     """
 
-    def __init__(self, level: int, file_path: str):
+    def __init__(
+        self,
+        level: int,
+        file_path: str,
+        buffered: bool = False,
+        flush_interval: float = 1.0,
+        flush_size: int = 1000,
+    ):
         """Constructor for LogFile object.
 
         Args:
             level (int): the log level as an int.
             file_path (str): the absolute file path to write to.
+            buffered (bool): if True write to file from a background thread
+            flush_interval (float): maximum time in seconds between file flushes
+                if buffered
+            flush_size (int): maximum number of messages between file flushes
+                if buffered
         """
         super().__init__(level)
         self.file_path = file_path
         self.log_file = None
+        self._buffered = buffered
+        self._writer = None
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
 
     def open(self):
         """Open the log file for writing."""
         self.log_file = open(self.file_path, "w", encoding="utf8")
+        if self._buffered:
+            self._writer = _BufferedFileWriter(
+                self.log_file, self._flush_interval, self._flush_size
+            )
 
     def log(self, text: str, level: int, indent: bool, timestamp: Union[str, None]):
         """Log text to file and display depending upon log level and config.
@@ -489,13 +631,102 @@ class LogFile(LogFormatter):
         """
         if level >= self.level and self.log_file is not None:
             text = self._format_text(text, level, indent, timestamp)
-            self.log_file.write(f"{text}\n")
+            if self._writer is not None:
+                self._writer.write(f"{text}\n")
+            else:
+                self.log_file.write(f"{text}\n")
+                self.log_file.flush()
+
+    def flush(self):
+        """Write all queued messages and flush the log file."""
+        if self._writer is not None:
+            self._writer.flush()
+        elif self.log_file is not None:
             self.log_file.flush()
 
     def close(self):
         """Close the open log file."""
-        self.log_file.close()
-        self.log_file = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+class _BufferedFileWriter:
+    """Write text to an open file from a background thread in batches.
+
+    Properties:
+        - file: the open file object to write to
+        - flush_interval: maximum time in seconds between file flushes
+        - flush_size: maximum number of messages between file flushes
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, file, flush_interval: float, flush_size: int):
+        """Constructor for _BufferedFileWriter object, starts the writer thread.
+
+        Args:
+            file: the open file object to write to
+            flush_interval (float): maximum time in seconds between file flushes
+            flush_size (int): maximum number of messages between file flushes
+        """
+        self.file = file
+        self.flush_interval = flush_interval
+        self.flush_size = max(flush_size, 1)
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"log writer {file.name}", daemon=True
+        )
+        self._thread.start()
+        # daemon thread is stopped on interpreter exit, close first to write remainder
+        atexit.register(self.close)
+
+    def write(self, text: str):
+        """Queue text to be written to file."""
+        self._queue.put(text)
+
+    def flush(self):
+        """Block until all text queued so far is written and the file is flushed."""
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """Write and flush all queued text and stop the writer thread."""
+        atexit.unregister(self.close)
+        if self._thread.is_alive():
+            self._queue.put(self._CLOSE)
+            self._thread.join()
+
+    def _run(self):
+        num_pending = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(last_flush + self.flush_interval - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout if num_pending else None)
+            except queue.Empty:
+                item = None
+            if isinstance(item, str):
+                self.file.write(item)
+                num_pending += 1
+                if (
+                    num_pending < self.flush_size
+                    and time.monotonic() - last_flush < self.flush_interval
+                ):
+                    continue
+            self.file.flush()
+            num_pending = 0
+            last_flush = time.monotonic()
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is self._CLOSE:
+                return
 
 
 class LogFileLevelOverride(LogFile):
@@ -508,7 +739,7 @@ class LogFileLevelOverride(LogFile):
         - controller: TODO
     """
 
-    def __init__(self, level, file_path, iter_component_level, controller):
+    def __init__(self, level, file_path, iter_component_level, controller, **kwargs):
         """Constructor for LogFileLevelOverride object.
 
         Args:
@@ -516,8 +747,9 @@ class LogFileLevelOverride(LogFile):
             file_path (_type_): TODO
             iter_component_level (_type_): TODO
             controller (_type_): TODO
+            kwargs: buffered file writer arguments, see LogFile
         """
-        super().__init__(level, file_path)
+        super().__init__(level, file_path, **kwargs)
         self.iter_component_level = iter_component_level
         self.controller = controller
 
@@ -550,21 +782,29 @@ class LogDisplay(LogFormatter):
 
 
 class LogCache(LogFormatter):
-    """Caches all messages for later recording in on error logfile.
+    """Caches recent messages for later recording in on error logfile.
+
+    The cache is a ring buffer: if max_size is set only the most recent
+    max_size messages are kept, and the number of dropped messages is
+    recorded at the top of the written file.
 
     Properties:
         - file_path: the absolute file path to write to
+        - max_size: maximum number of messages to keep, None for no limit
     """
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, max_size: int = None):
         """Constructor for LogCache object.
 
         Args:
             file_path (str): the absolute file path to write to.
+            max_size (int): maximum number of messages to keep, None for no limit
         """
         super().__init__(level=0)
         self.file_path = file_path
-        self._msg_cache = []
+        self.max_size = max_size
+        self._msg_cache = deque(maxlen=max_size)
+        self._num_dropped = 0
 
     def open(self):
         """Initialize log file (remove)."""
@@ -580,6 +820,8 @@ class LogCache(LogFormatter):
             indent (bool): if true indent text based on the number of open contexts
             timestamp (str): formatted datetime as a string or None
         """
+        if len(self._msg_cache) == self.max_size:
+            self._num_dropped += 1
         self._msg_cache.append(
             (level, self._format_text(text, level, indent, timestamp))
         )
@@ -587,13 +829,16 @@ class LogCache(LogFormatter):
     def write_cache(self):
         """Write all cached messages."""
         with open(self.file_path, "w", encoding="utf8") as file:
+            if self._num_dropped:
+                file.write(f"{self._num_dropped} earlier messages dropped from cache\n")
             for level, text in self._msg_cache:
                 file.write(f"{LEVELS_INT_TO_STR[level]:6} {text}\n")
         self.clear()
 
     def clear(self):
         """Clear message cache."""
-        self._msg_cache = []
+        self._msg_cache.clear()
+        self._num_dropped = 0
 
 
 # pylint: disable=too-few-public-methods
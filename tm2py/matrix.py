@@ -1,6 +1,8 @@
 """Module with helpful matrix helper functions."""
 
-from typing import Collection, Dict, Mapping, Optional, Union
+import os
+import re
+from typing import Collection, Dict, List, Mapping, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -88,3 +90,137 @@ def redim_matrix(matrix: NumpyArray, num_zones: int) -> NumpyArray:
         )
 
     return matrix
+
+
+def msa_step_size(iteration: int, step_sizes: Collection[float] = ()) -> float:
+    """Weight of the new matrix when averaging for the global iteration.
+
+    Args:
+        iteration: global iteration number, no averaging (1.0) for iteration 1 or less
+        step_sizes: optional step sizes by iteration, starting from iteration 1,
+            iterations beyond the list use the Method of Successive Averages (MSA)
+
+    Returns:
+        step size between 0 and 1
+    """
+    if iteration <= 1:
+        return 1.0
+    if iteration <= len(step_sizes):
+        return step_sizes[iteration - 1]
+    return 1.0 / iteration
+
+
+class AveragedDemandStore:
+    """On-disk store of averaged demand matrices as memory-mapped arrays.
+
+    One .npy file is written per matrix name (e.g. "AM_da") and global iteration,
+    so the averaged demand for any iteration can be read without Emme (e.g. to set up
+    assignments in separate processes) and a run can be resumed from any iteration.
+
+    If an iteration is stored again (e.g. rerun) the demand is written to a new
+    versioned file ({name}_iter{iteration}_v{n}.npy), as the previous file may
+    still be memory-mapped and cannot be replaced on Windows. Previous versions
+    are removed if they are not in use, otherwise on the next update.
+
+    Example::
+        store = AveragedDemandStore("demand_averaged")
+        demand = store.update("AM_da", new_demand, iteration, step_size=1.0 / iteration)
+    """
+
+    def __init__(self, root_dir: str, dtype: str = "float64"):
+        """Constructor for AveragedDemandStore.
+
+        Args:
+            root_dir: path to folder for the .npy files, created if required
+            dtype: data type of the stored demand, default float64 to average
+                without loss of precision, float32 halves the disk space
+        """
+        self.root_dir = root_dir
+        self.dtype = np.dtype(dtype)
+
+    def path(self, name: str, iteration: int) -> str:
+        """File path of the latest version of the named matrix at global iteration."""
+        versions = self._versions(name, iteration)
+        if versions:
+            return versions[-1][1]
+        return os.path.join(self.root_dir, f"{name}_iter{iteration}.npy")
+
+    def _versions(self, name: str, iteration: int) -> List[Tuple[int, str]]:
+        """Sorted list of (version number, file path) stored for name and iteration."""
+        if not os.path.isdir(self.root_dir):
+            return []
+        pattern = re.compile(rf"{re.escape(name)}_iter{iteration}(?:_v(\d+))?\.npy")
+        versions = []
+        for file_name in os.listdir(self.root_dir):
+            match = pattern.fullmatch(file_name)
+            if match:
+                version = int(match.group(1) or 0)
+                versions.append((version, os.path.join(self.root_dir, file_name)))
+        return sorted(versions)
+
+    def exists(self, name: str, iteration: int) -> bool:
+        """True if the named matrix has been stored for the global iteration."""
+        return os.path.exists(self.path(name, iteration))
+
+    def load(self, name: str, iteration: int) -> Optional[NumpyArray]:
+        """Read-only memory-mapped averaged demand, None if not stored.
+
+        Args:
+            name: matrix name
+            iteration: global iteration
+        """
+        if not self.exists(name, iteration):
+            return None
+        return np.load(self.path(name, iteration), mmap_mode="r")
+
+    def update(
+        self,
+        name: str,
+        demand: NumpyArray,
+        iteration: int,
+        step_size: float = 1.0,
+        prev_demand: NumpyArray = None,
+    ) -> NumpyArray:
+        """Average demand with the previous iteration and store for this iteration.
+
+        averaged = prev_demand + step_size * (demand - prev_demand), computed
+        directly into the new memory-mapped file without full-size temporaries.
+
+        Args:
+            name: matrix name
+            demand: new demand for this iteration
+            iteration: global iteration to store
+            step_size: weight of the new demand, 1.0 for no averaging
+            prev_demand: optional previous averaged demand, if not specified
+                the stored demand from iteration - 1 is used (if any)
+
+        Returns:
+            Read-only memory-mapped averaged demand
+        """
+        if prev_demand is None and step_size < 1.0:
+            prev_demand = self.load(name, iteration - 1)
+        os.makedirs(self.root_dir, exist_ok=True)
+        prev_versions = self._versions(name, iteration)
+        path = os.path.join(self.root_dir, f"{name}_iter{iteration}.npy")
+        if prev_versions:
+            path = f"{path[:-4]}_v{prev_versions[-1][0] + 1}.npy"
+        temp_path = f"{path[:-4]}_tmp.npy"
+        averaged = np.lib.format.open_memmap(
+            temp_path, mode="w+", dtype=self.dtype, shape=demand.shape
+        )
+        if prev_demand is None or step_size >= 1.0:
+            averaged[:] = demand
+        else:
+            np.subtract(demand, prev_demand, out=averaged, casting="unsafe")
+            averaged *= step_size
+            averaged += prev_demand
+        averaged.flush()
+        del averaged
+        os.replace(temp_path, path)
+        for _version, prev_path in prev_versions:
+            try:
+                os.remove(prev_path)
+            except PermissionError:
+                # still memory-mapped (Windows), removed on a later update
+                pass
+        return self.load(name, iteration)
@@ -253,6 +253,46 @@ def zonal_csv_to_matrices(
     return _dfs_dict
 
 
+def write_table(
+    df: pd.DataFrame, path: str, file_format: str = "csv", sep: str = ","
+) -> str:
+    """Write a DataFrame (without index) to a CSV or Parquet file.
+
+    The CSV format is the same as written by str.join: the header joined with
+    ",", and the values as str(value) joined with sep, without quoting.
+
+    Args:
+        df (pd.DataFrame): table to write
+        path (str): output file path, the extension is replaced with .parquet
+            for the parquet format
+        file_format (str, optional): "csv" or "parquet". Parquet requires pyarrow
+            or fastparquet to be installed. Defaults to "csv".
+        sep (str, optional): separator between the CSV values. Defaults to ",".
+
+    Returns:
+        str: the path of the written file
+    """
+    if file_format not in ["csv", "parquet"]:
+        raise ValueError(f"file_format must be csv or parquet, not {file_format}")
+    if file_format == "parquet":
+        path = os.path.splitext(path)[0] + ".parquet"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if file_format == "parquet":
+        df.to_parquet(path, index=False)
+        return path
+    with open(path, "w", encoding="utf8") as out_file:
+        out_file.write(",".join(map(str, df.columns)))
+        out_file.write("\n")
+        if len(df) and len(df.columns):
+            columns = [df[name].astype(str) for name in df.columns]
+            rows = columns[0]
+            if len(columns) > 1:
+                rows = rows.str.cat(columns[1:], sep=sep)
+            out_file.write("\n".join(rows))
+            out_file.write("\n")
+    return path
+
+
 def mocked_inro_context():
     """Mocking of modules which need to be mocked for tests."""
     import sys
@@ -0,0 +1,138 @@
+"""Zone system: node number to zone sequence number lookups.
+
+The zone sequence numbers are the 1-based sequential zone IDs used in the
+skim outputs read by the CT-RAMP (Java) model, from the
+config.scenario.zone_seq_file with columns N (node number), TAZSEQ,
+MAZSEQ, TAPSEQ and EXTSEQ (0 if the node is not a zone of that kind).
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+NumpyArray = np.array
+
+ZONE_SEQ_COLUMNS = {"TAZ": "TAZSEQ", "MAZ": "MAZSEQ", "TAP": "TAPSEQ", "EXT": "EXTSEQ"}
+
+
+class ZoneSystem:
+    """Cached, vectorized zone sequence lookups for TAZs, MAZs, TAPs and externals.
+
+    The files are read on first use, the node numbers for each kind of zone
+    are kept as sorted arrays and looked up with np.searchsorted.
+
+    Example::
+        zone_system = controller.zone_system
+        taz_seq = zone_system.to_seq(node_ids, "TAZ")
+        # TAZ or external (external sequence if both)
+        seq = zone_system.to_seq(node_ids, ("TAZ", "EXT"), missing=np.nan)
+    """
+
+    def __init__(self, zone_seq_file: str, maz_landuse_file: str = None):
+        """Constructor for ZoneSystem.
+
+        Args:
+            zone_seq_file: path to the zone sequence file
+            maz_landuse_file: path to the MAZ landuse file with the TAZ_ORIGINAL
+                for each MAZ in MAZ sequence order, used for maz_to_taz_seq
+        """
+        self.zone_seq_file = zone_seq_file
+        self.maz_landuse_file = maz_landuse_file
+        self._lookups = {}
+        self._maz_to_taz_seq = None
+
+    def _lookup(self, kind: Union[str, Sequence[str]]) -> Tuple[NumpyArray, NumpyArray]:
+        """Sorted node numbers and their sequence numbers for kind of zone(s)."""
+        kinds = (kind,) if isinstance(kind, str) else tuple(kind)
+        if kinds not in self._lookups:
+            if len(kinds) == 1:
+                if kinds[0] not in ZONE_SEQ_COLUMNS:
+                    raise ValueError(
+                        f"kind must be one of {list(ZONE_SEQ_COLUMNS)}, not {kinds[0]}"
+                    )
+                zone_seq = pd.read_csv(
+                    self.zone_seq_file, usecols=["N", ZONE_SEQ_COLUMNS[kinds[0]]]
+                )
+                zone_seq = zone_seq[zone_seq.iloc[:, 1] > 0]
+                nodes = zone_seq["N"].to_numpy()
+                seq = zone_seq.iloc[:, 1].to_numpy()
+            else:
+                # later kinds replace the sequence number of repeated nodes
+                parts = [self._lookup(k) for k in reversed(kinds)]
+                nodes, first = np.unique(
+                    np.concatenate([p[0] for p in parts]), return_index=True
+                )
+                seq = np.concatenate([p[1] for p in parts])[first]
+            order = np.argsort(nodes, kind="stable")
+            self._lookups[kinds] = (nodes[order], seq[order])
+        return self._lookups[kinds]
+
+    def node_ids(self, kind: Union[str, Sequence[str]]) -> NumpyArray:
+        """Sorted node numbers of the kind of zone(s), "TAZ", "MAZ", "TAP" or "EXT"."""
+        return self._lookup(kind)[0]
+
+    def contains(
+        self, node_ids: NumpyArray, kind: Union[str, Sequence[str]]
+    ) -> NumpyArray:
+        """Boolean array of which node_ids are zones of the kind.
+
+        Args:
+            node_ids: array of node numbers
+            kind: "TAZ", "MAZ", "TAP" or "EXT", or a sequence of these
+        """
+        nodes = self._lookup(kind)[0]
+        node_ids = np.asarray(node_ids)
+        if len(nodes) == 0:
+            return np.zeros(node_ids.shape, dtype=bool)
+        index = np.searchsorted(nodes, node_ids).clip(max=len(nodes) - 1)
+        return nodes[index] == node_ids
+
+    def to_seq(
+        self,
+        node_ids: NumpyArray,
+        kind: Union[str, Sequence[str]],
+        missing: float = None,
+    ) -> NumpyArray:
+        """Convert node numbers to zone sequence numbers.
+
+        Args:
+            node_ids: array of node numbers
+            kind: "TAZ", "MAZ", "TAP" or "EXT", or a sequence of these where the
+                later kinds take precedence for nodes which are in more than one
+            missing: value for node_ids which are not zones of the kind, e.g.
+                np.nan as with pandas Series.map. Default None raises KeyError.
+
+        Returns:
+            Array of the sequence numbers, integer if all node_ids are found
+        """
+        nodes, seq = self._lookup(kind)
+        node_ids = np.asarray(node_ids)
+        found = self.contains(node_ids, kind)
+        index = np.searchsorted(nodes, node_ids).clip(max=max(len(nodes) - 1, 0))
+        if found.all():
+            return seq[index]
+        if missing is None:
+            first = node_ids[~found].flat[0]
+            raise KeyError(f"node {first} is not a {kind} in {self.zone_seq_file}")
+        return np.where(found, seq[index] if len(seq) else missing, missing)
+
+    @property
+    def maz_to_taz_seq(self) -> NumpyArray:
+        """TAZ sequence number by MAZ sequence number - 1, from the MAZ landuse file.
+
+        The MAZ sequence is the row order in the landuse file and the TAZ
+        sequence the rank of TAZ_ORIGINAL.
+        """
+        if self._maz_to_taz_seq is None:
+            maz_data = pd.read_csv(self.maz_landuse_file, usecols=["TAZ_ORIGINAL"])
+            _, taz_index = np.unique(maz_data["TAZ_ORIGINAL"], return_inverse=True)
+            self._maz_to_taz_seq = taz_index.ravel() + 1
+        return self._maz_to_taz_seq
+
+    def clear(self):
+        """Clear the cached lookups, the files are read again on next use."""
+        self._lookups = {}
+        self._maz_to_taz_seq = None